@@ -0,0 +1,200 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .models import BidResponse
+
+
+@dataclass
+class CatalogEntry:
+    version: int
+    body: bytes
+    etag: str
+    valid_until: float
+
+
+class CatalogCache:
+    """
+    Per room cache of the anonymous (no user) paginated item responses.
+    Every room has a version that is bumped when its items change, which makes
+    all the cached pages for that room stale at once.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._versions: dict[str, int] = {}
+        self._entries: OrderedDict[tuple[str, str], CatalogEntry] = OrderedDict()
+
+    def version(self, auction_room_id: str) -> int:
+        return self._versions.get(auction_room_id, 0)
+
+    def invalidate(self, auction_room_id: str) -> None:
+        self._versions[auction_room_id] = self.version(auction_room_id) + 1
+
+    def get(self, auction_room_id: str, key: str) -> Optional[CatalogEntry]:
+        entry = self._entries.get((auction_room_id, key))
+        if not entry:
+            return None
+        if (
+            entry.version != self.version(auction_room_id)
+            or entry.valid_until < time.time()
+        ):
+            self._entries.pop((auction_room_id, key), None)
+            return None
+        self._entries.move_to_end((auction_room_id, key))
+        return entry
+
+    def set(
+        self,
+        auction_room_id: str,
+        key: str,
+        body: bytes,
+        valid_until: Optional[float] = None,
+    ) -> CatalogEntry:
+        max_valid_until = time.time() + self.ttl_seconds
+        version = self.version(auction_room_id)
+        entry = CatalogEntry(
+            version=version,
+            body=body,
+            etag=f'W/"{version}-{hashlib.sha256(body).hexdigest()[:16]}"',
+            valid_until=min(valid_until or max_valid_until, max_valid_until),
+        )
+        self._entries[(auction_room_id, key)] = entry
+        self._entries.move_to_end((auction_room_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+
+catalog_cache = CatalogCache()
+
+
+class ProcessedPaymentsCache:
+    """
+    Most recently processed payment hashes, checked before the
+    `processed_payments` table so that replayed payments are dropped without a
+    database round trip.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._hashes: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, payment_hash: str) -> bool:
+        if payment_hash not in self._hashes:
+            return False
+        self._hashes.move_to_end(payment_hash)
+        return True
+
+    def add(self, payment_hash: str) -> None:
+        self._hashes[payment_hash] = None
+        self._hashes.move_to_end(payment_hash)
+        while len(self._hashes) > self.max_entries:
+            self._hashes.popitem(last=False)
+
+    def discard(self, payment_hash: str) -> None:
+        self._hashes.pop(payment_hash, None)
+
+
+processed_payments_cache = ProcessedPaymentsCache()
+
+
+class BidResponseCache:
+    """
+    Invoices handed out for recent bid requests, so that a retried request gets
+    the same invoice back instead of a new one.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[BidResponse, float]] = OrderedDict()
+        self._keys_by_payment_hash: dict[str, set[str]] = {}
+
+    def get(self, key: str) -> Optional[BidResponse]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        bid_response, valid_until = entry
+        if valid_until < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return bid_response
+
+    def set(
+        self, key: str, bid_response: BidResponse, ttl_seconds: Optional[int] = None
+    ) -> None:
+        valid_until = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        self._entries[key] = (bid_response, valid_until)
+        self._entries.move_to_end(key)
+        self._keys_by_payment_hash.setdefault(bid_response.payment_hash, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def discard_payment(self, payment_hash: str) -> None:
+        for key in self._keys_by_payment_hash.pop(payment_hash, set()):
+            self._entries.pop(key, None)
+
+    def _remove(self, key: str) -> None:
+        bid_response, _ = self._entries.pop(key)
+        keys = self._keys_by_payment_hash.get(bid_response.payment_hash)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            self._keys_by_payment_hash.pop(bid_response.payment_hash)
+
+
+bid_response_cache = BidResponseCache()
+
+
+class BiddedItemsCache:
+    """
+    Ids of the items a user has paid bids for, per user and room.
+    Accepted bids are appended to the cached sets. A set read from the database
+    while a bid was being accepted is not cached, it could miss that bid.
+    Bids accepted by the other workers are only seen once the set expires.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: int = 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[set[str], float]] = (
+            OrderedDict()
+        )
+
+    def get(self, user_id: str, auction_room_id: str) -> Optional[set[str]]:
+        entry = self._entries.get((user_id, auction_room_id))
+        if entry is None:
+            return None
+        item_ids, valid_until = entry
+        if valid_until < time.monotonic():
+            self._entries.pop((user_id, auction_room_id), None)
+            return None
+        self._entries.move_to_end((user_id, auction_room_id))
+        return item_ids
+
+    def set(
+        self, user_id: str, auction_room_id: str, item_ids: set[str], version: int
+    ) -> None:
+        if version != self.version:
+            return
+        valid_until = time.monotonic() + self.ttl_seconds
+        self._entries[(user_id, auction_room_id)] = (item_ids, valid_until)
+        self._entries.move_to_end((user_id, auction_room_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def add(self, user_id: str, auction_room_id: str, auction_item_id: str) -> None:
+        self.version += 1
+        entry = self._entries.get((user_id, auction_room_id))
+        if entry is not None:
+            entry[0].add(auction_item_id)
+
+
+bidded_items_cache = BiddedItemsCache()
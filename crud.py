@@ -1,10 +1,14 @@
-from typing import Optional
+import re
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timezone
+from typing import Optional, Union
 
-from lnbits.db import Database, Filters, Page
+from lnbits.db import SQLITE, Connection, Database, Filters, Page
 
 from .models import (
     AuctionItem,
     AuctionItemFilters,
+    AuctionItemState,
     AuctionRoom,
     AuditEntry,
     AuditEntryFilters,
@@ -15,6 +19,8 @@ from .models import (
     PublicAuctionRoom,
     PublicAuditEntry,
     PublicBid,
+    RoomDailyStats,
+    RoomStats,
 )
 
 db = Database("ext_auction_house")
@@ -57,25 +63,26 @@ async def get_auction_rooms(user_id: str) -> list[AuctionRoom]:
     )
 
 
-async def delete_auction_room(user_id: str, auction_room_id: str) -> bool:
-    auction_room = await get_auction_room(
-        user_id=user_id, auction_room_id=auction_room_id
+async def get_all_auction_rooms() -> list[AuctionRoom]:
+    return await db.fetchall(
+        "SELECT * FROM auction_house.auction_rooms",
+        model=AuctionRoom,
     )
-    if not auction_room:
-        return False
-    await db.execute(
+
+
+async def delete_auction_room(user_id: str, auction_room_id: str) -> bool:
+    """
+    Delete only the room row.
+    Items, bids and audit entries are removed in batches by the room deletion job.
+    """
+    result = await db.execute(
         """
-        DELETE FROM auction_house.auction_items WHERE auction_room_id = :auction_room_id
+        DELETE FROM auction_house.auction_rooms
+        WHERE id = :id AND user_id = :user_id
         """,
-        {"auction_room_id": auction_room_id},
-    )
-
-    await db.execute(
-        "DELETE FROM auction_house.auction_rooms WHERE id = :id",
-        {"id": auction_room_id},
+        {"id": auction_room_id, "user_id": user_id},
     )
-
-    return True
+    return result.rowcount > 0
 
 
 async def create_auction_room(auction_room: AuctionRoom) -> AuctionRoom:
@@ -101,15 +108,41 @@ async def update_auction_room(
     return auction_room
 
 
+async def get_auction_room_owners() -> list[str]:
+    rows: list[dict] = await db.fetchall(
+        "SELECT DISTINCT user_id FROM auction_house.auction_rooms"
+    )
+    return [row["user_id"] for row in rows]
+
+
 async def get_auction_items_paginated(
     auction_room_id: str,
     user_id: Optional[str] = None,
     auction_item_ids: Optional[list[str]] = None,
     include_inactive: Optional[bool] = None,
+    text_search: Optional[str] = None,
     filters: Optional[Filters[AuctionItemFilters]] = None,
 ) -> Page[AuctionItem]:
+    """
+    With `text_search` only the items whose name or description contain all
+    the words (as prefixes) are returned, best matches first unless another
+    order is asked for.
+    """
+    query = "SELECT * FROM auction_house.auction_items"
     where = ["auction_room_id = :auction_room_id"]
     values = {"auction_room_id": auction_room_id}
+    search_words = _search_words(text_search)
+    if search_words:
+        query = f"""
+            SELECT i.*, s.search_rank FROM auction_house.auction_items i
+            JOIN ({_search_rank_query()}) s ON s.item_id = i.id
+        """
+        values["text_search"] = _search_match(search_words)
+        if not filters or not filters.sortby:
+            filters = (filters or Filters()).copy(
+                update={"sortby": "search_rank", "direction": "desc"}
+            )
+
     if user_id:
         where.append("user_id = :user_id")
         values["user_id"] = user_id
@@ -117,15 +150,12 @@ async def get_auction_items_paginated(
         where.append("active = true")
 
     if auction_item_ids:
-        id_clause = []
-        for i, item_id in enumerate(auction_item_ids):
-            auction_item_id = f"auction_item_id__{i}"
-            id_clause.append(f"id = :{auction_item_id}")
-            values[auction_item_id] = item_id
-        where.append(" OR ".join(id_clause))
+        id_clause, id_values = _in_clause("id", auction_item_ids)
+        where.append(f"id IN ({id_clause})")
+        values.update(id_values)
 
     return await db.fetch_page(
-        "SELECT * FROM auction_house.auction_items",
+        query,
         where=where,
         values=values,
         filters=filters,
@@ -133,12 +163,88 @@ async def get_auction_items_paginated(
     )
 
 
+async def get_auction_items_batch(
+    auction_room_id: str, limit: int = 50
+) -> list[AuctionItem]:
+    return await db.fetchall(
+        f"""
+            SELECT * FROM auction_house.auction_items
+            WHERE auction_room_id = :auction_room_id
+            LIMIT {int(limit)}
+        """,
+        {"auction_room_id": auction_room_id},
+        AuctionItem,
+    )
+
+
+async def get_auction_items_by_ids(auction_item_ids: list[str]) -> list[AuctionItem]:
+    if not auction_item_ids:
+        return []
+    id_clause, values = _in_clause("id", auction_item_ids)
+    return await db.fetchall(
+        f"SELECT * FROM auction_house.auction_items WHERE id IN ({id_clause})",
+        values,
+        AuctionItem,
+    )
+
+
+async def delete_auction_items(auction_item_ids: list[str]) -> int:
+    if not auction_item_ids:
+        return 0
+    id_clause, values = _in_clause("id", auction_item_ids)
+    async with db.connect() as conn:
+        for item_id in auction_item_ids:
+            await _delete_auction_item_search(conn, item_id)
+        result = await conn.execute(
+            f"DELETE FROM auction_house.auction_items WHERE id IN ({id_clause})",
+            values,
+        )
+    return result.rowcount
+
+
+async def count_auction_items(auction_room_id: str) -> int:
+    row: dict = await db.fetchone(
+        """
+            SELECT COUNT(*) AS count FROM auction_house.auction_items
+            WHERE auction_room_id = :auction_room_id
+        """,
+        {"auction_room_id": auction_room_id},
+    )
+    return int(row["count"]) if row else 0
+
+
 async def create_auction_item(data: AuctionItem):
-    await db.insert("auction_house.auction_items", data)
+    async with db.connect() as conn:
+        await conn.insert("auction_house.auction_items", data)
+        await _index_auction_item(conn, data)
+
+
+class AuctionItemConflictError(ValueError):
+    """
+    The auction item was updated by someone else since it was loaded.
+    """
 
 
 async def update_auction_item(data: AuctionItem) -> AuctionItem:
-    await db.update("auction_house.auction_items", data)
+    """
+    Compare and swap: the item is only stored if its version is still the one
+    it was loaded with, otherwise `AuctionItemConflictError` is raised.
+    """
+    async with db.connect() as conn:
+        result = await conn.execute(
+            """
+            UPDATE auction_house.auction_items SET version = version + 1
+            WHERE id = :id AND version = :version
+            """,
+            {"id": data.id, "version": data.version},
+        )
+        if result.rowcount == 0:
+            raise AuctionItemConflictError(
+                f"Auction item changed meanwhile ({data.id})."
+            )
+        data.version += 1
+        await conn.update("auction_house.auction_items", data)
+        await _index_auction_item(conn, data)
     return data
 
 
@@ -148,21 +254,40 @@ async def update_auction_item_top_price(
     await db.execute(
         """
         UPDATE auction_house.auction_items
-        SET current_price = :current_price
+        SET current_price = :current_price, version = version + 1
         WHERE id = :auction_item_id
         """,
         {"auction_item_id": auction_item_id, "current_price": current_price},
     )
 
 
-async def close_auction(auction_item_id: str) -> None:
+async def claim_auction_item_close(
+    auction_item_id: str, from_states: Sequence[AuctionItemState]
+) -> bool:
+    """
+    Move the item to `closing` if it is in one of `from_states`.
+    Only one caller gets True, it is the one that settles the item.
+    """
+    state_clause, values = _in_clause("state", [s.value for s in from_states])
+    result = await db.execute(
+        f"""
+        UPDATE auction_house.auction_items
+        SET state = 'closing', active = false, version = version + 1
+        WHERE id = :auction_item_id AND state IN ({state_clause})
+        """,
+        {"auction_item_id": auction_item_id, **values},
+    )
+    return result.rowcount == 1
+
+
+async def set_auction_item_state(auction_item_id: str, state: AuctionItemState) -> None:
     await db.execute(
         """
         UPDATE auction_house.auction_items
-        SET active = false
+        SET state = :state, version = version + 1
         WHERE id = :auction_item_id
         """,
-        {"auction_item_id": auction_item_id},
+        {"auction_item_id": auction_item_id, "state": state.value},
     )
 
 
@@ -181,7 +306,7 @@ async def get_active_auction_items() -> list[AuctionItem]:
     return await db.fetchall(
         """
             SELECT * FROM auction_house.auction_items
-            WHERE active = true
+            WHERE state = 'active'
         """,
         model=AuctionItem,
     )
@@ -236,6 +361,71 @@ async def get_bid_by_payment_hash(payment_hash: str) -> Optional[Bid]:
     )
 
 
+async def get_bids_by_payment_hashes(payment_hashes: list[str]) -> list[Bid]:
+    if not payment_hashes:
+        return []
+    hash_clause, values = _in_clause("payment_hash", payment_hashes)
+    return await db.fetchall(
+        f"""
+        SELECT * FROM auction_house.bids WHERE payment_hash IN ({hash_clause})
+        ORDER BY created_at
+        """,
+        values,
+        Bid,
+    )
+
+
+async def create_processed_payments(payment_hashes: list[str]) -> set[str]:
+    """
+    Record the payment hashes in the processed payments ledger.
+    Returns the ones that were not recorded before. A hash is returned to one
+    caller only, concurrent callers (or workers) get it from the insert itself.
+    """
+    claimed: set[str] = set()
+    async with db.connect() as conn:
+        for payment_hash in dict.fromkeys(payment_hashes):
+            result = await conn.execute(
+                """
+                INSERT INTO auction_house.processed_payments (payment_hash)
+                VALUES (:payment_hash)
+                ON CONFLICT (payment_hash) DO NOTHING
+                """,
+                {"payment_hash": payment_hash},
+            )
+            if result.rowcount == 1:
+                claimed.add(payment_hash)
+    return claimed
+
+
+async def delete_processed_payment(payment_hash: str) -> None:
+    await db.execute(
+        "DELETE FROM auction_house.processed_payments "
+        "WHERE payment_hash = :payment_hash",
+        {"payment_hash": payment_hash},
+    )
+
+
+async def delete_settled_processed_payments(before: datetime, limit: int = 500) -> int:
+    """
+    Delete the ledger rows recorded before `before` whose item is settled (or
+    whose bid no longer exists). Their payments are not processed again.
+    """
+    result = await db.execute(
+        f"""
+        DELETE FROM auction_house.processed_payments WHERE payment_hash IN (
+            SELECT p.payment_hash FROM auction_house.processed_payments p
+            LEFT JOIN auction_house.bids b ON b.payment_hash = p.payment_hash
+            LEFT JOIN auction_house.auction_items i ON i.id = b.auction_item_id
+            WHERE p.created_at < {db.timestamp_placeholder("before")}
+                AND (i.id IS NULL OR i.state = 'settled')
+            LIMIT {int(limit)}
+        )
+        """,
+        {"before": before},
+    )
+    return result.rowcount
+
+
 async def create_bid(data: Bid) -> PublicBid:
     await db.insert("auction_house.bids", data)
     return PublicBid(**data.dict())
@@ -257,6 +447,105 @@ async def update_top_bid(auction_item_id: str, bid_id: str) -> None:
     )
 
 
+async def delete_bids_batch(auction_item_ids: list[str], limit: int = 500) -> int:
+    if not auction_item_ids:
+        return 0
+    id_clause, values = _in_clause("auction_item_id", auction_item_ids)
+    result = await db.execute(
+        f"""
+        DELETE FROM auction_house.bids WHERE id IN (
+            SELECT id FROM auction_house.bids
+            WHERE auction_item_id IN ({id_clause})
+            LIMIT {int(limit)}
+        )
+        """,
+        values,
+    )
+    return result.rowcount
+
+
+async def get_expired_unpaid_bids(
+    expired_before: datetime,
+    created_before: datetime,
+    limit: int = 500,
+    after_id: str = "",
+) -> list[Bid]:
+    """
+    Unpaid bids whose invoice expired before `expired_before`, by id after
+    `after_id`. Bids created before invoice expiry was tracked are included if
+    they were created before `created_before`.
+    """
+    return await db.fetchall(
+        f"""
+            SELECT * FROM auction_house.bids
+            WHERE paid = false AND reserved = false AND id > :after_id AND (
+                expires_at < {db.timestamp_placeholder("expired_before")}
+                OR (
+                    expires_at IS NULL
+                    AND created_at < {db.timestamp_placeholder("created_before")}
+                )
+            )
+            ORDER BY id LIMIT {int(limit)}
+        """,
+        {
+            "expired_before": expired_before,
+            "created_before": created_before,
+            "after_id": after_id,
+        },
+        Bid,
+    )
+
+
+async def delete_unpaid_bids(bid_ids: list[str]) -> int:
+    if not bid_ids:
+        return 0
+    id_clause, values = _in_clause("id", bid_ids)
+    result = await db.execute(
+        f"""
+        DELETE FROM auction_house.bids
+        WHERE paid = false AND id IN ({id_clause})
+        """,
+        values,
+    )
+    return result.rowcount
+
+
+async def has_paid_bid(user_id: str, auction_item_id: str) -> bool:
+    row: dict = await db.fetchone(
+        """
+            SELECT EXISTS (
+                SELECT 1 FROM auction_house.bids
+                WHERE user_id = :user_id AND auction_item_id = :auction_item_id
+                    AND paid = true
+            ) AS found
+        """,
+        {"user_id": user_id, "auction_item_id": auction_item_id},
+    )
+    return bool(row and row["found"])
+
+
+async def get_outstanding_bid(
+    user_id: str, auction_item_id: str, amount: float, created_after: datetime
+) -> Optional[Bid]:
+    return await db.fetchone(
+        f"""
+            SELECT * FROM auction_house.bids
+            WHERE user_id = :user_id AND auction_item_id = :auction_item_id
+                AND amount = :amount AND paid = false
+                AND created_at > {db.timestamp_placeholder("created_after")}
+            ORDER BY created_at DESC
+            LIMIT 1
+        """,
+        {
+            "user_id": user_id,
+            "auction_item_id": auction_item_id,
+            "amount": amount,
+            "created_after": created_after,
+        },
+        Bid,
+    )
+
+
 async def get_top_bid(auction_item_id: str) -> Optional[Bid]:
     return await db.fetchone(
         """
@@ -270,6 +559,163 @@ async def get_top_bid(auction_item_id: str) -> Optional[Bid]:
     )
 
 
+async def get_winning_bids(auction_item_id: str) -> list[Bid]:
+    """
+    The top bid of an auction, or all the buys of a fixed price item.
+    """
+    return await db.fetchall(
+        """
+            SELECT * FROM auction_house.bids
+            WHERE auction_item_id = :auction_item_id
+                AND paid = true
+                AND higher_bid_made = false
+            ORDER BY created_at
+        """,
+        {"auction_item_id": auction_item_id},
+        Bid,
+    )
+
+
+async def reserve_auction_item_unit(auction_item_id: str) -> bool:
+    result = await db.execute(
+        """
+        UPDATE auction_house.auction_items
+        SET stock = stock - 1, version = version + 1
+        WHERE id = :auction_item_id AND stock > 0
+        """,
+        {"auction_item_id": auction_item_id},
+    )
+    return result.rowcount == 1
+
+
+async def return_auction_item_unit(auction_item_id: str) -> None:
+    await db.execute(
+        """
+        UPDATE auction_house.auction_items
+        SET stock = stock + 1, version = version + 1
+        WHERE id = :auction_item_id
+        """,
+        {"auction_item_id": auction_item_id},
+    )
+
+
+async def claim_bid_reservation(bid: Bid) -> bool:
+    """
+    Take over the unit reserved by an unpaid bid, when it is paid.
+    False if the reservation was already released (or claimed).
+    """
+    result = await db.execute(
+        """
+        UPDATE auction_house.bids SET reserved = false
+        WHERE id = :id AND reserved = true AND paid = false
+        """,
+        {"id": bid.id},
+    )
+    bid.reserved = False
+    return result.rowcount == 1
+
+
+async def release_bid_reservation(bid: Bid) -> bool:
+    """
+    Return the unit held by an unpaid bid to the stock of its item.
+    False if the bid was paid or its reservation already released.
+    """
+    async with db.connect() as conn:
+        result = await conn.execute(
+            """
+            UPDATE auction_house.bids SET reserved = false
+            WHERE id = :id AND reserved = true AND paid = false
+            """,
+            {"id": bid.id},
+        )
+        if result.rowcount == 0:
+            return False
+        await conn.execute(
+            """
+            UPDATE auction_house.auction_items
+            SET stock = stock + 1, version = version + 1
+            WHERE id = :auction_item_id
+            """,
+            {"auction_item_id": bid.auction_item_id},
+        )
+    bid.reserved = False
+    return True
+
+
+async def get_expired_reservations(expired_before: datetime, limit: int) -> list[Bid]:
+    return await db.fetchall(
+        f"""
+            SELECT * FROM auction_house.bids
+            WHERE reserved = true AND paid = false
+                AND expires_at < {db.timestamp_placeholder("expired_before")}
+            LIMIT {int(limit)}
+        """,
+        {"expired_before": expired_before},
+        Bid,
+    )
+
+
+async def count_item_reservations(auction_item_id: str) -> int:
+    row: dict = await db.fetchone(
+        """
+            SELECT COUNT(*) AS count FROM auction_house.bids
+            WHERE auction_item_id = :auction_item_id
+                AND reserved = true AND paid = false
+        """,
+        {"auction_item_id": auction_item_id},
+    )
+    return int(row["count"]) if row else 0
+
+
+async def get_unrefunded_bids(auction_item_id: str) -> list[Bid]:
+    """
+    The outbid bids not refunded yet, and the proxy bids (their deposit).
+    """
+    return await db.fetchall(
+        """
+            SELECT * FROM auction_house.bids
+            WHERE auction_item_id = :auction_item_id
+                AND paid = true AND refunded = false
+                AND (higher_bid_made = true OR max_amount IS NOT NULL)
+            ORDER BY created_at
+        """,
+        {"auction_item_id": auction_item_id},
+        Bid,
+    )
+
+
+async def set_bid_paid(bid: Bid) -> bool:
+    """
+    Mark the bid as paid, only while its item is `active`.
+    False if the item started closing (or the bid was already paid).
+    """
+    result = await db.execute(
+        """
+        UPDATE auction_house.bids SET paid = true
+        WHERE id = :id AND paid = false AND auction_item_id IN (
+            SELECT id FROM auction_house.auction_items
+            WHERE id = :auction_item_id AND state = 'active'
+        )
+        """,
+        {"id": bid.id, "auction_item_id": bid.auction_item_id},
+    )
+    return result.rowcount == 1
+
+
+async def set_bid_refunded(bid_id: str, refunded: bool = True) -> bool:
+    """
+    False if the bid was already in that state (refunded by another caller).
+    """
+    result = await db.execute(
+        """
+        UPDATE auction_house.bids SET refunded = :refunded
+        WHERE id = :id AND refunded != :refunded
+        """,
+        {"id": bid_id, "refunded": refunded},
+    )
+    return result.rowcount == 1
+
+
 async def get_bids(auction_item_id: str) -> list[Bid]:
     return await db.fetchall(
         """
@@ -282,13 +728,15 @@ async def get_bids(auction_item_id: str) -> list[Bid]:
     )
 
 
-async def get_user_bidded_items_ids(user_id: str) -> list[str]:
+async def get_user_bidded_items_ids(user_id: str, auction_room_id: str) -> list[str]:
     rows: list[dict] = await db.fetchall(
         """
-            SELECT DISTINCT auction_item_id FROM auction_house.bids
-            WHERE user_id = :user_id AND paid = true
+            SELECT DISTINCT b.auction_item_id FROM auction_house.bids b
+            JOIN auction_house.auction_items i ON b.auction_item_id = i.id
+            WHERE b.user_id = :user_id AND b.paid = true
+            AND i.auction_room_id = :auction_room_id
         """,
-        {"user_id": user_id},
+        {"user_id": user_id, "auction_room_id": auction_room_id},
     )
     return [row["auction_item_id"] for row in rows]
 
@@ -331,12 +779,64 @@ async def get_bids_for_user_paginated(
     )
 
 
-async def create_audit_entry(entry_id: str, data: str) -> PublicAuditEntry:
-    entry = PublicAuditEntry(entry_id=entry_id, data=data)
+async def create_audit_entry(entry: PublicAuditEntry) -> PublicAuditEntry:
     await db.insert("auction_house.auction_audit", entry)
     return entry
 
 
+async def delete_audit_entries_batch(entry_ids: list[str], limit: int = 500) -> int:
+    if not entry_ids:
+        return 0
+    id_clause, values = _in_clause("entry_id", entry_ids)
+    result = await db.execute(
+        f"""
+        DELETE FROM auction_house.auction_audit WHERE id IN (
+            SELECT id FROM auction_house.auction_audit
+            WHERE entry_id IN ({id_clause})
+            LIMIT {int(limit)}
+        )
+        """,
+        values,
+    )
+    return result.rowcount
+
+
+async def get_expired_audit_entries(
+    auction_room_id: str, before: datetime, limit: int = 500
+) -> list[AuditEntry]:
+    """
+    Audit entries of the room and of its closed items created before a date.
+    """
+    return await db.fetchall(
+        f"""
+            SELECT * FROM auction_house.auction_audit
+            WHERE created_at < {db.timestamp_placeholder("before")}
+                AND (
+                    entry_id = :auction_room_id
+                    OR entry_id IN (
+                        SELECT id FROM auction_house.auction_items
+                        WHERE auction_room_id = :auction_room_id AND active = false
+                    )
+                )
+            ORDER BY id
+            LIMIT {int(limit)}
+        """,
+        {"auction_room_id": auction_room_id, "before": before},
+        AuditEntry,
+    )
+
+
+async def delete_audit_entries(ids: list[int]) -> int:
+    if not ids:
+        return 0
+    id_clause, values = _in_clause("id", ids)
+    result = await db.execute(
+        f"DELETE FROM auction_house.auction_audit WHERE id IN ({id_clause})",
+        values,
+    )
+    return result.rowcount
+
+
 async def get_audit_entry_paginated(
     entry_id: str,
     filters: Optional[Filters[AuditEntryFilters]] = None,
@@ -349,3 +849,345 @@ async def get_audit_entry_paginated(
         filters=filters,
         model=AuditEntry,
     )
+
+
+async def get_room_stats(auction_room_id: str) -> Optional[RoomStats]:
+    return await db.fetchone(
+        """
+            SELECT * FROM auction_house.room_stats
+            WHERE auction_room_id = :auction_room_id
+        """,
+        {"auction_room_id": auction_room_id},
+        RoomStats,
+    )
+
+
+async def get_room_daily_stats(
+    auction_room_id: str, since_day: str
+) -> list[RoomDailyStats]:
+    return await db.fetchall(
+        """
+            SELECT * FROM auction_house.room_daily_stats
+            WHERE auction_room_id = :auction_room_id AND day >= :since_day
+            ORDER BY day DESC
+        """,
+        {"auction_room_id": auction_room_id, "since_day": since_day},
+        RoomDailyStats,
+    )
+
+
+async def update_room_stats_for_bid(auction_room_id: str, bid: Bid) -> None:
+    async with db.connect() as conn:
+        result = await conn.execute(
+            """
+            INSERT INTO auction_house.room_bidders (auction_room_id, user_id)
+            VALUES (:auction_room_id, :user_id)
+            ON CONFLICT DO NOTHING
+            """,
+            {"auction_room_id": auction_room_id, "user_id": bid.user_id},
+        )
+        await conn.execute(
+            f"""
+            INSERT INTO auction_house.room_stats AS s
+                (auction_room_id, bid_count, bid_volume_sat, unique_bidders, updated_at)
+            VALUES (:auction_room_id, 1, :amount_sat, :new_bidder, {db.timestamp_now})
+            ON CONFLICT (auction_room_id) DO UPDATE SET
+                bid_count = s.bid_count + 1,
+                bid_volume_sat = s.bid_volume_sat + excluded.bid_volume_sat,
+                unique_bidders = s.unique_bidders + excluded.unique_bidders,
+                updated_at = excluded.updated_at
+            """,
+            {
+                "auction_room_id": auction_room_id,
+                "amount_sat": bid.amount_sat,
+                "new_bidder": 1 if result.rowcount else 0,
+            },
+        )
+
+
+async def update_room_stats_for_closed_item(
+    auction_room_id: str, day: str, top_bid: Optional[Bid] = None
+) -> None:
+    values = {
+        "auction_room_id": auction_room_id,
+        "day": day,
+        "sold_items": 1 if top_bid else 0,
+        "sales_volume": top_bid.amount if top_bid else 0,
+        "sales_volume_sat": top_bid.amount_sat if top_bid else 0,
+    }
+    async with db.connect() as conn:
+        await conn.execute(
+            f"""
+            INSERT INTO auction_house.room_stats AS s
+                (auction_room_id, closed_items, sold_items,
+                    sales_volume, sales_volume_sat, updated_at)
+            VALUES (:auction_room_id, 1, :sold_items,
+                :sales_volume, :sales_volume_sat, {db.timestamp_now})
+            ON CONFLICT (auction_room_id) DO UPDATE SET
+                closed_items = s.closed_items + 1,
+                sold_items = s.sold_items + excluded.sold_items,
+                sales_volume = s.sales_volume + excluded.sales_volume,
+                sales_volume_sat = s.sales_volume_sat + excluded.sales_volume_sat,
+                updated_at = excluded.updated_at
+            """,
+            values,
+        )
+        await conn.execute(
+            """
+            INSERT INTO auction_house.room_daily_stats AS d
+                (auction_room_id, day, closed_items, sold_items,
+                    sales_volume, sales_volume_sat)
+            VALUES (:auction_room_id, :day, 1, :sold_items,
+                :sales_volume, :sales_volume_sat)
+            ON CONFLICT (auction_room_id, day) DO UPDATE SET
+                closed_items = d.closed_items + 1,
+                sold_items = d.sold_items + excluded.sold_items,
+                sales_volume = d.sales_volume + excluded.sales_volume,
+                sales_volume_sat = d.sales_volume_sat + excluded.sales_volume_sat
+            """,
+            values,
+        )
+
+
+async def delete_room_stats(auction_room_id: str) -> None:
+    async with db.connect() as conn:
+        for table in ["room_stats", "room_daily_stats", "room_bidders"]:
+            await conn.execute(
+                f"""
+                DELETE FROM auction_house.{table}
+                WHERE auction_room_id = :auction_room_id
+                """,
+                {"auction_room_id": auction_room_id},
+            )
+
+
+async def create_room_stats(
+    stats: RoomStats, daily_stats: Iterable[RoomDailyStats], bidders: Iterable[str]
+) -> None:
+    async with db.connect() as conn:
+        await conn.insert("auction_house.room_stats", stats)
+        for day_stats in daily_stats:
+            await conn.insert("auction_house.room_daily_stats", day_stats)
+        for user_id in bidders:
+            await conn.execute(
+                """
+                INSERT INTO auction_house.room_bidders (auction_room_id, user_id)
+                VALUES (:auction_room_id, :user_id)
+                """,
+                {"auction_room_id": stats.auction_room_id, "user_id": user_id},
+            )
+
+
+async def get_closed_auction_items(auction_room_id: str) -> list[AuctionItem]:
+    return await db.fetchall(
+        """
+            SELECT * FROM auction_house.auction_items
+            WHERE auction_room_id = :auction_room_id AND active = false
+        """,
+        {"auction_room_id": auction_room_id},
+        AuctionItem,
+    )
+
+
+async def get_room_paid_bids(auction_room_id: str) -> list[Bid]:
+    return await db.fetchall(
+        """
+            SELECT b.* FROM auction_house.bids b
+            JOIN auction_house.auction_items i ON b.auction_item_id = i.id
+            WHERE i.auction_room_id = :auction_room_id AND b.paid = true
+        """,
+        {"auction_room_id": auction_room_id},
+        Bid,
+    )
+
+
+async def get_unpaid_bids_of_active_items() -> list[Bid]:
+    return await db.fetchall(
+        """
+            SELECT b.* FROM auction_house.bids b
+            JOIN auction_house.auction_items i ON b.auction_item_id = i.id
+            WHERE i.active = true AND b.paid = false
+            ORDER BY b.created_at
+        """,
+        model=Bid,
+    )
+
+
+async def create_pooled_wallet(user_id: str, wallet_id: str) -> None:
+    await db.execute(
+        """
+            INSERT INTO auction_house.wallet_pool (wallet_id, user_id)
+            VALUES (:wallet_id, :user_id)
+            ON CONFLICT (wallet_id) DO NOTHING
+        """,
+        {"wallet_id": wallet_id, "user_id": user_id},
+    )
+
+
+async def take_pooled_wallet(user_id: str) -> Optional[str]:
+    """
+    Remove the oldest wallet of the user from the pool and return its id.
+    Returns None if the pool of the user is empty.
+    """
+    while True:
+        row: dict = await db.fetchone(
+            """
+                SELECT wallet_id FROM auction_house.wallet_pool
+                WHERE user_id = :user_id
+                ORDER BY created_at LIMIT 1
+            """,
+            {"user_id": user_id},
+        )
+        if not row:
+            return None
+        result = await db.execute(
+            "DELETE FROM auction_house.wallet_pool WHERE wallet_id = :wallet_id",
+            {"wallet_id": row["wallet_id"]},
+        )
+        # another task may have taken the same wallet
+        if result.rowcount:
+            return row["wallet_id"]
+
+
+async def count_pooled_wallets(user_id: str) -> int:
+    row: dict = await db.fetchone(
+        """
+            SELECT COUNT(*) AS count FROM auction_house.wallet_pool
+            WHERE user_id = :user_id
+        """,
+        {"user_id": user_id},
+    )
+    return int(row["count"]) if row else 0
+
+
+async def get_wallet_pool_sizes() -> dict[str, int]:
+    rows: list[dict] = await db.fetchall(
+        """
+            SELECT user_id, COUNT(*) AS count FROM auction_house.wallet_pool
+            GROUP BY user_id
+        """
+    )
+    return {row["user_id"]: int(row["count"]) for row in rows}
+
+
+async def _index_auction_item(conn: Connection, item: AuctionItem) -> None:
+    values = {
+        "item_id": item.id,
+        "name": item.name,
+        "description": item.description or "",
+    }
+    if conn.type == SQLITE:
+        await _delete_auction_item_search(conn, item.id)
+        await conn.execute(
+            """
+                INSERT INTO auction_house.auction_items_search
+                    (item_id, name, description)
+                VALUES (:item_id, :name, :description)
+            """,
+            values,
+        )
+        return
+    await conn.execute(
+        """
+            INSERT INTO auction_house.auction_items_search (item_id, document)
+            VALUES (
+                :item_id,
+                setweight(to_tsvector('simple', :name), 'A') ||
+                setweight(to_tsvector('simple', :description), 'B')
+            )
+            ON CONFLICT (item_id) DO UPDATE SET document = EXCLUDED.document
+        """,
+        values,
+    )
+
+
+async def _delete_auction_item_search(conn: Connection, item_id: str) -> None:
+    if conn.type == SQLITE:
+        # a MATCH on the item id uses the index, `item_id =` alone would not
+        await conn.execute(
+            """
+                DELETE FROM auction_house.auction_items_search
+                WHERE auction_items_search MATCH :match AND item_id = :item_id
+            """,
+            {"match": f"item_id : {_fts_string(item_id)}", "item_id": item_id},
+        )
+        return
+    await conn.execute(
+        "DELETE FROM auction_house.auction_items_search WHERE item_id = :item_id",
+        {"item_id": item_id},
+    )
+
+
+# full text operators, not words to search for
+_SEARCH_OPERATORS = {"or", "and", "not", "near"}
+
+
+def _search_words(text_search: Optional[str]) -> list[str]:
+    words = re.findall(r"\w+", (text_search or "").lower())
+    return [w for w in words if w not in _SEARCH_OPERATORS][:10]
+
+
+def _search_match(words: list[str]) -> str:
+    if db.type == SQLITE:
+        return (
+            "{name description} : ("
+            + " ".join(f"{_fts_string(w)}*" for w in words)
+            + ")"
+        )
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def _fts_string(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _search_rank_query() -> str:
+    if db.type == SQLITE:
+        # bm25 is lower for better matches, a name match counts 10 times more
+        return """
+            SELECT item_id, -bm25(auction_items_search, 0, 10, 1) AS search_rank
+            FROM auction_house.auction_items_search
+            WHERE auction_items_search MATCH :text_search
+        """
+    return """
+        SELECT item_id, ts_rank(document, query) AS search_rank
+        FROM auction_house.auction_items_search,
+            to_tsquery('simple', :text_search) AS query
+        WHERE document @@ query
+    """
+
+
+async def acquire_lease(name: str, owner: str, expires_at: datetime) -> bool:
+    """
+    Take the lease if it is free or expired, or extend it if `owner` holds it.
+    """
+    result = await db.execute(
+        f"""
+        INSERT INTO auction_house.leases AS l (name, owner, expires_at)
+        VALUES (:name, :owner, {db.timestamp_placeholder("expires_at")})
+        ON CONFLICT (name) DO UPDATE SET
+            owner = excluded.owner,
+            expires_at = excluded.expires_at
+        WHERE l.owner = excluded.owner
+            OR l.expires_at < {db.timestamp_placeholder("now")}
+        """,
+        {
+            "name": name,
+            "owner": owner,
+            "expires_at": expires_at,
+            "now": datetime.now(timezone.utc),
+        },
+    )
+    return result.rowcount > 0
+
+
+async def release_lease(name: str, owner: str) -> None:
+    await db.execute(
+        "DELETE FROM auction_house.leases WHERE name = :name AND owner = :owner",
+        {"name": name, "owner": owner},
+    )
+
+
+def _in_clause(name: str, values: Sequence[Union[str, int]]) -> tuple[str, dict]:
+    keys = {f"{name}__{i}": value for i, value in enumerate(values)}
+    return ", ".join(f":{key}" for key in keys), keys
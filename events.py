@@ -0,0 +1,60 @@
+import asyncio
+from dataclasses import dataclass
+
+from loguru import logger
+
+
+@dataclass
+class StreamEvent:
+    name: str
+    data: str
+
+    def to_sse(self) -> str:
+        return f"event: {self.name}\ndata: {self.data}\n\n"
+
+
+# streams are keyed by the id of an auction item or of an auction room.
+# They live in the memory of the worker: with several LNbits workers a stream
+# only gets the events published by the worker serving it (bids paid there,
+# items closed by it when it is the leader). The streams are for single worker
+# deployments, with several workers the clients must poll the items instead.
+_subscribers: dict[str, set[asyncio.Queue]] = {}
+
+
+def subscribe(channel_id: str, max_size: int = 100) -> asyncio.Queue:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+    _subscribers.setdefault(channel_id, set()).add(queue)
+    return queue
+
+
+def unsubscribe(channel_id: str, queue: asyncio.Queue) -> None:
+    subscribers = _subscribers.get(channel_id)
+    if not subscribers:
+        return
+    subscribers.discard(queue)
+    if not subscribers:
+        _subscribers.pop(channel_id, None)
+
+
+def has_subscribers(channel_id: str) -> bool:
+    return len(_subscribers.get(channel_id, set())) > 0
+
+
+def publish(channel_id: str, name: str, data: str) -> int:
+    """
+    Push an event to all the streams open for this auction item (or room).
+    Slow consumers that fill their queue get a single `reset` event instead and
+    are dropped (the client must reload and reconnect).
+    """
+    event = StreamEvent(name=name, data=data)
+    subscribers = list(_subscribers.get(channel_id, set()))
+    for queue in subscribers:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.debug(f"[auction_house][{channel_id}]: dropping slow stream.")
+            unsubscribe(channel_id, queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(StreamEvent(name="reset", data="{}"))
+    return len(subscribers)
@@ -1,5 +1,6 @@
+from datetime import datetime, timezone
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException
 from lnbits.decorators import optional_user_id
@@ -9,3 +10,7 @@ async def check_user_id(user_id: Annotated[str, Depends(optional_user_id)]) -> s
     if not user_id:
         raise HTTPException(HTTPStatus.UNAUTHORIZED)
     return user_id
+
+
+def epoch_ms(date: Optional[datetime] = None) -> int:
+    return int((date or datetime.now(timezone.utc)).timestamp() * 1000)
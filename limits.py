@@ -0,0 +1,148 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from lnbits.settings import settings
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def can_take(self, now: Optional[float] = None) -> bool:
+        now = now or time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.refill_per_second,
+        )
+        self.updated_at = now
+        return self.tokens >= 1
+
+    def take(self, now: Optional[float] = None) -> bool:
+        if not self.can_take(now):
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """
+    One token bucket per key. The least recently used buckets are dropped
+    when there are too many of them (a new bucket starts full).
+    """
+
+    def __init__(
+        self, capacity: float, refill_per_second: float, max_keys: int = 10_000
+    ):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def allow(self, key: str) -> bool:
+        return self.bucket(key).take()
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if not bucket:
+            bucket = TokenBucket(self.capacity, self.refill_per_second)
+            self._buckets[key] = bucket
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return bucket
+
+
+def allow_all(*limits: tuple[RateLimiter, str]) -> bool:
+    """
+    Take a token for each (limiter, key) only if all of them have one, a
+    request rejected by one limiter does not spend the tokens of the others.
+    """
+    buckets = [limiter.bucket(key) for limiter, key in limits]
+    if not all(bucket.can_take() for bucket in buckets):
+        return False
+    for bucket in buckets:
+        bucket.take()
+    return True
+
+
+class OutstandingInvoices:
+    """
+    Bid invoices that were created but not paid yet, per user and item.
+    Invoices are forgotten when paid or after they expire. When there are too
+    many (user, item) keys the expired invoices of all the keys are dropped,
+    then the least recently used keys.
+    """
+
+    def __init__(
+        self,
+        max_per_user_item: int = 3,
+        ttl_seconds: int = 3600,
+        max_keys: int = 10_000,
+    ):
+        self.max_per_user_item = max_per_user_item
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._invoices: OrderedDict[tuple[str, str], dict[str, float]] = OrderedDict()
+
+    def count(self, user_id: str, auction_item_id: str) -> int:
+        key = (user_id, auction_item_id)
+        invoices = self._invoices.get(key)
+        if not invoices:
+            return 0
+        now = time.monotonic()
+        for payment_hash, expires_at in list(invoices.items()):
+            if expires_at < now:
+                invoices.pop(payment_hash)
+        if not invoices:
+            self._invoices.pop(key)
+        return len(invoices)
+
+    def is_full(self, user_id: str, auction_item_id: str) -> bool:
+        return self.count(user_id, auction_item_id) >= self.max_per_user_item
+
+    def add(
+        self,
+        user_id: str,
+        auction_item_id: str,
+        payment_hash: str,
+        ttl_seconds: Optional[int] = None,
+    ) -> None:
+        """
+        `ttl_seconds` is the expiry of the invoice, when it is not the default.
+        """
+        key = (user_id, auction_item_id)
+        invoices = self._invoices.setdefault(key, {})
+        invoices[payment_hash] = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        self._invoices.move_to_end(key)
+        if len(self._invoices) > self.max_keys:
+            self._sweep()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for key, invoices in list(self._invoices.items()):
+            if all(expires_at < now for expires_at in invoices.values()):
+                self._invoices.pop(key)
+        while len(self._invoices) > self.max_keys:
+            self._invoices.popitem(last=False)
+
+    def remove(self, user_id: str, auction_item_id: str, payment_hash: str) -> None:
+        key = (user_id, auction_item_id)
+        invoices = self._invoices.get(key)
+        if invoices is None:
+            return
+        invoices.pop(payment_hash, None)
+        if not invoices:
+            self._invoices.pop(key)
+
+
+# a user can burst 5 bids, then place one every 2 seconds
+user_bid_limiter = RateLimiter(capacity=5, refill_per_second=0.5)
+# all the users of an item together
+item_bid_limiter = RateLimiter(capacity=30, refill_per_second=5)
+outstanding_invoices = OutstandingInvoices(
+    max_per_user_item=3, ttl_seconds=settings.lightning_invoice_expiry
+)
@@ -1,4 +1,4 @@
-from lnbits.db import Database
+from lnbits.db import SQLITE, Database
 
 
 async def m001_auction_rooms(db: Database):
@@ -86,3 +86,259 @@ async def m003_auction_audit(db: Database):
         );
    """
     )
+
+
+async def m004_room_stats(db: Database):
+    await db.execute(
+        f"""
+       CREATE TABLE auction_house.room_stats (
+            auction_room_id TEXT PRIMARY KEY,
+            bid_count INT NOT NULL DEFAULT 0,
+            bid_volume_sat {db.big_int} NOT NULL DEFAULT 0,
+            unique_bidders INT NOT NULL DEFAULT 0,
+            closed_items INT NOT NULL DEFAULT 0,
+            sold_items INT NOT NULL DEFAULT 0,
+            sales_volume REAL NOT NULL DEFAULT 0,
+            sales_volume_sat {db.big_int} NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+   """
+    )
+
+    await db.execute(
+        f"""
+       CREATE TABLE auction_house.room_daily_stats (
+            auction_room_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            closed_items INT NOT NULL DEFAULT 0,
+            sold_items INT NOT NULL DEFAULT 0,
+            sales_volume REAL NOT NULL DEFAULT 0,
+            sales_volume_sat {db.big_int} NOT NULL DEFAULT 0,
+            PRIMARY KEY (auction_room_id, day)
+        );
+   """
+    )
+
+    await db.execute(
+        """
+       CREATE TABLE auction_house.room_bidders (
+            auction_room_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (auction_room_id, user_id)
+        );
+   """
+    )
+
+
+async def m005_indexes(db: Database):
+    await _create_index(
+        db, "idx_auction_items_room", "auction_items", "auction_room_id"
+    )
+    await _create_index(db, "idx_bids_item", "bids", "auction_item_id")
+    await _create_index(db, "idx_bids_payment_hash", "bids", "payment_hash")
+    await _create_index(db, "idx_auction_audit_entry", "auction_audit", "entry_id")
+
+
+async def m006_audit_events(db: Database):
+    """
+    Audit entries are stored as an event code plus a JSON payload.
+    The `data` column only holds the text of the older entries.
+    """
+    await db.execute("ALTER TABLE auction_house.auction_audit ADD COLUMN event TEXT")
+    await db.execute("ALTER TABLE auction_house.auction_audit ADD COLUMN bid_id TEXT")
+    await db.execute("ALTER TABLE auction_house.auction_audit ADD COLUMN payload TEXT")
+    await _create_index(
+        db, "idx_auction_audit_event", "auction_audit", "entry_id, event"
+    )
+    await _create_index(db, "idx_auction_audit_bid", "auction_audit", "bid_id")
+
+
+async def m007_processed_payments(db: Database):
+    await db.execute(
+        f"""
+       CREATE TABLE auction_house.processed_payments (
+            payment_hash TEXT PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+   """
+    )
+
+
+async def m008_bid_expiry(db: Database):
+    await db.execute("ALTER TABLE auction_house.bids ADD COLUMN expires_at TIMESTAMP")
+    await _create_index(db, "idx_bids_unpaid_expiry", "bids", "paid, expires_at")
+
+
+async def m009_wallet_pool(db: Database):
+    """
+    Escrow wallets created ahead of time for the room owners, so adding an item
+    does not have to create a wallet. Wallets of settled items are put back.
+    """
+    await db.execute(
+        f"""
+       CREATE TABLE auction_house.wallet_pool (
+            wallet_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+   """
+    )
+    await _create_index(db, "idx_wallet_pool_user", "wallet_pool", "user_id")
+
+
+async def m010_auction_items_search(db: Database):
+    """
+    Full text index over the name and description of the auction items:
+    an FTS5 table on SQLite, a tsvector column with a GIN index on Postgres.
+    The item id is indexed too on SQLite, so an item can be found by MATCH.
+    """
+    if db.type == SQLITE:
+        await db.execute(
+            """
+            CREATE VIRTUAL TABLE auction_house.auction_items_search USING fts5(
+                item_id, name, description,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+        await db.execute(
+            """
+            INSERT INTO auction_house.auction_items_search
+                (item_id, name, description)
+            SELECT id, name, COALESCE(description, '')
+            FROM auction_house.auction_items
+            """
+        )
+        return
+
+    await db.execute(
+        """
+        CREATE TABLE auction_house.auction_items_search (
+            item_id TEXT PRIMARY KEY,
+            document TSVECTOR NOT NULL
+        );
+        """
+    )
+    # the name weighs more than the description
+    await db.execute(
+        """
+        INSERT INTO auction_house.auction_items_search (item_id, document)
+        SELECT id,
+            setweight(to_tsvector('simple', COALESCE(name, '')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(description, '')), 'B')
+        FROM auction_house.auction_items
+        """
+    )
+    await db.execute(
+        """
+        CREATE INDEX idx_auction_items_search
+        ON auction_house.auction_items_search USING GIN (document)
+        """
+    )
+
+
+async def m011_bids_user_index(db: Database):
+    """
+    The items a user has bid on are looked up by user, then filtered by room.
+    """
+    await _create_index(db, "idx_bids_user", "bids", "user_id, paid")
+
+
+async def m012_leases(db: Database):
+    """
+    Named locks shared by all the LNbits workers: the leader of the background
+    tasks and the bids of an item. A lease is held until it expires or is
+    released by its owner.
+    """
+    await db.execute(
+        """
+        CREATE TABLE auction_house.leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        );
+        """
+    )
+
+
+async def m013_auction_items_version(db: Database):
+    await db.execute(
+        """
+        ALTER TABLE auction_house.auction_items
+        ADD COLUMN version INTEGER NOT NULL DEFAULT 0
+        """
+    )
+
+
+async def m014_auction_items_state(db: Database):
+    """
+    active -> closing -> settled or failed. Closed items are taken as settled.
+    """
+    await db.execute(
+        """
+        ALTER TABLE auction_house.auction_items
+        ADD COLUMN state TEXT NOT NULL DEFAULT 'active'
+        """
+    )
+    await db.execute(
+        """
+        UPDATE auction_house.auction_items SET state = 'settled'
+        WHERE active = false
+        """
+    )
+
+
+async def m015_item_quantity(db: Database):
+    """
+    Fixed price items can have several units. Unpaid bids reserve a unit until
+    their invoice expires.
+    """
+    await db.execute(
+        "ALTER TABLE auction_house.auction_items "
+        "ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1"
+    )
+    await db.execute(
+        "ALTER TABLE auction_house.auction_items "
+        "ADD COLUMN stock INTEGER NOT NULL DEFAULT 1"
+    )
+    await db.execute(
+        "UPDATE auction_house.auction_items SET stock = 0 WHERE active = false"
+    )
+    await db.execute(
+        "ALTER TABLE auction_house.bids "
+        "ADD COLUMN reserved BOOLEAN NOT NULL DEFAULT false"
+    )
+    await _create_index(db, "idx_bids_reserved", "bids", "reserved, expires_at")
+
+
+async def m016_proxy_bids(db: Database):
+    """
+    Proxy bids pay a maximum amount upfront. What is not spent is refunded when
+    the auction closes.
+    """
+    await db.execute("ALTER TABLE auction_house.bids ADD COLUMN max_amount REAL")
+    await db.execute("ALTER TABLE auction_house.bids ADD COLUMN max_amount_sat INTEGER")
+    await db.execute(
+        "ALTER TABLE auction_house.bids "
+        "ADD COLUMN refunded BOOLEAN NOT NULL DEFAULT false"
+    )
+
+
+async def m017_outbid_bids_refunded(db: Database):
+    """
+    Outbid bids can be refunded in batches, the `refunded` flag tracks them.
+    Until now the plain bids were refunded as soon as they were outbid.
+    """
+    await db.execute(
+        "UPDATE auction_house.bids SET refunded = true "
+        "WHERE paid = true AND higher_bid_made = true AND max_amount IS NULL"
+    )
+    await _create_index(db, "idx_bids_refunded", "bids", "auction_item_id, refunded")
+
+
+async def _create_index(db: Database, name: str, table: str, columns: str):
+    # sqlite expects the schema on the index name, postgres on the table name
+    if db.type == SQLITE:
+        await db.execute(f"CREATE INDEX auction_house.{name} ON {table} ({columns})")
+    else:
+        await db.execute(f"CREATE INDEX {name} ON auction_house.{table} ({columns})")
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 from datetime import datetime, timedelta, timezone
+from enum import Enum
 from string import Template
 from typing import Optional
 
@@ -35,11 +36,36 @@ class AuctionDuration(BaseModel):
         return timedelta(days=self.days, hours=self.hours, minutes=self.minutes)
 
 
+class AuditRetention(BaseModel):
+    # audit entries older than this are pruned, except for active items
+    # zero means keep everything
+    days: int = 0
+    # export the pruned entries to compressed NDJSON files before deleting them
+    archive: bool = False
+
+
 class AuctionRoomConfig(BaseModel):
     duration: AuctionDuration = AuctionDuration()
     lock_webhook: Webhook = Webhook()
     unlock_webhook: Webhook = Webhook()
     transfer_webhook: Webhook = Webhook()
+    audit_retention: AuditRetention = AuditRetention()
+    # how old the exchange rate can be for fiat rooms
+    rate_refresh_seconds: int = 60
+    # fixed price rooms: invoice expiry, a unit is reserved for that long
+    reservation_seconds: int = 600
+    # auctions: outbid bids are refunded in the background, not in the bid path
+    defer_refunds: bool = False
+
+
+# sealed rooms: bids are hidden until the close, the winner pays its bid
+# (first price) or the second highest bid (second price, Vickrey)
+AUCTION_ROOM_TYPES = [
+    "auction",
+    "fixed_price",
+    "sealed_first_price",
+    "sealed_second_price",
+]
 
 
 class CreateAuctionRoomData(BaseModel):
@@ -47,18 +73,20 @@ class CreateAuctionRoomData(BaseModel):
     currency: str
     name: str
     description: str
-    type: str = "auction"  # [auction, fixed_price]
+    type: str = "auction"  # one of AUCTION_ROOM_TYPES
     room_percentage: float = 10
     min_bid_up_percentage: float = 5
     is_open_room: bool = False
 
     def validate_data(self):
-        if self.type not in ["auction", "fixed_price"]:
-            raise ValueError("Auction Room type must be 'auction' or 'fixed_price'.")
+        if self.type not in AUCTION_ROOM_TYPES:
+            raise ValueError(
+                f"Auction Room type must be one of: {', '.join(AUCTION_ROOM_TYPES)}."
+            )
         if self.room_percentage <= 0:
             raise ValueError("Auction Room percentage must be positive.")
 
-        if self.type == "fixed_price":
+        if self.type != "auction":
             self.min_bid_up_percentage = 0
         else:
             if self.min_bid_up_percentage <= 0:
@@ -73,6 +101,12 @@ class EditAuctionRoomData(CreateAuctionRoomData):
         super().validate_data()
         if self.extra.duration.to_timedelta().total_seconds() <= 0:
             raise ValueError("Auction Room duration must be positive.")
+        if self.extra.audit_retention.days < 0:
+            raise ValueError("Audit retention days cannot be negative.")
+        if self.extra.rate_refresh_seconds <= 0:
+            raise ValueError("Exchange rate refresh interval must be positive.")
+        if self.extra.reservation_seconds <= 0:
+            raise ValueError("Reservation time must be positive.")
         if self.type == "fixed_price":
             self.extra.duration.days = 365
 
@@ -82,7 +116,7 @@ class PublicAuctionRoom(BaseModel):
     name: str
     description: str
     currency: str
-    type: str = "auction"  # [auction, fixed_price]
+    type: str = "auction"  # one of AUCTION_ROOM_TYPES
     duration_seconds: int = Field(default=0, no_database=True)
 
     min_bid_up_percentage: float = 5
@@ -96,6 +130,14 @@ class PublicAuctionRoom(BaseModel):
     def is_fixed_price(self):
         return self.type == "fixed_price"
 
+    @property
+    def is_sealed(self):
+        return self.type in ["sealed_first_price", "sealed_second_price"]
+
+    @property
+    def is_second_price(self):
+        return self.type == "sealed_second_price"
+
 
 class AuctionRoom(PublicAuctionRoom):
     user_id: str
@@ -111,12 +153,26 @@ class AuctionRoom(PublicAuctionRoom):
         self.duration_seconds = int(self.extra.duration.to_timedelta().total_seconds())
 
 
+class AuctionRoomDeletion(BaseModel):
+    auction_room_id: str
+    user_id: str
+    items_total: int = 0
+    items_deleted: int = 0
+    bids_deleted: int = 0
+    audit_entries_deleted: int = 0
+    wallets_deleted: int = 0
+    done: bool = False
+    error: Optional[str] = None
+
+
 class CreateAuctionItem(BaseModel):
     name: str
     description: Optional[str] = None
     ln_address: Optional[str] = None
     ask_price: float = 0
     transfer_code: str
+    # units for sale, only fixed price rooms sell more than one
+    quantity: int = 1
 
 
 class PublicAuctionItem(BaseModel):
@@ -129,11 +185,18 @@ class PublicAuctionItem(BaseModel):
     current_price: float = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     expires_at: datetime
+    quantity: int = 1
+    # units not sold and not reserved by an unpaid bid
+    stock: int = 1
     current_price_sat: float = Field(default=0, no_database=True)
     bid_count: int = Field(default=0, no_database=True)
     currency: str = Field(default="sat", no_database=True)
     next_min_bid: float = Field(default=0, no_database=True)
+    next_min_bid_sat: int = Field(default=0, no_database=True)
     time_left_seconds: int = Field(default=0, no_database=True)
+    # epoch milliseconds, clients count down from the server clock
+    expires_at_ms: int = Field(default=0, no_database=True)
+    server_time_ms: int = Field(default=0, no_database=True)
     user_is_owner: bool = Field(default=False, no_database=True)
     user_is_participant: bool = Field(default=False, no_database=True)
     user_is_top_bidder: bool = Field(default=False, no_database=True)
@@ -153,12 +216,26 @@ class AuctionItemExtra(BaseModel):
     is_owner_paid: bool = False
     is_transfered_to_new_owner: bool = False
     is_unlocked: bool = False
+    # the closing of this item was added to the room statistics
+    is_stats_recorded: bool = False
     owner_ln_address: Optional[str] = None
 
 
+class AuctionItemState(str, Enum):
+    ACTIVE = "active"
+    # claimed by one closer, see `claim_auction_item_close`
+    CLOSING = "closing"
+    SETTLED = "settled"
+    # the settlement did not complete, it can be retried by closing again
+    FAILED = "failed"
+
+
 class AuctionItem(PublicAuctionItem):
     user_id: str
     extra: AuctionItemExtra
+    state: AuctionItemState = AuctionItemState.ACTIVE
+    # bumped by every update, see `update_auction_item`
+    version: int = 0
 
     def to_public(self, user_id: Optional[str] = None) -> PublicAuctionItem:
         if self.user_id == user_id:
@@ -188,10 +265,16 @@ class BidRequest(BaseModel):
     memo: str
     ln_address: str | None = None
     amount: float
+    # proxy bid: paid upfront, the bid is raised up to it when outbid
+    max_amount: float | None = None
+    # retries with the same key get back the invoice of the first request
+    idempotency_key: str | None = Field(default=None, max_length=64)
 
     def validate_data(self):
         if self.amount <= 0:
             raise ValueError("Bid amount must be positive.")
+        if self.max_amount is not None and self.max_amount < self.amount:
+            raise ValueError("Maximum bid must not be lower than the bid amount.")
         if not self.memo.strip():
             raise ValueError("Memo is required.")
         if self.ln_address and not is_valid_email_address(self.ln_address):
@@ -202,6 +285,19 @@ class BidResponse(BaseModel):
     id: str
     payment_hash: str
     payment_request: str
+    expires_at: Optional[datetime] = None
+
+    @property
+    def expires_in_seconds(self) -> Optional[int]:
+        """
+        How long the invoice can still be paid, None if the expiry is unknown.
+        """
+        if not self.expires_at:
+            return None
+        expires_in = self.expires_at.astimezone(timezone.utc) - datetime.now(
+            timezone.utc
+        )
+        return max(int(expires_in.total_seconds()), 1)
 
 
 class PublicBid(BaseModel):
@@ -221,6 +317,25 @@ class Bid(PublicBid):
     user_id: str
     ln_address: str | None = None
     payment_hash: str
+    # invoice expiry, unpaid bids are purged some time after it
+    expires_at: Optional[datetime] = None
+    # the bid holds a unit of a fixed price item until its invoice expires
+    reserved: bool = False
+    # proxy bids: the amount paid, `amount` is the price the bid stands at
+    max_amount: Optional[float] = None
+    max_amount_sat: Optional[int] = None
+    # set when an outbid bid (or the unspent part of a proxy bid) is refunded
+    refunded: bool = False
+
+    @property
+    def is_proxy(self) -> bool:
+        return self.max_amount is not None
+
+    @property
+    def paid_sat(self) -> int:
+        if self.max_amount_sat is None:
+            return self.amount_sat
+        return self.max_amount_sat
 
     def to_public(self, user_id: Optional[str] = None) -> PublicBid:
         if self.user_id == user_id:
@@ -244,21 +359,229 @@ class BidFilters(FilterModel):
     amount_sat: float | None
 
 
+class AuditEvent(str, Enum):
+    ITEM_INVALID = "item_invalid"
+    ITEM_ADDED = "item_added"
+    LOCK_WEBHOOK_MISSING = "lock_webhook_missing"
+    LOCK_CODE_OBTAINED = "lock_code_obtained"
+    LOCK_CODE_FAILED = "lock_code_failed"
+    WEBHOOK_FAILED = "webhook_failed"
+    ROOM_NOT_FOUND = "room_not_found"
+    ITEM_CLOSING = "item_closing"
+    ITEM_FORCE_CLOSE = "item_force_close"
+    ITEM_CLOSE_FAILED = "item_close_failed"
+    ITEM_NO_BIDS = "item_no_bids"
+    ITEM_CLOSED = "item_closed"
+    ITEM_ALREADY_CLOSED = "item_already_closed"
+    ITEM_SETTLEMENT_FAILED = "item_settlement_failed"
+    WALLET_DELETED = "wallet_deleted"
+    WALLET_RECYCLED = "wallet_recycled"
+    UNIT_TRANSFER_FAILED = "unit_transfer_failed"
+    UNLOCK_WEBHOOK_MISSING = "unlock_webhook_missing"
+    ITEM_ALREADY_UNLOCKED = "item_already_unlocked"
+    ITEM_UNLOCKED = "item_unlocked"
+    TRANSFER_WEBHOOK_MISSING = "transfer_webhook_missing"
+    ITEM_TRANSFERRING = "item_transferring"
+    ITEM_ALREADY_TRANSFERRED = "item_already_transferred"
+    ITEM_TRANSFERRED = "item_transferred"
+    BID_PLACING = "bid_placing"
+    BID_REJECTED = "bid_rejected"
+    BID_PLACED = "bid_placed"
+    PAYMENT_RECEIVED = "payment_received"
+    PAYMENT_AMOUNT_MISMATCH = "payment_amount_mismatch"
+    PAYMENT_UNKNOWN_ITEM = "payment_unknown_item"
+    PAYMENT_FOR_CLOSED_ITEM = "payment_for_closed_item"
+    PAYMENT_TOO_LOW = "payment_too_low"
+    PAYMENT_SOLD_OUT = "payment_sold_out"
+    RESERVATION_RELEASED = "reservation_released"
+    BID_ACCEPTING = "bid_accepting"
+    BUY_ACCEPTING = "buy_accepting"
+    BID_ACCEPTED = "bid_accepted"
+    PROXY_BID_RAISED = "proxy_bid_raised"
+    BID_OUTBID = "bid_outbid"
+    REFUNDING = "refunding"
+    REFUNDED = "refunded"
+    REFUND_PREVIOUS_WINNER = "refund_previous_winner"
+    REFUND_NOTHING = "refund_nothing"
+    REFUND_PAID = "refund_paid"
+    REFUND_FAILED = "refund_failed"
+    REFUND_NO_WALLET = "refund_no_wallet"
+    REFUND_DEPOSIT = "refund_deposit"
+    REFUND_BATCH_DONE = "refund_batch_done"
+    SEALED_BID_DUPLICATE = "sealed_bid_duplicate"
+    SEALED_WINNER = "sealed_winner"
+    LN_ADDRESS_ERROR = "ln_address_error"
+    SETTLEMENT_STARTED = "settlement_started"
+    SETTLEMENT_DONE = "settlement_done"
+    FEE_PAYING = "fee_paying"
+    FEE_ALREADY_PAID = "fee_already_paid"
+    FEE_PAID = "fee_paid"
+    FEE_FAILED = "fee_failed"
+    OWNER_PAYING = "owner_paying"
+    OWNER_ALREADY_PAID = "owner_already_paid"
+    OWNER_PAID = "owner_paid"
+    OWNER_NOT_PAID = "owner_not_paid"
+    OWNER_PAYMENT_FAILED = "owner_payment_failed"
+    OWNER_TRANSFER = "owner_transfer"
+    OWNER_TRANSFER_DONE = "owner_transfer_done"
+    OWNER_TRANSFER_FAILED = "owner_transfer_failed"
+    STATS_REBUILDING = "stats_rebuilding"
+    STATS_REBUILT = "stats_rebuilt"
+    STATS_FAILED = "stats_failed"
+    WEBSOCKET_FAILED = "websocket_failed"
+
+    @property
+    def template(self) -> str:
+        return _audit_event_templates[self]
+
+
+_audit_event_templates: dict[AuditEvent, str] = {
+    AuditEvent.ITEM_INVALID: "Invalid auction item: {reason}",
+    AuditEvent.ITEM_ADDED: "Added item {name}. Wallet id: {wallet_id}.",
+    AuditEvent.LOCK_WEBHOOK_MISSING: "No lock webhook for auction room {room_id}.",
+    AuditEvent.LOCK_CODE_OBTAINED: "Lock code obtained.",
+    AuditEvent.LOCK_CODE_FAILED: "Failed to get lock code.",
+    AuditEvent.WEBHOOK_FAILED: "Webhook failed. "
+    "Expected return code '200' but got '{status_code}'.",
+    AuditEvent.ROOM_NOT_FOUND: "No auction room found.",
+    AuditEvent.ITEM_CLOSING: "Closing auction item.",
+    AuditEvent.ITEM_FORCE_CLOSE: "Force close auction item.",
+    AuditEvent.ITEM_CLOSE_FAILED: "Error closing auction item: {error}",
+    AuditEvent.ITEM_NO_BIDS: "No bids for item. Unlocking.",
+    AuditEvent.ITEM_CLOSED: "Closed auction item.",
+    AuditEvent.ITEM_ALREADY_CLOSED: "Item already closed by another process.",
+    AuditEvent.ITEM_SETTLEMENT_FAILED: "Settlement not completed, close to retry.",
+    AuditEvent.WALLET_DELETED: "Soft deleted wallet '{wallet_id}'.",
+    AuditEvent.WALLET_RECYCLED: "Returned wallet '{wallet_id}' to the wallet pool.",
+    AuditEvent.UNIT_TRANSFER_FAILED: "Failed to transfer a unit: {error}",
+    AuditEvent.UNLOCK_WEBHOOK_MISSING: "No unlock webhook.",
+    AuditEvent.ITEM_ALREADY_UNLOCKED: "Item already unlocked.",
+    AuditEvent.ITEM_UNLOCKED: "Unlocked. Resp: {response}.",
+    AuditEvent.TRANSFER_WEBHOOK_MISSING: "No transfer webhook.",
+    AuditEvent.ITEM_TRANSFERRING: "Transferring to new owner.",
+    AuditEvent.ITEM_ALREADY_TRANSFERRED: "Item already transfered to new owner.",
+    AuditEvent.ITEM_TRANSFERRED: "Transfered. Resp: {response}",
+    AuditEvent.BID_PLACING: "Placing bid. Memo: {memo}",
+    AuditEvent.BID_REJECTED: "Bid rejected: {reason}",
+    AuditEvent.BID_PLACED: "Placed bid '{memo}'. "
+    "Amount: {amount} {currency}. Payment: {payment_hash}.",
+    AuditEvent.PAYMENT_RECEIVED: "Payment received. "
+    "Amount: {amount_sat} sat. {amount} {currency}. Payment: {payment_hash}.",
+    AuditEvent.PAYMENT_AMOUNT_MISMATCH: "Payment amount different than bid amount. "
+    "Payment amount: {payment_sat} sat. Bid amount: {amount_sat} sat.",
+    AuditEvent.PAYMENT_UNKNOWN_ITEM: "Payment received for unknown auction item.",
+    AuditEvent.PAYMENT_FOR_CLOSED_ITEM: "Payment received for closed auction.",
+    AuditEvent.PAYMENT_TOO_LOW: "Payment received for bid too low. "
+    "Bid: {amount}. Next Min Bid: {next_min_bid}.",
+    AuditEvent.PAYMENT_SOLD_OUT: "Payment received after the reservation expired. "
+    "No units left.",
+    AuditEvent.RESERVATION_RELEASED: "Invoice expired. Unit returned to stock.",
+    AuditEvent.BID_ACCEPTING: "Accepting bid.",
+    AuditEvent.BUY_ACCEPTING: "Accepting buy.",
+    AuditEvent.BID_ACCEPTED: "Bid accepted. Amount: {amount_sat} sat. "
+    "{amount} {currency}.",
+    AuditEvent.PROXY_BID_RAISED: "Proxy bid raised to {amount} {currency}.",
+    AuditEvent.BID_OUTBID: "Outbid by a proxy bid at {amount} {currency}.",
+    AuditEvent.REFUNDING: "Refunding bid.",
+    AuditEvent.REFUNDED: "Refunded: {refunded}.",
+    AuditEvent.REFUND_PREVIOUS_WINNER: "Refunding previous winner.",
+    AuditEvent.REFUND_NOTHING: "First bid. Nothing to refund.",
+    AuditEvent.REFUND_PAID: "Refund paid to {destination}.",
+    AuditEvent.REFUND_FAILED: "Failed to refund bid to {destination}: {error}",
+    AuditEvent.REFUND_NO_WALLET: "No wallet found for refund.",
+    AuditEvent.REFUND_DEPOSIT: "Refunding {amount_sat} sat of the proxy bid deposit.",
+    AuditEvent.REFUND_BATCH_DONE: "Refunded {refunded} of {count} outbid bids.",
+    AuditEvent.SEALED_BID_DUPLICATE: "Payment received for a second sealed bid.",
+    AuditEvent.SEALED_WINNER: "Winner out of {count} sealed bids. "
+    "Bid: {bid_amount}. Price: {amount} {currency}.",
+    AuditEvent.LN_ADDRESS_ERROR: "Lightning Address {ln_address}: {reason}",
+    AuditEvent.SETTLEMENT_STARTED: "Paying fee and owner.",
+    AuditEvent.SETTLEMENT_DONE: "Fee paid: {fee_paid}. Owner paid: {owner_paid}.",
+    AuditEvent.FEE_PAYING: "Paying fee: {amount_sat} sat.",
+    AuditEvent.FEE_ALREADY_PAID: "Fee already paid.",
+    AuditEvent.FEE_PAID: "Fee paid.",
+    AuditEvent.FEE_FAILED: "Failed to pay fee: {error}",
+    AuditEvent.OWNER_PAYING: "Paying owner: {amount_sat} sat.",
+    AuditEvent.OWNER_ALREADY_PAID: "Owner already paid.",
+    AuditEvent.OWNER_PAID: "Owner paid.",
+    AuditEvent.OWNER_NOT_PAID: "Owner NOT paid.",
+    AuditEvent.OWNER_PAYMENT_FAILED: "Failed to pay owner: {error}",
+    AuditEvent.OWNER_TRANSFER: "Paying owner to {destination}.",
+    AuditEvent.OWNER_TRANSFER_DONE: "Paid owner to {destination}.",
+    AuditEvent.OWNER_TRANSFER_FAILED: "Failed to pay owner to {destination}: {error}",
+    AuditEvent.STATS_REBUILDING: "Rebuilding room stats.",
+    AuditEvent.STATS_REBUILT: "Rebuilt room stats.",
+    AuditEvent.STATS_FAILED: "Failed to update room stats: {error}",
+    AuditEvent.WEBSOCKET_FAILED: "Failed to notify websocket: {error}",
+}
+
+
+class _MissingKeys(dict):
+    def __missing__(self, key: str) -> str:
+        return f"{{{key}}}"
+
+
 class PublicAuditEntry(BaseModel):
     entry_id: str
-    data: str
+    # free text, only used by entries created before the typed events
+    data: str = ""
+    event: Optional[AuditEvent] = None
+    bid_id: Optional[str] = None
+    payload: dict = {}
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+    def render(self) -> str:
+        if not self.event:
+            return self.data
+        message = self.event.template.format_map(_MissingKeys(self.payload))
+        if self.bid_id:
+            message += f" Bid: {self.bid_id}."
+        return message
+
 
 class AuditEntry(PublicAuditEntry):
     id: Optional[int] = None
 
 
 class AuditEntryFilters(FilterModel):
-    __search_fields__ = ["entry_id", "data"]
+    __search_fields__ = ["entry_id", "data", "payload"]
 
-    __sort_fields__ = ["entry_id", "created_at"]
+    __sort_fields__ = ["entry_id", "event", "created_at"]
 
     entry_id: str | None
+    event: str | None
+    bid_id: str | None
     data: str | None
     created_at: datetime | None
+
+
+class RoomDailyStats(BaseModel):
+    auction_room_id: str
+    day: str  # YYYY-MM-DD (UTC)
+    closed_items: int = 0
+    sold_items: int = 0
+    sales_volume: float = 0
+    sales_volume_sat: int = 0
+
+
+class RoomStats(BaseModel):
+    auction_room_id: str
+    bid_count: int = 0
+    bid_volume_sat: int = 0
+    unique_bidders: int = 0
+    closed_items: int = 0
+    sold_items: int = 0
+    sales_volume: float = 0
+    sales_volume_sat: int = 0
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    average_final_price: float = Field(default=0, no_database=True)
+    average_final_price_sat: float = Field(default=0, no_database=True)
+    daily: list[RoomDailyStats] = Field(default=[], no_database=True)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.sold_items:
+            self.average_final_price = round(self.sales_volume / self.sold_items, 2)
+            self.average_final_price_sat = round(
+                self.sales_volume_sat / self.sold_items, 2
+            )
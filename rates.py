@@ -0,0 +1,84 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from lnbits.utils.exchange_rates import get_fiat_rate_satoshis
+from loguru import logger
+
+
+@dataclass
+class RateSnapshot:
+    currency: str
+    sats_per_unit: float
+    fetched_at: float
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class FiatRateCache:
+    """
+    Last fetched exchange rate of each fiat currency, shared by all the rooms.
+    A rate is fetched again once it is older than the refresh interval asked for
+    by the caller. If the refresh fails the previous rate is used, as long as it
+    is not older than `max_stale_seconds`, and the providers are not asked again
+    for `retry_seconds`.
+    """
+
+    def __init__(self, max_stale_seconds: int = 600, retry_seconds: int = 10):
+        self.max_stale_seconds = max_stale_seconds
+        self.retry_seconds = retry_seconds
+        self._snapshots: dict[str, RateSnapshot] = {}
+        self._failed_at: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def snapshot(self, currency: str) -> Optional[RateSnapshot]:
+        return self._snapshots.get(currency.upper())
+
+    async def sats_per_unit(self, currency: str, refresh_seconds: int = 60) -> float:
+        currency = currency.upper()
+        snapshot = self._snapshots.get(currency)
+        if snapshot and snapshot.age_seconds < refresh_seconds:
+            return snapshot.sats_per_unit
+
+        # only one request per currency goes to the rate providers
+        async with self._locks.setdefault(currency, asyncio.Lock()):
+            snapshot = self._snapshots.get(currency)
+            if snapshot and snapshot.age_seconds < refresh_seconds:
+                return snapshot.sats_per_unit
+            try:
+                rate = await self._fetch_rate(currency)
+            except Exception as e:
+                if snapshot and snapshot.age_seconds < self.max_stale_seconds:
+                    logger.warning(f"Using previous {currency} rate: {e}")
+                    return snapshot.sats_per_unit
+                raise ValueError(f"Cannot get the {currency} exchange rate.") from e
+            self._snapshots[currency] = RateSnapshot(
+                currency=currency, sats_per_unit=rate, fetched_at=time.monotonic()
+            )
+            return rate
+
+    async def _fetch_rate(self, currency: str) -> float:
+        failed_at = self._failed_at.get(currency)
+        if failed_at and time.monotonic() - failed_at < self.retry_seconds:
+            raise ValueError("Rate providers failed recently.")
+        try:
+            rate = await get_fiat_rate_satoshis(currency)
+        except Exception:
+            self._failed_at[currency] = time.monotonic()
+            raise
+        self._failed_at.pop(currency, None)
+        return rate
+
+    async def to_sat(
+        self, amount: float, currency: str, refresh_seconds: int = 60
+    ) -> int:
+        if currency.lower() == "sat":
+            return int(amount)
+        # same rounding as LNbits core
+        return int(amount * await self.sats_per_unit(currency, refresh_seconds))
+
+
+fiat_rates = FiatRateCache()
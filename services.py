@@ -1,12 +1,26 @@
 import asyncio
+import gzip
 import json
-from datetime import datetime, timezone
-from typing import Any, Optional
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Union
 
 import bolt11
 import httpx
-from lnbits.core.crud import get_wallet, get_wallets
-from lnbits.core.crud.wallets import create_wallet, delete_wallet_by_id
+from lnbits.core.crud import (
+    get_payments,
+    get_standalone_payment,
+    get_wallet,
+    get_wallets,
+)
+from lnbits.core.crud.wallets import (
+    create_wallet,
+    delete_wallet_by_id,
+    update_wallet,
+)
 from lnbits.core.models import Payment
 from lnbits.core.services import create_invoice, pay_invoice
 from lnbits.core.services.websockets import websocket_updater
@@ -16,43 +30,134 @@ from lnbits.helpers import (
     is_valid_email_address,
     urlsafe_short_hash,
 )
+from lnbits.settings import settings
+from lnbits.tasks import create_task
 from loguru import logger
 
+from .cache import (
+    bid_response_cache,
+    bidded_items_cache,
+    catalog_cache,
+    processed_payments_cache,
+)
 from .crud import (
-    close_auction,
+    AuctionItemConflictError,
+    acquire_lease,
+    claim_auction_item_close,
+    claim_bid_reservation,
+    count_auction_items,
+    count_item_reservations,
+    count_pooled_wallets,
     create_auction_item,
     create_auction_room,
     create_audit_entry,
     create_bid,
+    create_pooled_wallet,
+    create_processed_payments,
+    create_room_stats,
+    delete_auction_items,
+    delete_auction_room,
+    delete_audit_entries,
+    delete_audit_entries_batch,
+    delete_bids_batch,
+    delete_processed_payment,
+    delete_room_stats,
+    delete_settled_processed_payments,
+    delete_unpaid_bids,
     get_active_auction_items,
+    get_all_auction_rooms,
     get_auction_item_by_id,
+    get_auction_items_batch,
+    get_auction_items_by_ids,
     get_auction_items_paginated,
     get_auction_room_by_id,
+    get_auction_room_owners,
     get_auction_rooms,
-    get_bid_by_payment_hash,
+    get_bids_by_payment_hashes,
+    get_closed_auction_items,
+    get_expired_audit_entries,
+    get_expired_reservations,
+    get_expired_unpaid_bids,
+    get_outstanding_bid,
+    get_room_daily_stats,
+    get_room_paid_bids,
+    get_room_stats,
     get_top_bid,
+    get_unpaid_bids_of_active_items,
+    get_unrefunded_bids,
     get_user_bidded_items_ids,
+    get_wallet_pool_sizes,
+    get_winning_bids,
+    has_paid_bid,
+    release_bid_reservation,
+    release_lease,
+    reserve_auction_item_unit,
+    return_auction_item_unit,
+    set_auction_item_state,
+    set_bid_paid,
+    set_bid_refunded,
+    take_pooled_wallet,
     update_auction_item,
     update_auction_item_top_price,
     update_bid,
+    update_room_stats_for_bid,
+    update_room_stats_for_closed_item,
     update_top_bid,
 )
+from .events import has_subscribers, publish
+from .helpers import epoch_ms
+from .limits import outstanding_invoices
 from .models import (
     AuctionItem,
     AuctionItemExtra,
     AuctionItemFilters,
+    AuctionItemState,
     AuctionRoom,
     AuctionRoomConfig,
+    AuctionRoomDeletion,
+    AuditEntry,
+    AuditEvent,
     Bid,
     BidRequest,
     BidResponse,
     CreateAuctionItem,
     CreateAuctionRoomData,
     PublicAuctionItem,
+    PublicAuditEntry,
+    RoomDailyStats,
+    RoomStats,
     Webhook,
 )
-
-bid_lock = asyncio.Lock()
+from .rates import fiat_rates
+
+_item_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+# identifies this LNbits worker in the leases shared by all the workers
+WORKER_ID = urlsafe_short_hash()
+LEADER_LEASE_SECONDS = 90
+ITEM_LEASE_SECONDS = 120
+auction_room_deletions: dict[str, AuctionRoomDeletion] = {}
+
+# empty escrow wallets kept ready for each room owner
+WALLET_POOL_SIZE = 3
+WALLET_POOL_NAME = "AH: unused escrow"
+
+# refunds of outbid bids paid at the same time by a refund batch
+REFUND_WORKERS = 4
+_refund_batches: dict[str, asyncio.Task] = {}
+
+# fields of an item sent to the room streams when a bid is accepted
+ROOM_ITEM_FIELDS = {
+    "id",
+    "current_price",
+    "current_price_sat",
+    "bid_count",
+    "next_min_bid",
+    "next_min_bid_sat",
+    "expires_at",
+    "expires_at_ms",
+    "server_time_ms",
+    "stock",
+}
 
 
 async def get_user_auction_rooms(user_id: str) -> list[AuctionRoom]:
@@ -78,17 +183,96 @@ async def create_user_auction_room(
     return await create_auction_room(auction_room)
 
 
+async def start_auction_room_deletion(auction_room: AuctionRoom) -> AuctionRoomDeletion:
+    deletion = auction_room_deletions.get(auction_room.id)
+    if deletion and not deletion.done and not deletion.error:
+        return deletion
+
+    deletion = AuctionRoomDeletion(
+        auction_room_id=auction_room.id,
+        user_id=auction_room.user_id,
+        items_total=await count_auction_items(auction_room.id),
+    )
+    auction_room_deletions[auction_room.id] = deletion
+    create_task(delete_auction_room_data(auction_room, deletion))
+    return deletion
+
+
+async def delete_auction_room_data(
+    auction_room: AuctionRoom,
+    deletion: Optional[AuctionRoomDeletion] = None,
+    batch_size: int = 50,
+) -> AuctionRoomDeletion:
+    """
+    Delete the items of a room (with their bids, audit entries and wallets) in
+    small batches, so a large room does not hold the database for long.
+    The room row is removed last, so an interrupted deletion can be restarted.
+    """
+    if not deletion:
+        deletion = AuctionRoomDeletion(
+            auction_room_id=auction_room.id, user_id=auction_room.user_id
+        )
+    logger.info(f"[auction_house] Deleting auction room {auction_room.id}.")
+    try:
+        while True:
+            items = await get_auction_items_batch(auction_room.id, batch_size)
+            if not items:
+                break
+            item_ids = [item.id for item in items]
+            deletion.bids_deleted += await _delete_in_batches(
+                delete_bids_batch, item_ids
+            )
+            deletion.audit_entries_deleted += await _delete_in_batches(
+                delete_audit_entries_batch, item_ids
+            )
+            for item in items:
+                if await delete_wallet_by_id(item.extra.wallet_id):
+                    deletion.wallets_deleted += 1
+            deletion.items_deleted += await delete_auction_items(item_ids)
+            await ws_notify(auction_room.id, {"status": "deleting", **deletion.dict()})
+
+        deletion.audit_entries_deleted += await _delete_in_batches(
+            delete_audit_entries_batch, [auction_room.id]
+        )
+        await delete_room_stats(auction_room.id)
+        await delete_auction_room(auction_room.user_id, auction_room.id)
+        catalog_cache.invalidate(auction_room.id)
+        deletion.done = True
+        logger.info(f"[auction_house] Deleted auction room {auction_room.id}.")
+    except Exception as e:
+        deletion.error = str(e)
+        logger.warning(f"Failed to delete auction room {auction_room.id}: {e}")
+
+    await ws_notify(auction_room.id, {"status": "deleted", **deletion.dict()})
+    return deletion
+
+
+def is_auction_room_deleting(auction_room_id: str) -> bool:
+    deletion = auction_room_deletions.get(auction_room_id)
+    return deletion is not None and not deletion.error
+
+
 async def add_auction_item(
     auction_room: AuctionRoom, user_id: str, data: CreateAuctionItem
 ) -> AuctionItem:
+    if is_auction_room_deleting(auction_room.id):
+        raise ValueError("Auction Room is being deleted.")
+
     if data.ask_price <= 0:
         message = f"Ask price must be positive. Got {data.ask_price}."
-        await db_log(auction_room.id, message)
+        await db_log(auction_room.id, AuditEvent.ITEM_INVALID, reason=message)
         raise ValueError(message)
 
     if data.ln_address and not is_valid_email_address(data.ln_address):
         message = f"Invalid Lightning Address: {data.ln_address}."
-        await db_log(auction_room.id, message)
+        await db_log(auction_room.id, AuditEvent.ITEM_INVALID, reason=message)
+        raise ValueError(message)
+
+    if data.quantity < 1 or (data.quantity > 1 and not auction_room.is_fixed_price):
+        message = (
+            f"Quantity must be 1, or more in fixed price rooms. Got {data.quantity}."
+        )
+        await db_log(auction_room.id, AuditEvent.ITEM_INVALID, reason=message)
         raise ValueError(message)
 
     extra = AuctionItemExtra(
@@ -101,6 +285,8 @@ async def add_auction_item(
         name=data.name.strip(),
         description=data.description,
         ask_price=data.ask_price,
+        quantity=data.quantity,
+        stock=data.quantity,
         user_id=user_id,
         auction_room_id=auction_room.id,
         expires_at=datetime.now(timezone.utc)
@@ -110,26 +296,26 @@ async def add_auction_item(
 
     wh = auction_room.extra.lock_webhook
     if not wh.url:
-        await db_log(item.id, f"No lock webhook for auction room {auction_room.id}.")
+        await db_log(item.id, AuditEvent.LOCK_WEBHOOK_MISSING, room_id=auction_room.id)
     else:
         lock_data = await call_webhook_for_auction_item(
             item.id, wh, placeholders={"transfer_code": data.transfer_code}
         )
         lock_code = lock_data.get("lock_code", None)
         if not lock_code:
-            await db_log(item.id, f"Failed to get lock code {item.name} ({item.id}).")
+            await db_log(item.id, AuditEvent.LOCK_CODE_FAILED)
             raise ValueError("Lock Webhook did not return a code.")
         item.extra.lock_code = lock_code
-        await db_log(item.id, f"Lock code obtained {item.name} ({item.id}).")
+        await db_log(item.id, AuditEvent.LOCK_CODE_OBTAINED)
 
-    item_wallet = await create_wallet(
-        user_id=auction_room.user_id, wallet_name=f"AH: {item.name}"
+    item.extra.wallet_id = await take_item_wallet(
+        auction_room.user_id, f"AH: {item.name}"
     )
-    item.extra.wallet_id = item_wallet.id
 
     await create_auction_item(item)
+    catalog_cache.invalidate(auction_room.id)
     await db_log(
-        item.id, f"Added item {item.name} ({item.id})." f" Wallet id: {item_wallet.id}."
+        item.id, AuditEvent.ITEM_ADDED, name=item.name, wallet_id=item.extra.wallet_id
     )
     return await get_auction_item_details(item, user_id)
 
@@ -144,9 +330,7 @@ async def call_webhook_for_auction_item(
         )
         if res.status_code != 200:
             await db_log(
-                item_id,
-                f"Webhook failed. "
-                f"Expected return code '200' but got '{res.status_code}'.",
+                item_id, AuditEvent.WEBHOOK_FAILED, status_code=res.status_code
             )
             raise ValueError("Webhook failed.")
 
@@ -159,16 +343,20 @@ async def get_auction_room_items_paginated(
     include_inactive: Optional[bool] = None,
     user_is_owner: Optional[bool] = None,
     user_is_participant: Optional[bool] = None,
+    text_search: Optional[str] = None,
     filters: Optional[Filters[AuctionItemFilters]] = None,
 ) -> Page[AuctionItem]:
-    bidded_items_ids = await get_user_bidded_items_ids(user_id) if user_id else []
+    bidded_items_ids = (
+        await get_user_bidded_items(user_id, auction_room.id) if user_id else set()
+    )
 
     owner_user_id = user_id if user_is_owner else None
     page = await get_auction_items_paginated(
         auction_room_id=auction_room.id,
         include_inactive=include_inactive,
         user_id=owner_user_id,
-        auction_item_ids=bidded_items_ids if user_is_participant else None,
+        auction_item_ids=sorted(bidded_items_ids) if user_is_participant else None,
+        text_search=text_search,
         filters=filters,
     )
 
@@ -178,6 +366,16 @@ async def get_auction_room_items_paginated(
     return page
 
 
+async def get_user_bidded_items(user_id: str, auction_room_id: str) -> set[str]:
+    item_ids = bidded_items_cache.get(user_id, auction_room_id)
+    if item_ids is not None:
+        return item_ids
+    version = bidded_items_cache.version
+    item_ids = set(await get_user_bidded_items_ids(user_id, auction_room_id))
+    bidded_items_cache.set(user_id, auction_room_id, item_ids, version)
+    return item_ids
+
+
 async def get_auction_item(
     item_id: str,
     user_id: Optional[str] = None,
@@ -193,35 +391,51 @@ async def get_auction_item_details(
     item: AuctionItem,
     user_id: Optional[str] = None,
     auction_room: Optional[AuctionRoom] = None,
-    bidded_items_ids: Optional[list[str]] = None,
+    bidded_items_ids: Optional[set[str]] = None,
+    top_bids: Optional[dict[str, Optional[Bid]]] = None,
 ) -> AuctionItem:
+    """
+    `bidded_items_ids` and `top_bids` (by item id) are used when the caller
+    already loaded them.
+    """
     if not auction_room:
         auction_room = await get_auction_room_by_id(item.auction_room_id)
 
-    top_bid = await get_top_bid(item.id)
+    if auction_room and are_bids_hidden(item, auction_room):
+        top_bid = None
+    elif top_bids is not None:
+        top_bid = top_bids.get(item.id)
+    else:
+        top_bid = await get_top_bid(item.id)
     if top_bid:
         item.current_price_sat = top_bid.amount_sat
         item.current_price = top_bid.amount
         item.user_is_top_bidder = top_bid.user_id == user_id
 
     if user_id and bidded_items_ids is None:
-        bidded_items_ids = await get_user_bidded_items_ids(user_id)
-    if item.id in (bidded_items_ids or []):
+        bidded_items_ids = await get_user_bidded_items(user_id, item.auction_room_id)
+    if item.id in (bidded_items_ids or set()):
         item.user_is_participant = True
     item.user_is_owner = item.user_id == user_id
 
-    item.time_left_seconds = max(0, int(item.time_left.total_seconds()))
+    now = datetime.now(timezone.utc)
+    time_left = item.expires_at.astimezone(timezone.utc) - now
+    item.time_left_seconds = max(0, int(time_left.total_seconds()))
+    item.expires_at_ms = epoch_ms(item.expires_at)
+    item.server_time_ms = epoch_ms(now)
 
     if not auction_room:
         return item
     item.currency = auction_room.currency
-    if item.time_left_seconds > 0:
+    # not `time_left_seconds`, it is 0 during the last second of the auction
+    if time_left.total_seconds() > 0:
         if item.current_price == 0:
             item.next_min_bid = round(item.ask_price, 2)
         else:
             item.next_min_bid = round(
                 item.current_price * (1 + auction_room.min_bid_up_percentage / 100), 2
             )
+        item.next_min_bid_sat = await _next_min_bid_sat(item, auction_room)
 
     else:
         item.active = False
@@ -229,6 +443,77 @@ async def get_auction_item_details(
     return item
 
 
+def are_bids_hidden(item: AuctionItem, auction_room: AuctionRoom) -> bool:
+    """
+    Sealed bids are hidden until the winner is picked and the item is settled.
+    """
+    return auction_room.is_sealed and item.state != AuctionItemState.SETTLED
+
+
+async def _next_min_bid_sat(item: AuctionItem, auction_room: AuctionRoom) -> int:
+    try:
+        return await fiat_rates.to_sat(
+            item.next_min_bid,
+            auction_room.currency,
+            auction_room.extra.rate_refresh_seconds,
+        )
+    except ValueError as e:
+        logger.warning(f"[auction_house][{item.id}]: {e}")
+        return 0
+
+
+async def get_auction_room_stats(auction_room_id: str, days: int = 30) -> RoomStats:
+    stats = await get_room_stats(auction_room_id) or RoomStats(
+        auction_room_id=auction_room_id
+    )
+    since_day = _stats_day(datetime.now(timezone.utc) - timedelta(days=days))
+    stats.daily = await get_room_daily_stats(auction_room_id, since_day)
+    return stats
+
+
+async def rebuild_auction_room_stats(auction_room_id: str) -> RoomStats:
+    """
+    Recompute the room statistics from the bids and items tables.
+    The closing day of old items is not stored, so it is approximated by the
+    winning bid date (sold items) or by the expiry date (unsold items).
+    """
+    await db_log(auction_room_id, AuditEvent.STATS_REBUILDING)
+    bids = await get_room_paid_bids(auction_room_id)
+    closed_items = await get_closed_auction_items(auction_room_id)
+    winning_bids: dict[str, list[Bid]] = {}
+    for bid in bids:
+        if not bid.higher_bid_made:
+            winning_bids.setdefault(bid.auction_item_id, []).append(bid)
+
+    stats = RoomStats(
+        auction_room_id=auction_room_id,
+        bid_count=len(bids),
+        bid_volume_sat=sum(bid.amount_sat for bid in bids),
+        unique_bidders=len({bid.user_id for bid in bids}),
+    )
+    daily_stats: dict[str, RoomDailyStats] = {}
+    now = datetime.now(timezone.utc)
+    for item in closed_items:
+        top_bid = _item_sale(winning_bids.get(item.id, []))
+        day = _stats_day(top_bid.created_at if top_bid else min(item.expires_at, now))
+        day_stats = daily_stats.setdefault(
+            day, RoomDailyStats(auction_room_id=auction_room_id, day=day)
+        )
+        _add_closed_item_to_stats(stats, top_bid)
+        _add_closed_item_to_stats(day_stats, top_bid)
+
+    await delete_room_stats(auction_room_id)
+    await create_room_stats(
+        stats, daily_stats.values(), bidders={bid.user_id for bid in bids}
+    )
+    for item in closed_items:
+        if not item.extra.is_stats_recorded:
+            await update_auction_item_with_retry(item, _set_stats_recorded)
+
+    await db_log(auction_room_id, AuditEvent.STATS_REBUILT)
+    return await get_auction_room_stats(auction_room_id)
+
+
 async def checked_expired_auctions():
     auction_items = await get_active_auction_items()
     for item in auction_items:
@@ -237,42 +522,232 @@ async def checked_expired_auctions():
         try:
             await close_auction_item(item)
         except Exception as e:
-            await db_log(item.id, f"Error closing auction item {item.id}: {e}")
+            await db_log(item.id, AuditEvent.ITEM_CLOSE_FAILED, error=str(e))
+
+
+async def close_auction_item(item: AuctionItem, retry_failed: bool = False) -> bool:
+    """
+    Close the auction and settle the item. Only the caller that moves the item
+    from `active` to `closing` settles it, the others get False.
+    With `retry_failed` a failed settlement is run again, the steps that were
+    completed (flags in the item extra) are skipped.
+    The close holds the item lock, it does not run in the middle of a payment.
+    """
+    async with item_lock(item.id):
+        return await _close_auction_item(item, retry_failed)
+
+
+async def _close_auction_item(item: AuctionItem, retry_failed: bool = False) -> bool:
+    """
+    The caller holds the item lock (the lock is not reentrant).
+    """
+    from_states = [AuctionItemState.ACTIVE]
+    if retry_failed:
+        from_states.append(AuctionItemState.FAILED)
+    if not await claim_auction_item_close(item.id, from_states):
+        await db_log(item.id, AuditEvent.ITEM_ALREADY_CLOSED)
+        return False
+    await db_log(item.id, AuditEvent.ITEM_CLOSING)
+    catalog_cache.invalidate(item.auction_room_id)
 
+    try:
+        stored_item = await get_auction_item_by_id(item.id)
+        if not stored_item:
+            raise ValueError(f"Auction Item not found for id {item.id}.")
+        item = stored_item
+        top_bid = await _pick_winner(item)
+        if not top_bid:
+            await db_log(item.id, AuditEvent.ITEM_NO_BIDS)
+            await unlock_auction_item(item)
+        else:
+            # items with several units are transferred to each buyer on payment
+            if item.quantity == 1:
+                await transfer_auction_item(item, top_bid.user_id)
+            await pay_auction_item(item, top_bid)
+        bids_refunded = await refund_outbid_bids(item, top_bid, closing=True)
+
+        await _record_closed_item_stats(item, top_bid)
+        is_settled = (item.extra.is_owner_paid or (not top_bid)) and bids_refunded
+        if is_settled:
+            await release_item_wallet(item)
+    except Exception:
+        await set_auction_item_state(item.id, AuctionItemState.FAILED)
+        raise
+
+    if is_settled:
+        await set_auction_item_state(item.id, AuctionItemState.SETTLED)
+        await db_log(item.id, AuditEvent.ITEM_CLOSED)
+    else:
+        await set_auction_item_state(item.id, AuctionItemState.FAILED)
+        await db_log(item.id, AuditEvent.ITEM_SETTLEMENT_FAILED)
 
-async def close_auction_item(item: AuctionItem):
-    await db_log(item.id, f"Closing auction item {item.name} ({item.id}).")
-    item.active = False
-    await update_auction_item(item)
+    await ws_notify(item.id, {"status": "closed"})
+    closed_data = json.dumps({"auction_item_id": item.id, "server_time_ms": epoch_ms()})
+    publish(item.id, "closed", closed_data)
+    publish(item.auction_room_id, "closed", closed_data)
+    return True
+
+
+async def refund_outbid_bids(
+    item: AuctionItem,
+    top_bid: Optional[Bid] = None,
+    closing: bool = False,
+    workers: int = REFUND_WORKERS,
+) -> bool:
+    """
+    Refund the outbid bids of an item, at most `workers` payments at a time.
+    Proxy bids are only refunded at close: the outbid ones in full, the winning
+    one what it did not spend.
+    False if a refund failed, the next batch (or the close retry) runs it again.
+    """
+    refund_batch = _refund_batches.get(item.id) if closing else None
+    if refund_batch:
+        # the last batch scheduled for the item finishes first
+        await asyncio.gather(refund_batch, return_exceptions=True)
+    bids = await get_unrefunded_bids(item.id)
+    if not closing:
+        bids = [bid for bid in bids if not bid.is_proxy]
+    if not bids:
+        return True
+    semaphore = asyncio.Semaphore(workers)
+
+    async def _refund(bid: Bid) -> bool:
+        is_winner = top_bid is not None and bid.id == top_bid.id
+        amount = (bid.max_amount or bid.amount) - (bid.amount if is_winner else 0)
+        amount_sat = bid.paid_sat - (bid.amount_sat if is_winner else 0)
+        async with semaphore:
+            if bid.is_proxy and amount_sat > 0:
+                await db_log(
+                    item.id, AuditEvent.REFUND_DEPOSIT, bid.id, amount_sat=amount_sat
+                )
+            return await _refund_bid(bid, amount, amount_sat)
+
+    results = await asyncio.gather(*[_refund(bid) for bid in bids])
+    await db_log(
+        item.id, AuditEvent.REFUND_BATCH_DONE, refunded=sum(results), count=len(bids)
+    )
+    return all(results)
 
-    top_bid = await get_top_bid(item.id)
-    if not top_bid:
-        await db_log(item.id, f"No bids for item {item.name} ({item.id}). Unlocking.")
-        await unlock_auction_item(item)
-    else:
-        await transfer_auction_item(item, top_bid.user_id)
-        await pay_auction_item(item, top_bid)  # todo; transfer will fail a second time
 
-    await close_auction(item.id)
+def schedule_outbid_refunds(item: AuctionItem) -> None:
+    """
+    Refund the outbid bids of the item in the background. The batches of an
+    item run one after the other, the close waits for the last one.
+    """
+    previous = _refund_batches.get(item.id)
 
-    if item.extra.is_owner_paid or (not top_bid):
+    async def _run():
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await refund_outbid_bids(item)
+        except Exception as e:
+            logger.warning(f"[auction_house][{item.id}]: refund batch failed: {e}")
+
+    task = create_task(_run())
+    _refund_batches[item.id] = task
+
+    def _done(_):
+        if _refund_batches.get(item.id) is task:
+            del _refund_batches[item.id]
+
+    task.add_done_callback(_done)
+
+
+async def _pick_winner(item: AuctionItem) -> Optional[Bid]:
+    """
+    The top bid of a closed item, the sealed bids are opened first.
+    """
+    auction_room = await get_auction_room_by_id(item.auction_room_id)
+    if auction_room and auction_room.is_sealed:
+        return await _pick_sealed_winner(item, auction_room)
+    return _item_sale(await get_winning_bids(item.id))
+
+
+async def _pick_sealed_winner(
+    item: AuctionItem, auction_room: AuctionRoom
+) -> Optional[Bid]:
+    """
+    The highest sealed bid wins, the earliest one on ties. In second price rooms
+    it pays the second highest bid (or the ask price), what it paid over that is
+    refunded with the losing bids.
+    Safe to run again when the settlement is retried.
+    """
+    bids = await get_winning_bids(item.id)
+    if not bids:
+        return None
+    # the price of the winner is kept in the bid, as for proxy bids
+    priced = [bid for bid in bids if bid.max_amount is not None]
+    if priced:
+        winner = priced[0]
+    else:
+        ranked = sorted(bids, key=lambda bid: (-bid.amount, bid.created_at))
+        winner = ranked[0]
+        price = winner.amount
+        if auction_room.is_second_price:
+            second = ranked[1].amount if len(ranked) > 1 else item.ask_price
+            price = min(winner.amount, max(second, item.ask_price))
+        winner.max_amount = winner.amount
+        winner.max_amount_sat = winner.amount_sat
+        _set_proxy_bid_amount(winner, price)
+        await update_bid(winner)
         await db_log(
             item.id,
-            f"Soft deleted wallet '{item.extra.wallet_id}' "
-            f"for  {item.name} ({item.id}).",
+            AuditEvent.SEALED_WINNER,
+            winner.id,
+            count=len(bids),
+            bid_amount=winner.max_amount,
+            amount=winner.amount,
+            currency=winner.currency,
         )
-        await delete_wallet_by_id(item.extra.wallet_id)
+    await update_top_bid(item.id, winner.id)
+    await update_auction_item_top_price(item.id, winner.amount)
+    return winner
+
+
+def _item_sale(winning_bids: list[Bid]) -> Optional[Bid]:
+    """
+    The top bid of an auction. For the units of a fixed price item, the last
+    buy with the amounts of all the buys.
+    """
+    if len(winning_bids) < 2:
+        return winning_bids[0] if winning_bids else None
+    return winning_bids[-1].copy(
+        update={
+            "amount": sum(bid.amount for bid in winning_bids),
+            "amount_sat": sum(bid.amount_sat for bid in winning_bids),
+        }
+    )
 
-    await db_log(item.id, f"Closed auction item {item.name} ({item.id}).")
-    await ws_notify(item.id, {"status": "closed"})
+
+async def update_auction_item_with_retry(
+    item: AuctionItem, change: Callable[[AuctionItem], None], attempts: int = 5
+) -> AuctionItem:
+    """
+    Apply `change` to the item and store it. If the item was updated meanwhile,
+    it is loaded again (in place) and `change` is applied to the fresh copy.
+    """
+    for _ in range(attempts - 1):
+        change(item)
+        try:
+            return await update_auction_item(item)
+        except AuctionItemConflictError:
+            stored_item = await get_auction_item_by_id(item.id)
+            if not stored_item:
+                raise
+            for name, field in AuctionItem.__fields__.items():
+                if not field.field_info.extra.get("no_database"):
+                    setattr(item, name, getattr(stored_item, name))
+    change(item)
+    return await update_auction_item(item)
 
 
 async def pay_auction_item(item: AuctionItem, top_bid: Bid):
-    await db_log(item.id, f"Paying fee and owner for {item.name} ({item.id}).")
+    await db_log(item.id, AuditEvent.SETTLEMENT_STARTED, bid_id=top_bid.id)
     auction_room = await get_auction_room_by_id(item.auction_room_id)
     if not auction_room:
         message = f"No auction room found for item {item.name} ({item.id}."
-        await db_log(item.id, message)
+        await db_log(item.id, AuditEvent.ROOM_NOT_FOUND)
         raise ValueError(message)
 
     fee_amount_sat = int(top_bid.amount_sat * auction_room.room_percentage / 100)
@@ -281,54 +756,57 @@ async def pay_auction_item(item: AuctionItem, top_bid: Bid):
     is_fee_paid = await _pay_fee_for_ended_auction(
         item, item.extra.wallet_id, auction_room.fee_wallet_id, fee_amount_sat
     )
-    await db_log(item.id, f"Fee paid: {is_fee_paid}. Item {item.name} ({item.id}).")
 
     is_owner_paid = await _pay_owner_for_ended_auction(
         item, item.extra.wallet_id, owner_amount_sat
     )
-    await db_log(item.id, f"Owner paid: {is_owner_paid}. Item {item.name} ({item.id}).")
+    await db_log(
+        item.id,
+        AuditEvent.SETTLEMENT_DONE,
+        bid_id=top_bid.id,
+        fee_paid=is_fee_paid,
+        owner_paid=is_owner_paid,
+    )
 
 
 async def unlock_auction_item(item: AuctionItem):
     if item.extra.is_unlocked:
-        await db_log(item.id, f"Item {item.name} ({item.id}) already unlocked.")
+        await db_log(item.id, AuditEvent.ITEM_ALREADY_UNLOCKED)
         return None
     auction_room = await get_auction_room_by_id(item.auction_room_id)
     if not auction_room:
         message = f"No auction room found for item {item.name} ({item.id}."
-        await db_log(item.id, message)
+        await db_log(item.id, AuditEvent.ROOM_NOT_FOUND)
         raise ValueError(message)
 
     wh = auction_room.extra.unlock_webhook
     if not wh.url:
-        await db_log(item.id, f"No unlock webhook for item {item.name} ({item.id}).")
+        await db_log(item.id, AuditEvent.UNLOCK_WEBHOOK_MISSING)
         return None
 
     unlock_data = await call_webhook_for_auction_item(
         item.id, wh, placeholders={"lock_code": item.extra.lock_code}
     )
-    item.extra.is_unlocked = True
-    await update_auction_item(item)
-    await db_log(item.id, f"Unlocked {item.name} ({item.id}). Resp: {unlock_data}.")
+    await update_auction_item_with_retry(
+        item, lambda i: setattr(i.extra, "is_unlocked", True)
+    )
+    await db_log(item.id, AuditEvent.ITEM_UNLOCKED, response=unlock_data)
 
 
 async def transfer_auction_item(item: AuctionItem, new_owner_id: str):
-    await db_log(item.id, f"Transferring {item.name} ({item.id}).")
+    await db_log(item.id, AuditEvent.ITEM_TRANSFERRING)
     if item.extra.is_transfered_to_new_owner:
-        await db_log(
-            item.id,
-            f"Item {item.name} ({item.id}) already transfered to new owner.",
-        )
+        await db_log(item.id, AuditEvent.ITEM_ALREADY_TRANSFERRED)
         return None
     auction_room = await get_auction_room_by_id(item.auction_room_id)
     if not auction_room:
         message = f"No auction room found for item {item.name} ({item.id}."
-        await db_log(item.id, message)
+        await db_log(item.id, AuditEvent.ROOM_NOT_FOUND)
         raise ValueError(message)
 
     wh = auction_room.extra.transfer_webhook
     if not wh.url:
-        await db_log(item.id, f"No transfer webhook for item {item.name} ({item.id}).")
+        await db_log(item.id, AuditEvent.TRANSFER_WEBHOOK_MISSING)
         return None
 
     transfer_data = await call_webhook_for_auction_item(
@@ -337,54 +815,63 @@ async def transfer_auction_item(item: AuctionItem, new_owner_id: str):
         placeholders={"lock_code": item.extra.lock_code, "new_owner_id": new_owner_id},
     )
 
-    item.extra.is_transfered_to_new_owner = True
-    await update_auction_item(item)
+    await update_auction_item_with_retry(
+        item, lambda i: setattr(i.extra, "is_transfered_to_new_owner", True)
+    )
+
+    await db_log(item.id, AuditEvent.ITEM_TRANSFERRED, response=transfer_data)
+
 
-    await db_log(item.id, f"Transfered {item.name} ({item.id}). Resp: {transfer_data}")
+async def transfer_auction_item_unit(item: AuctionItem, bid: Bid):
+    auction_room = await get_auction_room_by_id(item.auction_room_id)
+    wh = auction_room.extra.transfer_webhook if auction_room else None
+    if not wh or not wh.url:
+        await db_log(item.id, AuditEvent.TRANSFER_WEBHOOK_MISSING, bid.id)
+        return None
+    try:
+        transfer_data = await call_webhook_for_auction_item(
+            item.id,
+            wh,
+            placeholders={
+                "lock_code": item.extra.lock_code,
+                "new_owner_id": bid.user_id,
+            },
+        )
+    except Exception as e:
+        await db_log(item.id, AuditEvent.UNIT_TRANSFER_FAILED, bid.id, error=str(e))
+        return None
+    await db_log(item.id, AuditEvent.ITEM_TRANSFERRED, bid.id, response=transfer_data)
 
 
 async def place_bid(
     user_id: str, auction_item_id: str, data: BidRequest
 ) -> BidResponse:
-    await db_log(
-        auction_item_id, f"Placing bid for item {auction_item_id}. Memo: {data.memo}"
-    )
+    await db_log(auction_item_id, AuditEvent.BID_PLACING, memo=data.memo)
     auction_item = await get_auction_item(auction_item_id, user_id)
     if not auction_item:
         message = f"Auction Item not found for id {auction_item_id}."
-        await db_log(auction_item_id, message)
+        await db_log(auction_item_id, AuditEvent.BID_REJECTED, reason=message)
         raise ValueError(message)
     auction_room = await get_auction_room_by_id(auction_item.auction_room_id)
     if not auction_room:
         message = (
             f"Auction Room not found for item {auction_item.name} ({auction_item.id})."
         )
-        await db_log(auction_item_id, message)
-        raise ValueError(message)
-    if auction_item.active is False:
-        message = f"Auction Closed for item {auction_item.name} ({auction_item.id})."
-        await db_log(auction_item_id, message)
-        raise ValueError(message)
-
-    if auction_item.next_min_bid > data.amount:
-        message = f"Bid amount too low. Next min bid: {auction_item.next_min_bid}"
-        await db_log(auction_item_id, message)
+        await db_log(auction_item_id, AuditEvent.BID_REJECTED, reason=message)
         raise ValueError(message)
-
-    top_bid = await get_top_bid(auction_item_id)
-    if top_bid and top_bid.user_id == user_id:
-        message = "You are already the top bidder."
-        await db_log(auction_item_id, message)
+    message = await _bid_rejection(user_id, auction_item, auction_room, data)
+    if message:
+        await db_log(auction_item_id, AuditEvent.BID_REJECTED, reason=message)
         raise ValueError(message)
 
-    payment: Payment = await create_invoice(
-        wallet_id=auction_item.extra.wallet_id,
-        amount=data.amount,
-        currency=auction_room.currency,
-        extra={"tag": "auction_house"},
-        memo=f"Auction Bid. Item: {auction_room.name}/{auction_item.name}. "
-        f"Amount: {data.amount} {auction_room.currency}",
-    )
+    expiry = await _reserve_bid_unit(auction_item, auction_room)
+    try:
+        payment = await _create_bid_invoice(auction_item, auction_room, data, expiry)
+    except Exception:
+        if expiry:
+            await return_auction_item_unit(auction_item_id)
+            catalog_cache.invalidate(auction_room.id)
+        raise
     currency = auction_room.currency
     bid = Bid(
         id=urlsafe_short_hash(),
@@ -394,81 +881,458 @@ async def place_bid(
         payment_hash=payment.payment_hash,
         amount=data.amount,
         amount_sat=payment.sat,
+        max_amount=data.max_amount,
+        max_amount_sat=payment.sat if data.max_amount else None,
         memo=data.memo[:200],
         ln_address=data.ln_address,
+        expires_at=payment.expiry
+        or datetime.now(timezone.utc)
+        + timedelta(seconds=expiry or settings.lightning_invoice_expiry),
+        reserved=auction_room.is_fixed_price,
     )
+    if bid.is_proxy:
+        _set_proxy_bid_amount(bid, data.amount)
     await create_bid(bid)
     await db_log(
-        auction_item_id, f"Placed bid for item {auction_item_id}. Memo: {data.memo}"
+        auction_item_id,
+        AuditEvent.BID_PLACED,
+        bid_id=bid.id,
+        memo=bid.memo,
+        amount=bid.amount,
+        currency=bid.currency,
+        payment_hash=bid.payment_hash,
     )
     return BidResponse(
         id=bid.id,
         payment_hash=payment.payment_hash,
         payment_request=payment.bolt11,
+        expires_at=bid.expires_at,
+    )
+
+
+async def _bid_rejection(
+    user_id: str, auction_item: AuctionItem, auction_room: AuctionRoom, data: BidRequest
+) -> Optional[str]:
+    """
+    Why the bid cannot be placed, None if it can.
+    """
+    if is_auction_room_deleting(auction_room.id):
+        return f"Auction Room is being deleted ({auction_room.id})."
+    if auction_item.active is False:
+        if auction_item.expires_at_ms > auction_item.server_time_ms:
+            return f"Auction Closed for item {auction_item.name} ({auction_item.id})."
+        closed_at = auction_item.expires_at.astimezone(timezone.utc)
+        return (
+            f"Auction closed at {closed_at.isoformat(timespec='milliseconds')} "
+            f"for item {auction_item.name} ({auction_item.id})."
+        )
+    if auction_item.next_min_bid > data.amount:
+        return f"Bid amount too low. Next min bid: {auction_item.next_min_bid}"
+    if data.max_amount is not None and not auction_room.is_auction:
+        return "Maximum bids are only accepted in auction rooms."
+    if auction_room.is_sealed and await has_paid_bid(user_id, auction_item.id):
+        return "You already placed a sealed bid for this item."
+    if auction_room.is_auction:
+        top_bid = await get_top_bid(auction_item.id)
+        if top_bid and top_bid.user_id == user_id:
+            return "You are already the top bidder."
+    return None
+
+
+async def _reserve_bid_unit(
+    auction_item: AuctionItem, auction_room: AuctionRoom
+) -> Optional[int]:
+    """
+    A fixed price buy holds a unit until its invoice expires, the expiry (in
+    seconds) is returned. None in the other rooms.
+    """
+    if not auction_room.is_fixed_price:
+        return None
+    if not await reserve_auction_item_unit(auction_item.id):
+        message = "Sold out. Units come back when unpaid invoices expire."
+        await db_log(auction_item.id, AuditEvent.BID_REJECTED, reason=message)
+        raise ValueError(message)
+    # the listed stock changed
+    catalog_cache.invalidate(auction_room.id)
+    return auction_room.extra.reservation_seconds
+
+
+async def _create_bid_invoice(
+    auction_item: AuctionItem,
+    auction_room: AuctionRoom,
+    data: BidRequest,
+    expiry: Optional[int] = None,
+) -> Payment:
+    # a proxy bid pays its maximum, the unspent part is refunded at close
+    invoice_amount = data.max_amount or data.amount
+    amount_sat = await fiat_rates.to_sat(
+        invoice_amount,
+        auction_room.currency,
+        auction_room.extra.rate_refresh_seconds,
+    )
+    if amount_sat <= 0:
+        message = (
+            f"Bid amount too low: {invoice_amount} {auction_room.currency} "
+            "is less than 1 sat."
+        )
+        await db_log(auction_item.id, AuditEvent.BID_REJECTED, reason=message)
+        raise ValueError(message)
+    return await create_invoice(
+        wallet_id=auction_item.extra.wallet_id,
+        amount=amount_sat,
+        extra=_bid_invoice_extra(invoice_amount, amount_sat, auction_room.currency),
+        memo=f"Auction Bid. Item: {auction_room.name}/{auction_item.name}. "
+        f"{'Max ' if data.max_amount else ''}"
+        f"Amount: {invoice_amount} {auction_room.currency}",
+        expiry=expiry,
     )
 
 
+def _set_proxy_bid_amount(bid: Bid, amount: float) -> None:
+    bid.amount = amount
+    if bid.max_amount and bid.max_amount_sat is not None:
+        bid.amount_sat = round(bid.max_amount_sat * amount / bid.max_amount)
+
+
+def _resolve_proxy_bids(
+    bid: Bid, top_bid: Optional[Bid], min_bid_up_percentage: float
+) -> Bid:
+    """
+    The winner between a new paid bid and the top bid, with the amounts both
+    stand at. A proxy bid goes up only as much as it takes to stay on top,
+    `min_bid_up_percentage` over the maximum of the other bid. The top bid
+    wins ties, it was placed first.
+    """
+    if not top_bid:
+        return bid
+    bid_max = bid.max_amount if bid.max_amount is not None else bid.amount
+    top_max = top_bid.max_amount if top_bid.max_amount is not None else top_bid.amount
+    if bid_max > top_max:
+        winner, loser, loser_max = bid, top_bid, top_max
+    else:
+        winner, loser, loser_max = top_bid, bid, bid_max
+    if loser.is_proxy:
+        _set_proxy_bid_amount(loser, loser_max)
+    if winner.is_proxy and winner.max_amount is not None:
+        raised = round(loser_max * (1 + min_bid_up_percentage / 100), 2)
+        _set_proxy_bid_amount(
+            winner, max(winner.amount, min(winner.max_amount, raised))
+        )
+    return winner
+
+
+def _bid_invoice_extra(amount: float, amount_sat: int, currency: str) -> dict:
+    extra: dict[str, Any] = {"tag": "auction_house"}
+    if currency.lower() != "sat":
+        # the fiat details LNbits core adds when it converts the amount itself
+        extra["fiat_currency"] = currency
+        extra["fiat_amount"] = round(amount, ndigits=3)
+        extra["fiat_rate"] = amount_sat / amount
+        extra["btc_rate"] = (amount / amount_sat) * 100_000_000
+    return extra
+
+
 async def queue_place_bid(
     user_id: str, auction_item_id: str, data: BidRequest
 ) -> BidResponse:
-    async with bid_lock:
-        return await place_bid(user_id, auction_item_id, data)
+    async with item_lock(auction_item_id, timeout=30):
+        bid_response = await get_outstanding_bid_response(
+            user_id, auction_item_id, data
+        )
+        if bid_response:
+            return bid_response
+
+        bid_response = await place_bid(user_id, auction_item_id, data)
+        client_key, request_key = _bid_request_keys(user_id, auction_item_id, data)
+        # fixed price invoices expire sooner, after the unit reservation
+        expires_in = (
+            bid_response.expires_in_seconds or settings.lightning_invoice_expiry
+        )
+        bid_response_cache.set(
+            request_key, bid_response, min(expires_in, bid_response_cache.ttl_seconds)
+        )
+        if client_key:
+            # a client key is kept for as long as its invoice can be paid
+            bid_response_cache.set(client_key, bid_response, expires_in)
+        return bid_response
 
 
-async def bid_paid(payment: Payment) -> bool:
-    bid = await get_bid_by_payment_hash(payment.payment_hash)
-    if not bid:
-        logger.warning(f"Payment received for unknown bid: {payment.payment_hash}")
-        return False
+def get_cached_bid_response(
+    user_id: str, auction_item_id: str, data: BidRequest
+) -> Optional[BidResponse]:
+    for key in _bid_request_keys(user_id, auction_item_id, data):
+        bid_response = bid_response_cache.get(key) if key else None
+        if bid_response:
+            return bid_response
+    return None
+
 
-    bid_details = (
-        f"Bid {bid.memo} ({bid.id}). "
-        f"Amount: {bid.amount_sat} sat. {bid.amount} {bid.currency}. "
-        f"Payment: {payment.payment_hash}."
+async def get_outstanding_bid_response(
+    user_id: str, auction_item_id: str, data: BidRequest
+) -> Optional[BidResponse]:
+    """
+    The unpaid invoice of an identical recent bid request, if there is one.
+    Looked up in memory first, then in the bids table (same user, item and
+    amount within the cache window).
+    """
+    bid_response = get_cached_bid_response(user_id, auction_item_id, data)
+    if bid_response:
+        return bid_response
+
+    since = datetime.now(timezone.utc) - timedelta(
+        seconds=bid_response_cache.ttl_seconds
     )
-    await db_log(bid.auction_item_id, f"Payment received for {bid_details}")
-    if bid.amount_sat != payment.sat:
-        await db_log(
-            bid.auction_item_id,
-            "Payment amount different than bid amount. "
-            f"Payment amount: {payment.sat}. {bid_details}",
-        )
+    bid = await get_outstanding_bid(user_id, auction_item_id, data.amount, since)
+    if not bid or bid.max_amount != data.max_amount:
+        return None
+    payment = await get_standalone_payment(bid.payment_hash, incoming=True)
+    if not payment or not payment.pending:
+        return None
+    return BidResponse(
+        id=bid.id,
+        payment_hash=bid.payment_hash,
+        payment_request=payment.bolt11,
+        expires_at=bid.expires_at,
+    )
+
+
+def _bid_request_keys(
+    user_id: str, auction_item_id: str, data: BidRequest
+) -> tuple[Optional[str], str]:
+    """
+    The key sent by the client (if any) and the key derived from the request.
+    """
+    client_key = None
+    if data.idempotency_key:
+        client_key = f"{user_id}:{auction_item_id}:key:{data.idempotency_key}"
+    request_key = f"{user_id}:{auction_item_id}:amount:{data.amount}"
+    if data.max_amount is not None:
+        request_key += f":max:{data.max_amount}"
+    return client_key, request_key
+
+
+@asynccontextmanager
+async def item_lock(
+    auction_item_id: str, timeout: Optional[float] = None
+) -> AsyncIterator[None]:
+    """
+    Serialize the bids and payments of one auction item, in all the workers.
+    Different items do not wait for each other. Within a worker the callers wait
+    on an asyncio lock, only the one holding it polls for the shared lease.
+    """
+    lock, users = _item_locks.get(auction_item_id, (asyncio.Lock(), 0))
+    _item_locks[auction_item_id] = (lock, users + 1)
+    try:
+        async with lock, _item_lease(auction_item_id, timeout):
+            yield
+    finally:
+        lock, users = _item_locks[auction_item_id]
+        if users <= 1:
+            _item_locks.pop(auction_item_id, None)
+        else:
+            _item_locks[auction_item_id] = (lock, users - 1)
+
+
+@asynccontextmanager
+async def _item_lease(
+    auction_item_id: str, timeout: Optional[float] = None
+) -> AsyncIterator[None]:
+    name = f"item:{auction_item_id}"
+    owner = urlsafe_short_hash()
+    started_at = time.monotonic()
+    delay = 0.01
+    while not await acquire_lease(
+        name,
+        owner,
+        datetime.now(timezone.utc) + timedelta(seconds=ITEM_LEASE_SECONDS),
+    ):
+        if timeout is not None and time.monotonic() - started_at > timeout:
+            raise ValueError("Auction item is busy. Try again later.")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    # a close with webhooks and refunds can outlast the lease, it is renewed
+    # for as long as it is held
+    renewal = asyncio.create_task(_renew_lease(name, owner, ITEM_LEASE_SECONDS))
+    try:
+        yield
+    finally:
+        renewal.cancel()
+        await release_lease(name, owner)
+
+
+async def _renew_lease(name: str, owner: str, lease_seconds: int) -> None:
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            renewed = await acquire_lease(
+                name,
+                owner,
+                datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+            )
+        except Exception as e:
+            logger.warning(f"[auction_house] Failed to renew lease {name}: {e}")
+            continue
+        if not renewed:
+            logger.warning(f"[auction_house] Lease {name} was taken over.")
+            return
+
+
+async def is_leader() -> bool:
+    """
+    Only one worker runs the background tasks (closing and settling the items,
+    pruning). The leader extends its lease each time it checks, the lease of a
+    stopped leader is taken over when it expires.
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=LEADER_LEASE_SECONDS)
+    try:
+        return await acquire_lease("leader", WORKER_ID, expires_at)
+    except Exception as e:
+        logger.warning(f"Leader election failed: {e}")
         return False
 
-    auction_item = await get_auction_item(bid.auction_item_id)
+
+async def bid_paid(payment: Payment) -> bool:
+    return await process_bid_payments([payment]) > 0
+
+
+async def process_bid_payments(payments: list[Payment]) -> int:
+    """
+    Handle a batch of paid bid invoices.
+    The bids are loaded with one query and grouped by auction item. Items are
+    processed concurrently, the payments of an item in the order they arrived.
+    Payments that were already processed are dropped first.
+    Returns the number of accepted bids.
+    """
+    payments = await _drop_processed_payments(payments)
+    if not payments:
+        return 0
+    bids = await get_bids_by_payment_hashes([p.payment_hash for p in payments])
+    bids_by_hash = {bid.payment_hash: bid for bid in bids}
+
+    item_payments: dict[str, list[tuple[Bid, Payment]]] = {}
+    for payment in payments:
+        bid = bids_by_hash.get(payment.payment_hash)
+        if not bid:
+            logger.warning(f"Payment received for unknown bid: {payment.payment_hash}")
+            continue
+        outstanding_invoices.remove(bid.user_id, bid.auction_item_id, bid.payment_hash)
+        bid_response_cache.discard_payment(bid.payment_hash)
+        item_payments.setdefault(bid.auction_item_id, []).append((bid, payment))
+
+    accepted = await asyncio.gather(
+        *[
+            _process_item_payments(auction_item_id, bid_payments)
+            for auction_item_id, bid_payments in item_payments.items()
+        ]
+    )
+    return sum(accepted)
+
+
+async def _drop_processed_payments(payments: list[Payment]) -> list[Payment]:
+    new_payments: dict[str, Payment] = {}
+    for payment in payments:
+        if payment.payment_hash in processed_payments_cache:
+            logger.debug(f"Payment already processed: {payment.payment_hash}")
+            continue
+        new_payments.setdefault(payment.payment_hash, payment)
+
+    claimed = await create_processed_payments(list(new_payments))
+    for payment_hash in new_payments:
+        processed_payments_cache.add(payment_hash)
+        if payment_hash not in claimed:
+            logger.debug(f"Payment already processed: {payment_hash}")
+    return [p for p in new_payments.values() if p.payment_hash in claimed]
+
+
+async def _process_item_payments(
+    auction_item_id: str, bid_payments: list[tuple[Bid, Payment]]
+) -> int:
+    accepted = 0
+    async with item_lock(auction_item_id):
+        auction_room: Optional[AuctionRoom] = None
+        for bid, payment in bid_payments:
+            try:
+                if not auction_room:
+                    auction_room = await _get_bid_auction_room(bid)
+                if await _bid_paid(bid, payment, auction_room):
+                    accepted += 1
+            except Exception as e:
+                logger.warning(f"Error processing payment {payment.payment_hash}: {e}")
+                # not processed, the payment recovery can pick it up again
+                await delete_processed_payment(payment.payment_hash)
+                processed_payments_cache.discard(payment.payment_hash)
+    return accepted
+
+
+async def _get_bid_auction_room(bid: Bid) -> Optional[AuctionRoom]:
+    auction_item = await get_auction_item_by_id(bid.auction_item_id)
     if not auction_item:
+        return None
+    return await get_auction_room_by_id(auction_item.auction_room_id)
+
+
+async def _bid_paid(
+    bid: Bid, payment: Payment, auction_room: Optional[AuctionRoom] = None
+) -> bool:
+    if bid.paid:
+        # processed before, up to the point where it failed
+        logger.debug(f"Bid already paid: {bid.id}")
+        return False
+    await db_log(
+        bid.auction_item_id,
+        AuditEvent.PAYMENT_RECEIVED,
+        bid_id=bid.id,
+        amount_sat=bid.paid_sat,
+        amount=bid.amount,
+        currency=bid.currency,
+        payment_hash=payment.payment_hash,
+    )
+    if bid.paid_sat != payment.sat:
         await db_log(
             bid.auction_item_id,
-            "Payment received for unknown auction item: "
-            f"{bid.auction_item_id}. {bid_details}",
+            AuditEvent.PAYMENT_AMOUNT_MISMATCH,
+            bid_id=bid.id,
+            payment_sat=payment.sat,
+            amount_sat=bid.paid_sat,
         )
         return False
 
-    auction_room = await get_auction_room_by_id(auction_item.auction_room_id)
-    if not auction_room:
-        await db_log(
-            auction_item.id,
-            f"No auction room found for bid '{bid.memo}' ({bid.id}).",
-        )
+    auction_item = await get_auction_item_by_id(bid.auction_item_id)
+    if not auction_item:
+        await db_log(bid.auction_item_id, AuditEvent.PAYMENT_UNKNOWN_ITEM, bid.id)
         return False
 
-    # race condition between two bids
-    if await _must_refund_bid_payment(bid, auction_item):
-        await db_log(auction_item.id, f"Refunding. {bid_details}")
-        refunded = await _refund_payment(bid)
-        await db_log(auction_item.id, f"Refunded: {refunded}. {bid_details}")
+    if not auction_room:
+        auction_room = await get_auction_room_by_id(auction_item.auction_room_id)
+    if not auction_room:
+        await db_log(auction_item.id, AuditEvent.ROOM_NOT_FOUND, bid.id)
         return False
 
+    top_bid = None
+    top_bids = None
     if auction_room.is_auction:
-        await _refund_previous_winner(auction_item)
-        await _accept_bid(bid)
-    elif auction_room.is_fixed_price:
-        await _accept_buy(bid)
-        await close_auction_item(auction_item)
+        # loaded once, for the item details and for the bid checks
+        top_bid = await get_top_bid(auction_item.id)
+        top_bids = {auction_item.id: top_bid}
+    auction_item = await get_auction_item_details(
+        auction_item, auction_room=auction_room, top_bids=top_bids
+    )
+    if await _must_refund_paid_bid(bid, auction_item, auction_room, top_bid):
+        await _refund_rejected_bid(bid)
+        return False
+    await _accept_paid_bid(bid, auction_item, auction_room, top_bid)
 
     await db_log(
-        auction_item.id, f"Bid accepted for '{auction_item.name}' {bid_details}"
+        auction_item.id,
+        AuditEvent.BID_ACCEPTED,
+        bid_id=bid.id,
+        amount_sat=bid.amount_sat,
+        amount=bid.amount,
+        currency=bid.currency,
     )
+    if auction_room.is_sealed:
+        # nothing changes for the other bidders until the close
+        return True
     await ws_notify(auction_item.id, {"status": "new_bid"})
     await ws_notify(
         auction_room.id, {"status": "new_bid", "auction_item_id": auction_item.id}
@@ -477,93 +1341,498 @@ async def bid_paid(payment: Payment) -> bool:
     return True
 
 
-async def queue_bid_paid(payment: Payment) -> bool:
-    async with bid_lock:
-        return await bid_paid(payment)
+async def _must_refund_paid_bid(
+    bid: Bid,
+    auction_item: AuctionItem,
+    auction_room: AuctionRoom,
+    top_bid: Optional[Bid],
+) -> bool:
+    """
+    Check the paid bid against the item (race condition between two bids) and
+    mark it as paid. True if its payment must be refunded instead.
+    """
+    if auction_room.is_fixed_price:
+        must_refund = await _must_refund_buy_payment(bid, auction_item)
+    elif auction_room.is_sealed:
+        must_refund = await _must_refund_sealed_bid_payment(bid, auction_item)
+    else:
+        must_refund = await _must_refund_bid_payment(bid, auction_item, top_bid)
+    if must_refund:
+        return True
+    # the item can start closing from another worker, the bid is only accepted
+    # while it is active
+    if await set_bid_paid(bid):
+        return False
+    await db_log(auction_item.id, AuditEvent.PAYMENT_FOR_CLOSED_ITEM, bid.id)
+    if auction_room.is_fixed_price:
+        await return_auction_item_unit(auction_item.id)
+        catalog_cache.invalidate(auction_room.id)
+    return True
+
+
+async def _accept_paid_bid(
+    bid: Bid,
+    auction_item: AuctionItem,
+    auction_room: AuctionRoom,
+    top_bid: Optional[Bid],
+) -> None:
+    if auction_room.is_auction:
+        await _accept_auction_bid(bid, auction_item, auction_room, top_bid)
+        await stream_new_bid(bid, auction_item, auction_room)
+    elif auction_room.is_fixed_price:
+        await _accept_buy(bid, auction_room.id)
+        if auction_item.quantity > 1:
+            await transfer_auction_item_unit(auction_item, bid)
+        await stream_new_bid(bid, auction_item, auction_room)
+        if await _is_sold_out(auction_item.id):
+            # already under the item lock
+            await _close_auction_item(auction_item)
+    elif auction_room.is_sealed:
+        await _accept_sealed_bid(bid, auction_room.id)
+    if not auction_room.is_sealed:
+        catalog_cache.invalidate(auction_room.id)
+
+
+async def _accept_auction_bid(
+    bid: Bid,
+    auction_item: AuctionItem,
+    auction_room: AuctionRoom,
+    top_bid: Optional[Bid],
+) -> None:
+    winner = _resolve_proxy_bids(bid, top_bid, auction_room.min_bid_up_percentage)
+    defer_refunds = auction_room.extra.defer_refunds
+    if winner is bid:
+        if top_bid and top_bid.is_proxy:
+            # keeps the amount it was raised to, for the bid history
+            await update_bid(top_bid)
+        if not defer_refunds:
+            await _refund_previous_winner(auction_item, top_bid)
+        await _accept_bid(bid, auction_room.id)
+    else:
+        await _accept_outbid(bid, winner, auction_room.id, defer_refunds)
+    if defer_refunds:
+        schedule_outbid_refunds(auction_item)
+
+
+async def recover_missed_payments(batch_size: int = 100, workers: int = 4) -> int:
+    """
+    Accept the bids of active items whose invoices were paid while the invoice
+    listener was not running. The paid invoices are looked up in LNbits core with
+    one query per item wallet (at most `workers` at a time), then they go through
+    the normal paid path in the order they were paid.
+    Returns the number of accepted bids.
+    """
+    started_at = time.monotonic()
+    bids = await get_unpaid_bids_of_active_items()
+    item_hashes: dict[str, set[str]] = {}
+    for bid in bids:
+        item_hashes.setdefault(bid.auction_item_id, set()).add(bid.payment_hash)
+    items = await get_auction_items_by_ids(list(item_hashes))
+    semaphore = asyncio.Semaphore(workers)
+
+    async def _lookup(item: AuctionItem) -> list[Payment]:
+        async with semaphore:
+            payments = await get_payments(
+                wallet_id=item.extra.wallet_id, complete=True, incoming=True
+            )
+        return [p for p in payments if p.payment_hash in item_hashes[item.id]]
+
+    lookups = await asyncio.gather(*[_lookup(item) for item in items])
+    payments = sorted((p for ps in lookups for p in ps), key=lambda p: p.time)
+
+    accepted = 0
+    for i in range(0, len(payments), batch_size):
+        accepted += await process_bid_payments(payments[i : i + batch_size])
+
+    logger.info(
+        f"[auction_house] Payment recovery: {len(bids)} unpaid bids, "
+        f"{len(payments)} paid, {accepted} accepted "
+        f"in {time.monotonic() - started_at:.2f}s."
+    )
+    return accepted
 
 
-async def db_log(entry_id: str, data: str) -> bool:
-    logger.debug(f"[auction_house][{entry_id}]: {data}")
+async def db_log(
+    entry_id: str,
+    event: AuditEvent,
+    bid_id: Optional[str] = None,
+    **payload: Any,
+) -> bool:
+    """
+    Store an audit event. The payload must be JSON serializable, it is only
+    rendered to text when the entry is viewed.
+    """
+    entry = PublicAuditEntry(
+        entry_id=entry_id, event=event, bid_id=bid_id, payload=payload
+    )
+    logger.opt(lazy=True).debug(
+        "[auction_house][{}]: {}", lambda: entry_id, lambda: entry.render()
+    )
     try:
-        await create_audit_entry(entry_id, data)
+        await create_audit_entry(entry)
     except Exception as e:
         logger.warning(f"Failed to log to db: {e}")
         return False
     return True
 
 
+async def prune_audit_entries(batch_size: int = 500) -> int:
+    pruned = 0
+    for auction_room in await get_all_auction_rooms():
+        if auction_room.extra.audit_retention.days <= 0:
+            continue
+        try:
+            pruned += await prune_auction_room_audit(auction_room, batch_size)
+        except Exception as e:
+            logger.warning(f"Failed to prune audit for room {auction_room.id}: {e}")
+    return pruned
+
+
+async def prune_auction_room_audit(
+    auction_room: AuctionRoom, batch_size: int = 500
+) -> int:
+    """
+    Delete (and optionally archive) the old audit entries of a room.
+    Entries of items that are still active are always kept.
+    """
+    retention = auction_room.extra.audit_retention
+    before = datetime.now(timezone.utc) - timedelta(days=retention.days)
+    pruned = 0
+    while True:
+        entries = await get_expired_audit_entries(auction_room.id, before, batch_size)
+        if not entries:
+            break
+        if retention.archive:
+            await asyncio.to_thread(_archive_audit_entries, auction_room.id, entries)
+        deleted = await delete_audit_entries([e.id for e in entries if e.id])
+        if not deleted:
+            break
+        pruned += deleted
+        await asyncio.sleep(0)
+
+    if pruned:
+        logger.info(
+            f"[auction_house] Pruned {pruned} audit entries for room {auction_room.id}."
+        )
+    return pruned
+
+
+def audit_archive_path(auction_room_id: str) -> str:
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(
+        settings.lnbits_data_folder,
+        "auction_house",
+        "audit_archive",
+        auction_room_id,
+        f"{day}.ndjson.gz",
+    )
+
+
+def _archive_audit_entries(auction_room_id: str, entries: list[AuditEntry]):
+    path = audit_archive_path(auction_room_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # appending creates a new gzip member, readers see a single stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(entry.json() + "\n")
+
+
 async def ws_notify(item_id: str, data: dict) -> bool:
+    data = {**data, "server_time_ms": epoch_ms()}
     try:
         await websocket_updater(item_id, json.dumps(data))
     except Exception as e:
-        await db_log(item_id, f"Failed to notify websocket: {e}")
+        await db_log(item_id, AuditEvent.WEBSOCKET_FAILED, error=str(e))
         return False
     return True
 
 
-async def _refund_previous_winner(auction_item: PublicAuctionItem):
-    await db_log(
-        auction_item.id,
-        "Refunding previous winner for item"
-        f" {auction_item.name} ({auction_item.id}).",
+async def stream_new_bid(
+    bid: Bid, auction_item: AuctionItem, auction_room: AuctionRoom
+) -> None:
+    item_streams = has_subscribers(auction_item.id)
+    room_streams = has_subscribers(auction_room.id)
+    if item_streams:
+        publish(auction_item.id, "bid", bid.to_public().json())
+    if not (item_streams or room_streams):
+        return
+    auction_item = await get_auction_item_details(
+        auction_item, auction_room=auction_room
     )
+    public_item = auction_item.to_public()
+    if item_streams:
+        publish(auction_item.id, "item", public_item.json())
+    if room_streams:
+        # the room page only patches the prices of the rows it shows
+        publish(auction_room.id, "item", public_item.json(include=ROOM_ITEM_FIELDS))
+
+
+async def purge_expired_bids(
+    grace: timedelta = timedelta(minutes=10), batch_size: int = 500, workers: int = 4
+) -> int:
+    """
+    Delete the unpaid bids whose invoice expired more than `grace` ago.
+    Bids without a tracked expiry are kept for a day.
+    An invoice can be paid while its bid is still unpaid (the processing of the
+    payment failed), it goes through the paid path again and the bid is kept.
+    """
+    now = datetime.now(timezone.utc)
+    purged = 0
+    after_id = ""
+    while True:
+        bids = await get_expired_unpaid_bids(
+            now - grace, now - timedelta(days=1), batch_size, after_id
+        )
+        if not bids:
+            break
+        after_id = bids[-1].id
+        payments = await _paid_bid_invoices(bids, workers)
+        if payments:
+            await process_bid_payments(payments)
+        paid_hashes = {payment.payment_hash for payment in payments}
+        purged += await delete_unpaid_bids(
+            [bid.id for bid in bids if bid.payment_hash not in paid_hashes]
+        )
+        if len(bids) < batch_size:
+            break
+        # let other database users run between batches
+        await asyncio.sleep(0)
+    if purged:
+        logger.info(f"[auction_house] Purged {purged} expired unpaid bids.")
+    return purged
+
+
+async def _paid_bid_invoices(bids: list[Bid], workers: int = 4) -> list[Payment]:
+    semaphore = asyncio.Semaphore(workers)
+
+    async def _lookup(bid: Bid) -> Optional[Payment]:
+        async with semaphore:
+            return await get_standalone_payment(bid.payment_hash, incoming=True)
+
+    payments = await asyncio.gather(*[_lookup(bid) for bid in bids])
+    return [payment for payment in payments if payment and payment.success]
+
+
+async def prune_processed_payments(
+    retention: timedelta = timedelta(days=7), batch_size: int = 500
+) -> int:
+    """
+    Drop the processed payments ledger rows of settled items, once a payment
+    cannot plausibly be delivered again.
+    """
+    before = datetime.now(timezone.utc) - retention
+    pruned = 0
+    while True:
+        deleted = await delete_settled_processed_payments(before, batch_size)
+        pruned += deleted
+        if deleted < batch_size:
+            break
+        # let other database users run between batches
+        await asyncio.sleep(0)
+    if pruned:
+        logger.info(f"[auction_house] Pruned {pruned} processed payments.")
+    return pruned
+
+
+async def release_expired_reservations(
+    grace: timedelta = timedelta(minutes=1), batch_size: int = 500
+) -> int:
+    """
+    Return to stock the units reserved by bids whose invoice expired.
+    """
+    expired_before = datetime.now(timezone.utc) - grace
+    released = 0
+    room_ids: set[str] = set()
+    while bids := await get_expired_reservations(expired_before, batch_size):
+        for bid in bids:
+            if await release_bid_reservation(bid):
+                released += 1
+                await db_log(
+                    bid.auction_item_id, AuditEvent.RESERVATION_RELEASED, bid.id
+                )
+        items = await get_auction_items_by_ids([bid.auction_item_id for bid in bids])
+        room_ids.update(item.auction_room_id for item in items)
+        if len(bids) < batch_size:
+            break
+        await asyncio.sleep(0)
+    for auction_room_id in room_ids:
+        catalog_cache.invalidate(auction_room_id)
+    return released
+
+
+async def take_item_wallet(user_id: str, wallet_name: str) -> str:
+    """
+    Escrow wallet for a new item. A wallet from the pool of the room owner
+    is used when there is one, otherwise a new wallet is created.
+    """
+    while wallet_id := await take_pooled_wallet(user_id):
+        wallet = await get_wallet(wallet_id)
+        # the owner may have deleted the wallet while it was in the pool
+        if wallet and not wallet.deleted:
+            wallet.name = wallet_name
+            await update_wallet(wallet)
+            return wallet.id
+    wallet = await create_wallet(user_id=user_id, wallet_name=wallet_name)
+    return wallet.id
+
+
+async def release_item_wallet(item: AuctionItem) -> None:
+    """
+    Put the wallet of a settled item back in the pool of its owner if it is
+    empty and the pool is not full. Otherwise the wallet is deleted.
+    """
+    wallet = await get_wallet(item.extra.wallet_id)
+    if not wallet or wallet.deleted:
+        return
+    if (
+        wallet.balance_msat == 0
+        and await count_pooled_wallets(wallet.user) < WALLET_POOL_SIZE
+    ):
+        wallet.name = WALLET_POOL_NAME
+        await update_wallet(wallet)
+        await create_pooled_wallet(wallet.user, wallet.id)
+        await db_log(item.id, AuditEvent.WALLET_RECYCLED, wallet_id=wallet.id)
+        return
+    await db_log(item.id, AuditEvent.WALLET_DELETED, wallet_id=wallet.id)
+    await delete_wallet_by_id(wallet.id)
+
+
+async def refill_wallet_pools(pool_size: int = WALLET_POOL_SIZE) -> int:
+    """
+    Create the missing pool wallets of the room owners. The pools of users
+    that no longer own a room are emptied.
+    Returns the number of wallets created.
+    """
+    owners = set(await get_auction_room_owners())
+    pool_sizes = await get_wallet_pool_sizes()
+    created = 0
+    for user_id in owners:
+        for _ in range(pool_size - pool_sizes.get(user_id, 0)):
+            wallet = await create_wallet(user_id=user_id, wallet_name=WALLET_POOL_NAME)
+            await create_pooled_wallet(user_id, wallet.id)
+            created += 1
+    for user_id in pool_sizes.keys() - owners:
+        while wallet_id := await take_pooled_wallet(user_id):
+            await delete_wallet_by_id(wallet_id)
+    if created:
+        logger.info(f"[auction_house] Created {created} pool wallets.")
+    return created
+
+
+async def _delete_in_batches(
+    delete_batch: Callable[[list[str]], Awaitable[int]], ids: list[str]
+) -> int:
+    total = 0
+    while True:
+        deleted = await delete_batch(ids)
+        total += deleted
+        if not deleted:
+            return total
+        # let other database users run between batches
+        await asyncio.sleep(0)
+
+
+async def _refund_previous_winner(
+    auction_item: PublicAuctionItem, top_bid: Optional[Bid]
+):
+    await db_log(auction_item.id, AuditEvent.REFUND_PREVIOUS_WINNER)
     try:
-        top_bid = await get_top_bid(auction_item.id)
         if not top_bid:
-            await db_log(
-                auction_item.id,
-                "First bid. Nothing to refund for item"
-                f" '{auction_item.name}' ({auction_item.id}).",
-            )
+            await db_log(auction_item.id, AuditEvent.REFUND_NOTHING)
             return
-        await db_log(
-            auction_item.id,
-            f"Refunding previous winner bid '{top_bid.memo}' ({top_bid.id}).",
-        )
-        refunded = await _refund_payment(top_bid)
-        await db_log(
-            auction_item.id,
-            f"Refunded: {refunded}. Bid '{top_bid.memo}' ({top_bid.id}).",
-        )
+        if top_bid.is_proxy:
+            # the deposit of a proxy bid is refunded when the auction closes
+            return
+        await _refund_bid(top_bid, top_bid.amount, top_bid.amount_sat)
     except Exception as e:
-        await db_log(
-            auction_item.id,
-            "Failed to refund bid for auction item "
-            f"'{auction_item.name}' ({auction_item.id}): {e}",
-        )
+        await db_log(auction_item.id, AuditEvent.REFUND_FAILED, error=str(e))
 
 
-async def _must_refund_bid_payment(bid: Bid, auction_item: PublicAuctionItem) -> bool:
+async def _must_refund_bid_payment(
+    bid: Bid, auction_item: PublicAuctionItem, top_bid: Optional[Bid]
+) -> bool:
     if not auction_item.active:
-        await db_log(
-            auction_item.id,
-            f"Payment received for closed auction:  {bid.auction_item_id}"
-            f"Bid: {bid.memo} ({bid.id}).",
-        )
+        await db_log(auction_item.id, AuditEvent.PAYMENT_FOR_CLOSED_ITEM, bid.id)
         return True
 
-    top_bid = await get_top_bid(auction_item.id)
-    if top_bid and bid.amount <= top_bid.amount:
+    bid_max = bid.max_amount if bid.max_amount is not None else bid.amount
+    if top_bid and bid_max <= top_bid.amount:
         await db_log(
             bid.auction_item_id,
-            f"Payment received for bid too low. "
-            f"Bid: {bid.memo} ({bid.id}). "
-            f"Bid: {bid.amount}. Next Min Bid: {auction_item.next_min_bid}. "
-            f"Auction Item: '{auction_item.name}' "
-            f"({auction_item.auction_room_id}/{auction_item.id})",
+            AuditEvent.PAYMENT_TOO_LOW,
+            bid_id=bid.id,
+            amount=bid.amount,
+            next_min_bid=auction_item.next_min_bid,
         )
         return True
 
     return False
 
 
+async def _must_refund_sealed_bid_payment(bid: Bid, auction_item: AuctionItem) -> bool:
+    if not auction_item.active:
+        await db_log(auction_item.id, AuditEvent.PAYMENT_FOR_CLOSED_ITEM, bid.id)
+        return True
+    # two invoices can be created before the first one is paid
+    if await has_paid_bid(bid.user_id, auction_item.id):
+        await db_log(auction_item.id, AuditEvent.SEALED_BID_DUPLICATE, bid.id)
+        return True
+    return False
+
+
+async def _must_refund_buy_payment(bid: Bid, auction_item: AuctionItem) -> bool:
+    if not auction_item.active:
+        await db_log(auction_item.id, AuditEvent.PAYMENT_FOR_CLOSED_ITEM, bid.id)
+        return True
+    # the reservation is released if the payment comes after the invoice expiry
+    if await claim_bid_reservation(bid):
+        return False
+    if await reserve_auction_item_unit(auction_item.id):
+        return False
+    await db_log(auction_item.id, AuditEvent.PAYMENT_SOLD_OUT, bid.id)
+    return True
+
+
+async def _is_sold_out(auction_item_id: str) -> bool:
+    auction_item = await get_auction_item_by_id(auction_item_id)
+    if not auction_item or auction_item.stock > 0:
+        return False
+    return await count_item_reservations(auction_item_id) == 0
+
+
+async def _refund_bid(bid: Bid, amount: float, amount_sat: int) -> bool:
+    """
+    Refund a paid bid once. The bid is flagged first, the flag is cleared if the
+    refund fails so that the next refund batch runs it again.
+    """
+    if not await set_bid_refunded(bid.id):
+        return True
+    if amount_sat <= 0:
+        return True
+    await db_log(bid.auction_item_id, AuditEvent.REFUNDING, bid.id)
+    refund = bid.copy(update={"amount": round(amount, 2), "amount_sat": amount_sat})
+    refunded = await _refund_payment(refund)
+    await db_log(bid.auction_item_id, AuditEvent.REFUNDED, bid.id, refunded=refunded)
+    if not refunded:
+        await set_bid_refunded(bid.id, False)
+    return refunded
+
+
+async def _refund_rejected_bid(bid: Bid) -> bool:
+    await db_log(bid.auction_item_id, AuditEvent.REFUNDING, bid.id)
+    # a proxy bid paid its maximum
+    refund = bid.copy(
+        update={"amount": bid.max_amount or bid.amount, "amount_sat": bid.paid_sat}
+    )
+    refunded = await _refund_payment(refund)
+    await db_log(bid.auction_item_id, AuditEvent.REFUNDED, bid.id, refunded=refunded)
+    return refunded
+
+
 async def _refund_payment(bid: Bid) -> bool:
     auction_item = await get_auction_item_by_id(bid.auction_item_id)
     if not auction_item:
-        await db_log(
-            bid.auction_item_id,
-            f"No auction room found for bid '{bid.memo}' ({bid.id}).",
-        )
+        await db_log(bid.auction_item_id, AuditEvent.PAYMENT_UNKNOWN_ITEM, bid.id)
         return False
 
     refunded = False
@@ -585,7 +1854,13 @@ async def _refund_payment_to_ln_address(bid: Bid, refund_from_wallet: str) -> bo
         payment_description = f"Refund. Memo: {bid.memo}. Bid: {bid.id}."
         if not bid.ln_address:
             message = f"Missing Lightning Address. {payment_description}."
-            await db_log(bid.auction_item_id, message)
+            await db_log(
+                bid.auction_item_id,
+                AuditEvent.LN_ADDRESS_ERROR,
+                bid.id,
+                ln_address=bid.ln_address,
+                reason=message,
+            )
             raise ValueError(message)
 
         payment_request = await _ln_address_payment_request(
@@ -599,14 +1874,18 @@ async def _refund_payment_to_ln_address(bid: Bid, refund_from_wallet: str) -> bo
         )
         await db_log(
             bid.auction_item_id,
-            f"Refund paid to {bid.ln_address}. Bid {bid.memo} ({bid.id}).",
+            AuditEvent.REFUND_PAID,
+            bid.id,
+            destination=bid.ln_address,
         )
         return True
     except Exception as e:
         await db_log(
             bid.auction_item_id,
-            f"Failed to refund bid '{bid.memo}' ({bid.id}) "
-            f"Lightning Address {bid.ln_address}: {e}",
+            AuditEvent.REFUND_FAILED,
+            bid.id,
+            destination=bid.ln_address,
+            error=str(e),
         )
         return False
 
@@ -615,9 +1894,7 @@ async def _refund_payment_to_user_wallet(bid: Bid, refund_from_wallet: str) -> b
     try:
         wallets = await get_wallets(bid.user_id)
         if len(wallets) == 0:
-            await db_log(
-                bid.auction_item_id, f"No wallet found for bid '{bid.memo}' ({bid.id})."
-            )
+            await db_log(bid.auction_item_id, AuditEvent.REFUND_NO_WALLET, bid.id)
             return False
 
         user_wallet = wallets[0]
@@ -638,14 +1915,19 @@ async def _refund_payment_to_user_wallet(bid: Bid, refund_from_wallet: str) -> b
         )
         await db_log(
             bid.auction_item_id,
-            f"Refund paid to user wallet. Bid {bid.memo} ({bid.id}).",
+            AuditEvent.REFUND_PAID,
+            bid.id,
+            destination="user wallet",
         )
 
         return True
     except Exception as e:
         await db_log(
             bid.auction_item_id,
-            f"Failed to refund bid '{bid.memo}' ({bid.id}) to user wallet: {e}",
+            AuditEvent.REFUND_FAILED,
+            bid.id,
+            destination="user wallet",
+            error=str(e),
         )
         return False
 
@@ -669,7 +1951,7 @@ async def _ln_address_payment_request(
         callback_url = data.get("callback")
         if not callback_url:
             message = f"Missing callback URL for {ln_address}."
-            await db_log(item_id, message)
+            await _log_ln_address_error(item_id, ln_address, message)
             raise ValueError(message)
 
         check_callback_url(callback_url)
@@ -677,27 +1959,27 @@ async def _ln_address_payment_request(
         min_sendable = int(data.get("minSendable") // 1000)
         if not min_sendable:
             message = f"Missing min_sendable for {ln_address}."
-            await db_log(item_id, message)
+            await _log_ln_address_error(item_id, ln_address, message)
             raise ValueError(message)
 
         if amount_sat < min_sendable:
             message = (
                 f"Amount too low for {ln_address}." f" Min sendable: {min_sendable}"
             )
-            await db_log(item_id, message)
+            await _log_ln_address_error(item_id, ln_address, message)
             raise ValueError(message)
 
         max_sendable = int(data.get("maxSendable") // 1000)
         if not max_sendable:
             message = f"Missing max_sendable for {ln_address}."
-            await db_log(item_id, message)
+            await _log_ln_address_error(item_id, ln_address, message)
             raise ValueError(message)
 
         if amount_sat > max_sendable:
             message = (
                 f"Amount too high for {ln_address}." f" Max sendable: {max_sendable}"
             )
-            await db_log(item_id, message)
+            await _log_ln_address_error(item_id, ln_address, message)
             raise ValueError(message)
 
         amount_msat = amount_sat * 1000
@@ -726,29 +2008,109 @@ async def _ln_address_payment_request(
     return data["pr"]
 
 
-async def _accept_bid(bid: Bid):
-    await db_log(bid.auction_item_id, f"Accepting bid {bid.memo} ({bid.id}).")
+async def _log_ln_address_error(item_id: str, ln_address: str, reason: str):
+    await db_log(
+        item_id, AuditEvent.LN_ADDRESS_ERROR, ln_address=ln_address, reason=reason
+    )
+
+
+async def _accept_bid(bid: Bid, auction_room_id: str):
+    await db_log(bid.auction_item_id, AuditEvent.BID_ACCEPTING, bid.id)
     bid.paid = True
     await update_bid(bid)
+    bidded_items_cache.add(bid.user_id, auction_room_id, bid.auction_item_id)
     await update_top_bid(bid.auction_item_id, bid.id)
     await update_auction_item_top_price(bid.auction_item_id, bid.amount)
-    await db_log(bid.auction_item_id, f"Acepted bid {bid.memo} ({bid.id}).")
+    await update_room_stats_for_bid(auction_room_id, bid)
 
 
-async def _accept_buy(bid: Bid):
-    await db_log(bid.auction_item_id, f"Accepting buy {bid.memo} ({bid.id}).")
+async def _accept_sealed_bid(bid: Bid, auction_room_id: str):
+    await db_log(bid.auction_item_id, AuditEvent.BID_ACCEPTING, bid.id)
     bid.paid = True
     await update_bid(bid)
-    await db_log(bid.auction_item_id, f"Acepted buy {bid.memo} ({bid.id}).")
+    bidded_items_cache.add(bid.user_id, auction_room_id, bid.auction_item_id)
+    await update_room_stats_for_bid(auction_room_id, bid)
+
+
+async def _accept_outbid(
+    bid: Bid, top_bid: Bid, auction_room_id: str, defer_refund: bool = False
+):
+    """
+    Accept a bid that a proxy bid outbids right away. The proxy bid is raised
+    over it and the bid is refunded now (or by the refund batch), or at close if
+    it is a proxy bid too.
+    """
+    await db_log(bid.auction_item_id, AuditEvent.BID_ACCEPTING, bid.id)
+    bid.paid = True
+    bid.higher_bid_made = True
+    await update_bid(bid)
+    bidded_items_cache.add(bid.user_id, auction_room_id, bid.auction_item_id)
+    await update_bid(top_bid)
+    await update_auction_item_top_price(top_bid.auction_item_id, top_bid.amount)
+    await update_room_stats_for_bid(auction_room_id, bid)
+    await db_log(
+        bid.auction_item_id,
+        AuditEvent.PROXY_BID_RAISED,
+        top_bid.id,
+        amount=top_bid.amount,
+        currency=top_bid.currency,
+    )
+    await db_log(
+        bid.auction_item_id,
+        AuditEvent.BID_OUTBID,
+        bid.id,
+        amount=top_bid.amount,
+        currency=top_bid.currency,
+    )
+    if not bid.is_proxy and not defer_refund:
+        await _refund_bid(bid, bid.amount, bid.amount_sat)
+
+
+async def _accept_buy(bid: Bid, auction_room_id: str):
+    await db_log(bid.auction_item_id, AuditEvent.BUY_ACCEPTING, bid.id)
+    bid.paid = True
+    await update_bid(bid)
+    bidded_items_cache.add(bid.user_id, auction_room_id, bid.auction_item_id)
+    await update_room_stats_for_bid(auction_room_id, bid)
+
+
+async def _record_closed_item_stats(item: AuctionItem, top_bid: Optional[Bid]):
+    if item.extra.is_stats_recorded:
+        return
+    try:
+        await update_room_stats_for_closed_item(
+            item.auction_room_id, _stats_day(datetime.now(timezone.utc)), top_bid
+        )
+        await update_auction_item_with_retry(item, _set_stats_recorded)
+    except Exception as e:
+        await db_log(item.id, AuditEvent.STATS_FAILED, error=str(e))
+
+
+def _set_stats_recorded(item: AuctionItem) -> None:
+    item.extra.is_stats_recorded = True
+
+
+def _add_closed_item_to_stats(
+    stats: Union[RoomStats, RoomDailyStats], top_bid: Optional[Bid]
+):
+    stats.closed_items += 1
+    if top_bid:
+        stats.sold_items += 1
+        stats.sales_volume += top_bid.amount
+        stats.sales_volume_sat += top_bid.amount_sat
+
+
+def _stats_day(date: datetime) -> str:
+    return date.astimezone(timezone.utc).strftime("%Y-%m-%d")
 
 
 async def _pay_fee_for_ended_auction(
     item: AuctionItem, from_wallet_id: str, to_walet_id: str, amount_sat: int
 ) -> bool:
-    await db_log(item.id, f"Paying fee for item {item.name} ({item.id}).")
+    await db_log(item.id, AuditEvent.FEE_PAYING, amount_sat=amount_sat)
     try:
         if item.extra.is_fee_paid:
-            await db_log(item.id, f"Fee already paid for item {item.name} ({item.id}).")
+            await db_log(item.id, AuditEvent.FEE_ALREADY_PAID)
             return False
         payment: Payment = await create_invoice(
             wallet_id=to_walet_id,
@@ -764,13 +2126,12 @@ async def _pay_fee_for_ended_auction(
             f" Item: {item.name} ({item.auction_room_id}/{item.id}).",
             extra={"tag": "auction_house", "is_fee": True},
         )
-        item.extra.is_fee_paid = True
-        await update_auction_item(item)
-        await db_log(item.id, f"Fee paid for item {item.name} ({item.id}).")
-    except Exception as e:
-        await db_log(
-            item.id, f"Failed to pay fee for item {item.name} ({item.id}): {e}"
+        await update_auction_item_with_retry(
+            item, lambda i: setattr(i.extra, "is_fee_paid", True)
         )
+        await db_log(item.id, AuditEvent.FEE_PAID)
+    except Exception as e:
+        await db_log(item.id, AuditEvent.FEE_FAILED, error=str(e))
         return False
     return True
 
@@ -778,9 +2139,9 @@ async def _pay_fee_for_ended_auction(
 async def _pay_owner_for_ended_auction(
     item: AuctionItem, from_wallet_id: str, amount_sat: int
 ) -> bool:
-    await db_log(item.id, f"Paying owner for item {item.name} ({item.id}).")
+    await db_log(item.id, AuditEvent.OWNER_PAYING, amount_sat=amount_sat)
     if item.extra.is_owner_paid:
-        await db_log(item.id, f"Owner already paid for item {item.name} ({item.id}).")
+        await db_log(item.id, AuditEvent.OWNER_ALREADY_PAID)
         return False
 
     try:
@@ -796,16 +2157,15 @@ async def _pay_owner_for_ended_auction(
             )
 
         if owner_paid:
-            item.extra.is_owner_paid = True
-            await update_auction_item(item)
-            await db_log(item.id, f"Owner paid for item {item.name} ({item.id}).")
+            await update_auction_item_with_retry(
+                item, lambda i: setattr(i.extra, "is_owner_paid", True)
+            )
+            await db_log(item.id, AuditEvent.OWNER_PAID)
             return True
 
-        await db_log(item.id, f"Owner NOT paid for item  {item.name} ({item.id}).")
+        await db_log(item.id, AuditEvent.OWNER_NOT_PAID)
     except Exception as e:
-        await db_log(
-            item.id, f"Failed to pay owner for item {item.name} ({item.id}): {e}"
-        )
+        await db_log(item.id, AuditEvent.OWNER_PAYMENT_FAILED, error=str(e))
     return False
 
 
@@ -815,12 +2175,14 @@ async def _pay_owner_to_ln_address(
     try:
         await db_log(
             item.id,
-            f"Paying owner to LN address {item.extra.owner_ln_address} "
-            f"for item {item.name} ({item.id}).",
+            AuditEvent.OWNER_TRANSFER,
+            destination=item.extra.owner_ln_address,
         )
         if not item.extra.owner_ln_address:
             message = "Missing Lightning Address."
-            await db_log(item.id, message)
+            await db_log(
+                item.id, AuditEvent.LN_ADDRESS_ERROR, ln_address=None, reason=message
+            )
             raise ValueError(message)
 
         payment_request = await _ln_address_payment_request(
@@ -838,14 +2200,15 @@ async def _pay_owner_to_ln_address(
         )
         await db_log(
             item.id,
-            f"Paid owner to LN address {item.extra.owner_ln_address}"
-            f" for item  {item.name} ({item.id}).",
+            AuditEvent.OWNER_TRANSFER_DONE,
+            destination=item.extra.owner_ln_address,
         )
     except Exception as e:
         await db_log(
             item.id,
-            f"Failed to pay owner to ln address {item.extra.owner_ln_address} "
-            f"for item {item.name} ({item.id}): {e}",
+            AuditEvent.OWNER_TRANSFER_FAILED,
+            destination=item.extra.owner_ln_address,
+            error=str(e),
         )
         return False
     return True
@@ -855,10 +2218,7 @@ async def _pay_owner_to_internal_wallet(
     item: AuctionItem, from_wallet_id: str, amount_sat: int
 ):
     try:
-        await db_log(
-            item.id,
-            f"Paying owner to internal wallet for item {item.name} ({item.id}).",
-        )
+        await db_log(item.id, AuditEvent.OWNER_TRANSFER, destination="user wallet")
         wallets = await get_wallets(item.user_id)
         if len(wallets) == 0:
             raise ValueError(f"No wallet found for user {item.user_id}.")
@@ -875,13 +2235,13 @@ async def _pay_owner_to_internal_wallet(
             description=f"Payment to user wallet for owner of {item.name} ({item.id}).",
             extra={"tag": "auction_house", "is_owner_payment": True},
         )
-        await db_log(
-            item.id,
-            "Paid owner to internal wallet" f"for item {item.name} ({item.id}).",
-        )
+        await db_log(item.id, AuditEvent.OWNER_TRANSFER_DONE, destination="user wallet")
         return True
     except Exception as e:
         await db_log(
-            item.id, f"Failed to pay owner for item {item.name} ({item.id}): {e}"
+            item.id,
+            AuditEvent.OWNER_TRANSFER_FAILED,
+            destination="user wallet",
+            error=str(e),
         )
     return False
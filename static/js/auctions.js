@@ -9,13 +9,15 @@ window.app = Vue.createApp({
         data: {
           name: '',
           description: '',
-          ask_price: 0
+          ask_price: 0,
+          quantity: 1
         }
       },
       onlyMyItems: false,
       showOnlyItemsWithMyBids: false,
       showInactiveItems: false,
       isAuctionType: false,
+      itemEvents: null,
       itemsTable: {
         columns: [
           {
@@ -59,6 +61,15 @@ window.app = Vue.createApp({
             format: (_, row) =>
               LNbits.utils.formatCurrency(row.current_price, row.currency)
           },
+          {
+            name: 'stock',
+            align: 'left',
+            label: 'Available',
+            field: 'stock',
+            sortable: false,
+            format: (_, row) =>
+              row.quantity > 1 ? `${row.stock} / ${row.quantity}` : ''
+          },
           {
             name: 'created_at',
             align: 'left',
@@ -75,6 +86,14 @@ window.app = Vue.createApp({
             format: val => LNbits.utils.formatDateString(val),
             sortable: true
           },
+          {
+            name: 'time_left',
+            align: 'left',
+            label: 'Time Left',
+            field: 'time_left',
+            sortable: false,
+            format: (val, row) => (row.active ? val : '')
+          },
           {
             name: 'id',
             align: 'left',
@@ -110,16 +129,24 @@ window.app = Vue.createApp({
     getAuctionItemsPaginated: async function (props) {
       try {
         const params = LNbits.utils.prepareFilterQuery(this.itemsTable, props)
+        // name and description, best matches first
+        if (params.has('search')) {
+          params.set('text_search', params.get('search'))
+          params.delete('search')
+        }
         const auctionRoomId = this.auctionRoomForm.data.id
-        const {data} = await LNbits.api.request(
+        const {data, headers} = await LNbits.api.request(
           'GET',
           `/auction_house/api/v1/items/${auctionRoomId}` +
             `/paginated?user_is_owner=${this.onlyMyItems}` +
             `&user_is_participant=${this.showOnlyItemsWithMyBids}` +
             `&include_inactive=${this.showInactiveItems}&${params}`
         )
+        // cached pages keep the server time of the items, the header is fresh
+        auctionTicker.setServerTime(+headers['x-server-time-ms'])
         this.auctionItems = data.data
         this.itemsTable.pagination.rowsNumber = data.total
+        this.updateTimeLeft(auctionTicker.now())
       } catch (error) {
         LNbits.utils.notifyApiError(error)
       }
@@ -144,12 +171,44 @@ window.app = Vue.createApp({
         LNbits.utils.notifyApiError(error)
       }
     },
+    updateTimeLeft: function (time) {
+      this.auctionItems
+        .filter(item => item.active)
+        .forEach(item => {
+          const expiresAt = item.expires_at_ms
+          item.time_left = auctionTicker.formatTimeLeft(expiresAt, time)
+        })
+    },
+    listenForItems: function () {
+      const auctionRoomId = this.auctionRoomForm.data.id
+      const source = new EventSource(
+        `/auction_house/api/v1/items/${auctionRoomId}/stream`
+      )
+      source.addEventListener('item', ({data}) => {
+        const update = JSON.parse(data)
+        const item = this.auctionItems.find(i => i.id === update.id)
+        if (!item) return
+        Object.assign(item, update)
+      })
+      source.addEventListener('closed', ({data}) => {
+        const {auction_item_id} = JSON.parse(data)
+        const item = this.auctionItems.find(i => i.id === auction_item_id)
+        if (item) item.active = false
+      })
+      source.addEventListener('reset', () => {
+        source.close()
+        this.getAuctionItemsPaginated()
+        this.listenForItems()
+      })
+      this.itemEvents = source
+    },
     showAddNewAuctionItemDialog: function () {
       this.itemFormDialog.show = true
       this.itemFormDialog.data = {
         name: '',
         description: '',
-        ask_price: 0
+        ask_price: 0,
+        quantity: 1
       }
     },
     formatCurrency(amount, currency) {
@@ -163,6 +222,8 @@ window.app = Vue.createApp({
   },
   created() {
     this.getAuctionItemsPaginated()
-    this.isAuctionType = this.auctionRoomForm.data.type === 'auction'
+    this.isAuctionType = this.auctionRoomForm.data.type !== 'fixed_price'
+    this.listenForItems()
+    auctionTicker.subscribe(this.updateTimeLeft)
   }
 })
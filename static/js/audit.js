@@ -28,6 +28,20 @@ window.app = Vue.createApp({
             format: val => LNbits.utils.formatDateString(val),
             sortable: true
           },
+          {
+            name: 'event',
+            align: 'left',
+            label: 'Event',
+            field: 'event',
+            sortable: true
+          },
+          {
+            name: 'bid_id',
+            align: 'left',
+            label: 'Bid ID',
+            field: 'bid_id',
+            sortable: false
+          },
           {
             name: 'data',
             align: 'left',
@@ -11,9 +11,14 @@ window.app = Vue.createApp({
         seconds: 0
       },
       bidRequest: null,
+      bidEvents: null,
+      myBidIds: [],
+      currentPrice: '',
       bidPrice: 0,
+      maxBidPrice: null,
       lnAddress: '',
       bidMemo: '',
+      bidRequestKey: null,
       onlyMyBids: false,
       showUnpaidBids: false,
       showBidRequestQrCode: false,
@@ -94,6 +99,7 @@ window.app = Vue.createApp({
         isUserRoomOwner: is_user_room_owner,
         isUserItemOwner: is_user_item_owner,
         isAuctionType: is_auction_type,
+        isSealedType: is_sealed_type,
         data: auction_item
       }
     }
@@ -151,6 +157,17 @@ window.app = Vue.createApp({
         })
         return
       }
+      // retries of the same bid reuse the key and get the same invoice back
+      const maxAmount = this.maxBidPrice || null
+      const requestKey = [
+        this.bidPrice,
+        maxAmount,
+        this.lnAddress,
+        this.bidMemo
+      ].join(':')
+      if (!this.bidRequestKey || this.bidRequestKey.request !== requestKey) {
+        this.bidRequestKey = {request: requestKey, key: crypto.randomUUID()}
+      }
       try {
         const {data} = await LNbits.api.request(
           'PUT',
@@ -158,11 +175,16 @@ window.app = Vue.createApp({
           null,
           {
             amount: this.bidPrice,
+            max_amount: maxAmount,
             ln_address: this.lnAddress,
-            memo: this.bidMemo
+            memo: this.bidMemo,
+            idempotency_key: this.bidRequestKey.key
           }
         )
         this.bidRequest = data
+        if (!this.myBidIds.includes(data.id)) {
+          this.myBidIds.push(data.id)
+        }
         this.showBidRequestQrCode = true
         this.$q.notify({
           type: 'positive',
@@ -207,10 +229,8 @@ window.app = Vue.createApp({
               message: 'Invoice Paid!'
             })
             this.showBidRequestQrCode = false
+            this.bidRequestKey = null
             ws.close()
-            setTimeout(() => {
-              window.location.reload()
-            }, 2000)
           }
         })
       } catch (err) {
@@ -218,6 +238,61 @@ window.app = Vue.createApp({
         LNbits.utils.notifyApiError(err)
       }
     },
+    listenForBids: function () {
+      const auctionItemId = this.bidForm.data.id
+      const source = new EventSource(
+        `/auction_house/api/v1/bids/${auctionItemId}/stream`
+      )
+      source.addEventListener('bid', ({data}) =>
+        this.onNewBid(JSON.parse(data))
+      )
+      source.addEventListener('item', ({data}) => {
+        const item = JSON.parse(data)
+        this.bidForm.data.current_price = item.current_price
+        this.bidForm.data.current_price_sat = item.current_price_sat
+        this.bidForm.data.next_min_bid = item.next_min_bid
+        this.bidForm.data.next_min_bid_sat = item.next_min_bid_sat
+        this.bidForm.data.expires_at_ms = item.expires_at_ms
+        this.currentPrice = this.formatCurrency(
+          item.current_price,
+          item.currency
+        )
+        this.bidPrice = Math.max(this.bidPrice, item.next_min_bid)
+      })
+      source.addEventListener('closed', () => {
+        source.close()
+        this.bidForm.data.active = false
+      })
+      source.addEventListener('reset', () => {
+        source.close()
+        this.getBidsPaginated()
+        this.listenForBids()
+      })
+      this.bidEvents = source
+    },
+    onNewBid: function (bid) {
+      bid.user_is_owner = this.myBidIds.includes(bid.id)
+      if (this.onlyMyBids && !bid.user_is_owner) return
+      if (this.bidsTable.search) {
+        this.getBidsPaginated()
+        return
+      }
+      const existingBid = this.bidsList.find(b => b.id === bid.id)
+      if (existingBid) {
+        Object.assign(existingBid, bid)
+      } else {
+        this.bidsList.unshift(bid)
+        this.bidsTable.pagination.rowsNumber += 1
+        if (this.bidsList.length > this.bidsTable.pagination.rowsPerPage) {
+          this.bidsList.pop()
+        }
+      }
+      this.bidsList
+        .filter(b => b.id !== bid.id)
+        .forEach(b => {
+          b.higher_bid_made = true
+        })
+    },
     showAddNewAuctionItemDialog: function () {
       this.itemFormDialog.show = true
       this.itemFormDialog.data = {
@@ -227,16 +302,10 @@ window.app = Vue.createApp({
       }
     },
     initTimeLeft: function (item) {
-      setInterval(() => {
-        item.time_left_seconds -= 1
-        const duration = moment.utc(item.time_left_seconds * 1000)
-        this.timeLeft = {
-          days: +duration.format('DDD') - 1,
-          hours: duration.format('HH'),
-          minutes: duration.format('mm'),
-          seconds: duration.format('ss')
-        }
-      }, 1000)
+      auctionTicker.setServerTime(item.server_time_ms)
+      auctionTicker.subscribe(time => {
+        this.timeLeft = auctionTicker.timeLeft(item.expires_at_ms, time)
+      })
     },
     formatCurrency(amount, currency) {
       try {
@@ -251,6 +320,9 @@ window.app = Vue.createApp({
     const item = this.bidForm.data
     this.initTimeLeft(item)
     this.getBidsPaginated()
+    if (item.active) {
+      this.listenForBids()
+    }
     this.currentPrice = LNbits.utils.formatCurrency(
       item.current_price,
       item.currency
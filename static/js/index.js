@@ -6,7 +6,9 @@ window.app = Vue.createApp({
       auctionRooms: [],
       biddingType: [
         {value: 'auction', label: 'Auction'},
-        {value: 'fixed_price', label: 'Fixed Price'}
+        {value: 'fixed_price', label: 'Fixed Price'},
+        {value: 'sealed_first_price', label: 'Sealed Bid (first price)'},
+        {value: 'sealed_second_price', label: 'Sealed Bid (second price)'}
       ],
 
       currencyOptions: [],
@@ -37,7 +39,7 @@ window.app = Vue.createApp({
             align: 'left',
             label: 'Type',
             field: 'type',
-            format: val => (val === 'auction' ? '🔨' : '💰')
+            format: val => ({auction: '🔨', fixed_price: '💰'})[val] || '✉️'
           },
           {name: 'days', align: 'left', label: 'Days', field: 'days'},
           {
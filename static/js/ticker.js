@@ -0,0 +1,57 @@
+// A single timer shared by all the countdowns of a page.
+// It ticks on the whole seconds of the server clock and only renders when the
+// page is visible (animation frames are paused for hidden tabs).
+window.auctionTicker = (function () {
+  const listeners = new Set()
+  let clockOffset = 0
+  let timer = null
+
+  const now = () => Date.now() + clockOffset
+
+  const schedule = () => {
+    timer = setTimeout(() => requestAnimationFrame(tick), 1000 - (now() % 1000))
+  }
+
+  const tick = () => {
+    if (!listeners.size) {
+      timer = null
+      return
+    }
+    const time = now()
+    listeners.forEach(listener => listener(time))
+    schedule()
+  }
+
+  const pad = value => String(value).padStart(2, '0')
+
+  return {
+    now,
+    setServerTime(serverTime) {
+      clockOffset = serverTime - Date.now()
+    },
+    subscribe(listener) {
+      listeners.add(listener)
+      listener(now())
+      if (!timer) schedule()
+    },
+    unsubscribe(listener) {
+      listeners.delete(listener)
+    },
+    // `expiresAt` in epoch milliseconds, as `expires_at_ms` of the items
+    timeLeft(expiresAt, time = now()) {
+      const total = Math.max(0, Math.floor((expiresAt - time) / 1000))
+      return {
+        total,
+        days: Math.floor(total / 86400),
+        hours: pad(Math.floor((total % 86400) / 3600)),
+        minutes: pad(Math.floor((total % 3600) / 60)),
+        seconds: pad(total % 60)
+      }
+    },
+    formatTimeLeft(expiresAt, time = now()) {
+      const left = this.timeLeft(expiresAt, time)
+      const clock = `${left.hours}:${left.minutes}:${left.seconds}`
+      return left.days ? `${left.days}d ${clock}` : clock
+    }
+  }
+})()
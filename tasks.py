@@ -4,7 +4,17 @@ from lnbits.core.models import Payment
 from lnbits.tasks import register_invoice_listener
 from loguru import logger
 
-from .services import checked_expired_auctions, queue_bid_paid
+from .services import (
+    checked_expired_auctions,
+    is_leader,
+    process_bid_payments,
+    prune_audit_entries,
+    prune_processed_payments,
+    purge_expired_bids,
+    recover_missed_payments,
+    refill_wallet_pools,
+    release_expired_reservations,
+)
 
 
 async def wait_for_paid_invoices():
@@ -12,45 +22,104 @@ async def wait_for_paid_invoices():
     register_invoice_listener(invoice_queue, "ext_auction_house")
 
     while True:
-        payment = await invoice_queue.get()
-        await _on_invoice_paid(payment)
+        payments = await _next_payments_batch(invoice_queue)
+        bid_payments = [p for p in payments if _is_bid_payment(p)]
+        if not bid_payments:
+            continue
+        try:
+            await process_bid_payments(bid_payments)
+        except Exception as e:
+            logger.warning(f"Error processing payments: {e}")
+
+
+async def _next_payments_batch(
+    invoice_queue: asyncio.Queue, max_size: int = 100
+) -> list[Payment]:
+    """
+    Wait for a payment, then take the ones already queued behind it.
+    """
+    payments = [await invoice_queue.get()]
+    while len(payments) < max_size and not invoice_queue.empty():
+        payments.append(invoice_queue.get_nowait())
+    return payments
+
+
+async def recover_missed_payments_task():
+    try:
+        await recover_missed_payments()
+    except Exception as ex:
+        logger.error(f"Payment recovery failed: {ex}")
 
 
 async def run_by_the_minute_task():
+    # before the first close: an item that expired during the downtime must not
+    # be settled without the bids paid meanwhile. The invoice listener is
+    # already registered, payments arriving during the recovery are
+    # deduplicated by the processed payments ledger.
+    await recover_missed_payments_task()
     minute_counter = 0
     while True:
+        # with several LNbits workers only the leader closes and settles items
+        if not await is_leader():
+            await asyncio.sleep(60)
+            continue
+
         try:
             await checked_expired_auctions()
         except Exception as ex:
             logger.error(ex)
 
+        try:
+            await refill_wallet_pools()
+        except Exception as ex:
+            logger.error(ex)
+
+        try:
+            await release_expired_reservations()
+        except Exception as ex:
+            logger.error(ex)
+
+        if minute_counter % 60 == 0:
+            await _prune_old_data()
+
+        # offset from startup so that missed payments are recovered first
+        if minute_counter % 10 == 5:
+            try:
+                await purge_expired_bids()
+            except Exception as ex:
+                logger.error(ex)
+
         minute_counter += 1
         await asyncio.sleep(60)
 
 
-async def _on_invoice_paid(payment: Payment) -> None:
+async def _prune_old_data():
+    for prune in (prune_audit_entries, prune_processed_payments):
+        try:
+            await prune()
+        except Exception as ex:
+            logger.error(ex)
+
+
+def _is_bid_payment(payment: Payment) -> bool:
     if not payment.extra or payment.extra.get("tag") != "auction_house":
-        return
+        return False
     if payment.extra.get("is_refund", False):
         logger.debug(
             f"Auction House refund received: '{payment.payment_hash}: {payment.memo}'"
         )
-        return
+        return False
     if payment.extra.get("is_fee", False):
         logger.debug(
             f"Auction House fee received: '{payment.payment_hash}: {payment.memo}'"
         )
-        return
+        return False
     if payment.extra.get("is_owner_payment", False):
         logger.debug(
             f"Auction House fee received: '{payment.payment_hash}: {payment.memo}'"
         )
-        return
+        return False
     logger.debug(
         f"Auction House payment received: '{payment.payment_hash}: {payment.memo}'"
     )
-
-    try:
-        await queue_bid_paid(payment)
-    except Exception as e:
-        logger.warning(f"Error processing payment: {e}")
+    return True
@@ -3,14 +3,20 @@ from datetime import datetime, timezone
 import httpx
 import pytest
 from auction_house.crud import (  # type: ignore[import]
+    AuctionItemConflictError,
+    claim_auction_item_close,
     create_auction_item,
     create_auction_room,
+    get_auction_item_by_id,
     get_auction_items,
+    set_auction_item_state,
+    update_auction_item,
 )
 from auction_house.models import (  # type: ignore[import]
     AuctionItem,
     AuctionItemExtra,
     AuctionItemFilters,
+    AuctionItemState,
     AuctionRoom,
     AuctionRoomConfig,
     CreateAuctionItem,
@@ -19,6 +25,7 @@ from auction_house.models import (  # type: ignore[import]
 from auction_house.services import (  # type: ignore[import]
     add_auction_item,
     get_auction_room_items_paginated,
+    update_auction_item_with_retry,
 )
 from lnbits.db import Filter, Filters
 from lnbits.helpers import urlsafe_short_hash
@@ -356,3 +363,154 @@ async def test_get_auction_room_items_paginated_with_filters():
     assert page.total == 1
     assert len(page.data) == 1
     assert page.data[0].name == "Item 3"
+
+
+@pytest.mark.asyncio
+async def test_get_auction_room_items_paginated_text_search():
+    user_id = "user123"
+
+    auction_room = AuctionRoom(
+        id=urlsafe_short_hash(),
+        user_id=user_id,
+        name="Search Room",
+        fee_wallet_id="w123",
+        type="auction",
+        description="Room with searchable items",
+        currency="USD",
+        extra=AuctionRoomConfig(),
+    )
+    auction_room = await create_auction_room(auction_room)
+
+    items = []
+    for name, description in [
+        ("Red Bicycle", "A classic road bike"),
+        ("Roof Rack", "Fits any bicycle, bike not included"),
+        ("Chair", None),
+    ]:
+        item = AuctionItem(
+            id=urlsafe_short_hash(),
+            auction_room_id=auction_room.id,
+            user_id=user_id,
+            name=name,
+            description=description,
+            ask_price=100.0,
+            expires_at=datetime.now(timezone.utc)
+            + auction_room.extra.duration.to_timedelta(),
+            extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+        )
+        await create_auction_item(item)
+        items.append(item)
+
+    # a name match ranks above a description match
+    page = await get_auction_room_items_paginated(
+        auction_room=auction_room, text_search="Bicyc"
+    )
+    assert [item.name for item in page.data] == ["Red Bicycle", "Roof Rack"]
+
+    page = await get_auction_room_items_paginated(
+        auction_room=auction_room, text_search="road bike"
+    )
+    assert [item.name for item in page.data] == ["Red Bicycle"]
+
+    # the index follows the updates
+    items[2].description = "Wooden, goes with a bike"
+    await update_auction_item(items[2])
+    page = await get_auction_room_items_paginated(
+        auction_room=auction_room,
+        text_search="bike",
+        filters=Filters(sortby="name", direction="asc"),
+    )
+    assert [item.name for item in page.data] == ["Chair", "Red Bicycle", "Roof Rack"]
+
+    page = await get_auction_room_items_paginated(
+        auction_room=auction_room, text_search='" OR * -'
+    )
+    assert page.total == 3
+
+
+@pytest.mark.asyncio
+async def test_update_auction_item_version_conflict():
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id="user123",
+            name="Versioned Room",
+            fee_wallet_id="w123",
+            type="auction",
+            description="Room with concurrent updates",
+            currency="sat",
+            extra=AuctionRoomConfig(),
+        )
+    )
+    item = AuctionItem(
+        id=urlsafe_short_hash(),
+        auction_room_id=auction_room.id,
+        user_id="user123",
+        name="Versioned Item",
+        ask_price=100.0,
+        expires_at=datetime.now(timezone.utc),
+        extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+    )
+    await create_auction_item(item)
+    stale_item = await get_auction_item_by_id(item.id)
+    assert stale_item
+
+    item.extra.is_fee_paid = True
+    await update_auction_item(item)
+    assert item.version == 1
+
+    stale_item.extra.is_owner_paid = True
+    with pytest.raises(AuctionItemConflictError):
+        await update_auction_item(stale_item)
+
+    # the flag set by the other update is kept
+    await update_auction_item_with_retry(
+        stale_item, lambda i: setattr(i.extra, "is_owner_paid", True)
+    )
+    stored_item = await get_auction_item_by_id(item.id)
+    assert stored_item
+    assert stored_item.version == 2
+    assert stored_item.extra.is_fee_paid
+    assert stored_item.extra.is_owner_paid
+
+
+@pytest.mark.asyncio
+async def test_claim_auction_item_close_once():
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id="user123",
+            name="Closing Room",
+            fee_wallet_id="w123",
+            type="auction",
+            description="Room closed twice",
+            currency="sat",
+            extra=AuctionRoomConfig(),
+        )
+    )
+    item = AuctionItem(
+        id=urlsafe_short_hash(),
+        auction_room_id=auction_room.id,
+        user_id="user123",
+        name="Closing Item",
+        ask_price=100.0,
+        expires_at=datetime.now(timezone.utc),
+        extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+    )
+    await create_auction_item(item)
+
+    active = [AuctionItemState.ACTIVE]
+    assert await claim_auction_item_close(item.id, active)
+    assert not await claim_auction_item_close(item.id, active)
+
+    stored_item = await get_auction_item_by_id(item.id)
+    assert stored_item
+    assert stored_item.state == AuctionItemState.CLOSING
+    assert stored_item.active is False
+
+    # only a failed settlement can be claimed again
+    await set_auction_item_state(item.id, AuctionItemState.FAILED)
+    assert not await claim_auction_item_close(item.id, active)
+    assert await claim_auction_item_close(
+        item.id, [AuctionItemState.ACTIVE, AuctionItemState.FAILED]
+    )
@@ -1,15 +1,29 @@
 import pytest
 from auction_house.crud import (  # type: ignore[import]
     create_auction_room,
+    create_audit_entry,
+    create_bid,
+    get_auction_items,
     get_auction_room,
+    get_auction_room_by_id,
+    get_audit_entry_paginated,
+    get_bids,
     update_auction_room,
 )
 from auction_house.models import (  # type: ignore[import]
     AuctionRoom,
     AuctionRoomConfig,
+    Bid,
+    CreateAuctionItem,
     EditAuctionRoomData,
+    PublicAuditEntry,
 )
-from auction_house.services import get_user_auction_rooms  # type: ignore[import]
+from auction_house.services import (  # type: ignore[import]
+    add_auction_item,
+    delete_auction_room_data,
+    get_user_auction_rooms,
+)
+from lnbits.core.crud import get_wallet
 from lnbits.helpers import urlsafe_short_hash
 
 
@@ -155,3 +169,64 @@ async def test_update_auction_room_type_change():
     )
     with pytest.raises(ValueError, match="Cannot change auction room type."):
         await update_auction_room(user_id=user_id, data=edit_data)
+
+
+@pytest.mark.asyncio
+async def test_delete_auction_room_data():
+    user_id = "user123"
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id=user_id,
+            name="Room to delete",
+            fee_wallet_id="w123",
+            type="auction",
+            description="d1",
+            currency="USD",
+            extra=AuctionRoomConfig(),
+        )
+    )
+    items = []
+    for i in range(5):
+        item = await add_auction_item(
+            auction_room,
+            user_id,
+            CreateAuctionItem(name=f"Item {i}", ask_price=10, transfer_code="t1"),
+        )
+        for j in range(3):
+            await create_bid(
+                Bid(
+                    id=urlsafe_short_hash(),
+                    user_id="bidder",
+                    auction_item_id=item.id,
+                    memo=f"bid {j}",
+                    amount=10 + j,
+                    amount_sat=100 + j,
+                    currency="USD",
+                    payment_hash=urlsafe_short_hash(),
+                    paid=True,
+                )
+            )
+        items.append(item)
+    await create_audit_entry(
+        PublicAuditEntry(entry_id=auction_room.id, data="room entry")
+    )
+
+    deletion = await delete_auction_room_data(auction_room, batch_size=2)
+
+    assert deletion.done is True
+    assert deletion.error is None
+    assert deletion.items_deleted == 5
+    assert deletion.bids_deleted == 15
+    assert deletion.wallets_deleted == 5
+    assert deletion.audit_entries_deleted >= 6
+    assert await get_auction_room_by_id(auction_room.id) is None
+    assert await get_auction_items(auction_room.id) == []
+    for item in items:
+        assert await get_bids(item.id) == []
+        audit = await get_audit_entry_paginated(item.id)
+        assert audit.total == 0
+        wallet = await get_wallet(item.extra.wallet_id)
+        assert wallet is None or wallet.deleted
+    audit = await get_audit_entry_paginated(auction_room.id)
+    assert audit.total == 0
@@ -0,0 +1,139 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from auction_house.crud import (  # type: ignore[import]
+    create_auction_item,
+    create_auction_room,
+    db,
+    get_audit_entry_paginated,
+)
+from auction_house.models import (  # type: ignore[import]
+    AuctionItem,
+    AuctionItemExtra,
+    AuctionRoom,
+    AuctionRoomConfig,
+    AuditEntryFilters,
+    AuditEvent,
+    AuditRetention,
+    PublicAuditEntry,
+)
+from auction_house.services import (  # type: ignore[import]
+    audit_archive_path,
+    db_log,
+    prune_auction_room_audit,
+)
+from lnbits.db import Filter, Filters
+from lnbits.helpers import urlsafe_short_hash
+
+
+async def _create_audit_entry(entry_id: str, data: str, days_ago: int):
+    await db.insert(
+        "auction_house.auction_audit",
+        PublicAuditEntry(
+            entry_id=entry_id,
+            data=data,
+            created_at=datetime.now(timezone.utc) - timedelta(days=days_ago),
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_prune_auction_room_audit():
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id="user123",
+            name="Room",
+            fee_wallet_id="w123",
+            type="auction",
+            description="d1",
+            currency="USD",
+            extra=AuctionRoomConfig(
+                audit_retention=AuditRetention(days=7, archive=True)
+            ),
+        )
+    )
+    item_ids = {}
+    for active in [True, False]:
+        item = AuctionItem(
+            id=urlsafe_short_hash(),
+            auction_room_id=auction_room.id,
+            user_id="user123",
+            name=f"Item {active}",
+            active=active,
+            ask_price=10,
+            expires_at=datetime.now(timezone.utc),
+            extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+        )
+        await create_auction_item(item)
+        item_ids[active] = item.id
+
+    for entry_id in [auction_room.id, *item_ids.values()]:
+        await _create_audit_entry(entry_id, "old entry", days_ago=30)
+        await _create_audit_entry(entry_id, "old entry", days_ago=10)
+        await _create_audit_entry(entry_id, "new entry", days_ago=1)
+
+    pruned = await prune_auction_room_audit(auction_room, batch_size=3)
+    assert pruned == 4
+
+    room_audit = await get_audit_entry_paginated(auction_room.id)
+    assert [e.data for e in room_audit.data] == ["new entry"]
+    closed_item_audit = await get_audit_entry_paginated(item_ids[False])
+    assert [e.data for e in closed_item_audit.data] == ["new entry"]
+    active_item_audit = await get_audit_entry_paginated(item_ids[True])
+    assert active_item_audit.total == 3
+
+    path = audit_archive_path(auction_room.id)
+    assert os.path.isfile(path)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert len(archived) == 4
+    assert all(entry["data"] == "old entry" for entry in archived)
+
+    assert await prune_auction_room_audit(auction_room) == 0
+
+
+@pytest.mark.asyncio
+async def test_audit_events_filter_and_render():
+    entry_id = urlsafe_short_hash()
+    await db_log(entry_id, AuditEvent.BID_PLACING, memo="m1")
+    await db_log(
+        entry_id,
+        AuditEvent.PAYMENT_RECEIVED,
+        bid_id="bid1",
+        amount_sat=1000,
+        amount=1.5,
+        currency="USD",
+        payment_hash="hash1",
+    )
+    await db_log(entry_id, AuditEvent.REFUNDED, "bid2", refunded=True)
+    await _create_audit_entry(entry_id, "legacy entry", days_ago=1)
+
+    filters = Filters(
+        filters=[Filter.parse_query("event", ["payment_received"], AuditEntryFilters)],
+        model=AuditEntryFilters,
+    )
+    page = await get_audit_entry_paginated(entry_id, filters)
+    assert page.total == 1
+    entry = page.data[0]
+    assert entry.bid_id == "bid1"
+    assert entry.payload["payment_hash"] == "hash1"
+    assert entry.data == ""
+    assert entry.render() == (
+        "Payment received. Amount: 1000 sat. 1.5 USD. Payment: hash1. Bid: bid1."
+    )
+
+    filters = Filters(
+        filters=[Filter.parse_query("bid_id", ["bid2"], AuditEntryFilters)],
+        model=AuditEntryFilters,
+    )
+    page = await get_audit_entry_paginated(entry_id, filters)
+    assert [e.event for e in page.data] == [AuditEvent.REFUNDED]
+    assert page.data[0].render() == "Refunded: True. Bid: bid2."
+
+    page = await get_audit_entry_paginated(entry_id)
+    assert page.total == 4
+    assert "legacy entry" in [e.render() for e in page.data]
@@ -0,0 +1,444 @@
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pytest
+from auction_house.cache import processed_payments_cache  # type: ignore[import]
+from auction_house.crud import (  # type: ignore[import]
+    claim_auction_item_close,
+    claim_bid_reservation,
+    create_auction_item,
+    create_auction_room,
+    create_bid,
+    create_processed_payments,
+    get_auction_item_by_id,
+    get_auction_room_by_id,
+    get_audit_entry_paginated,
+    get_bids_by_payment_hashes,
+    get_top_bid,
+    get_unrefunded_bids,
+    has_paid_bid,
+    reserve_auction_item_unit,
+    set_auction_item_state,
+    set_bid_paid,
+    update_auction_item,
+)
+from auction_house.models import (  # type: ignore[import]
+    AuctionItem,
+    AuctionItemExtra,
+    AuctionItemState,
+    AuctionRoom,
+    AuctionRoomConfig,
+    AuditEvent,
+    Bid,
+    BidRequest,
+)
+from auction_house.services import (  # type: ignore[import]
+    _item_locks,
+    _pick_sealed_winner,
+    _resolve_proxy_bids,
+    get_auction_item,
+    get_outstanding_bid_response,
+    place_bid,
+    process_bid_payments,
+    prune_processed_payments,
+    purge_expired_bids,
+    recover_missed_payments,
+    refund_outbid_bids,
+    release_expired_reservations,
+)
+from lnbits.core.crud import create_payment
+from lnbits.core.models import CreatePayment, Payment, PaymentState
+from lnbits.helpers import urlsafe_short_hash
+
+
+async def _create_item(
+    active: bool = True, room_type: str = "auction", **kwargs
+) -> AuctionItem:
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id="owner",
+            name="Room",
+            fee_wallet_id="w123",
+            type=room_type,
+            description="d1",
+            currency="USD",
+            extra=AuctionRoomConfig(),
+        )
+    )
+    item = AuctionItem(
+        id=urlsafe_short_hash(),
+        auction_room_id=auction_room.id,
+        user_id="owner",
+        name="Item",
+        active=active,
+        ask_price=10,
+        expires_at=datetime.now(timezone.utc),
+        extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+        **kwargs,
+    )
+    await create_auction_item(item)
+    return item
+
+
+async def _create_bid(auction_item_id: str, amount_sat: int, **kwargs) -> Bid:
+    bid = Bid(
+        id=urlsafe_short_hash(),
+        user_id=urlsafe_short_hash(),
+        auction_item_id=auction_item_id,
+        memo="memo",
+        amount=amount_sat / 100,
+        amount_sat=amount_sat,
+        currency="USD",
+        payment_hash=urlsafe_short_hash(),
+        **{"paid": False, **kwargs},
+    )
+    await create_bid(bid)
+    return bid
+
+
+def _bid(amount: float, max_amount: Optional[float] = None) -> Bid:
+    return Bid(
+        id=urlsafe_short_hash(),
+        user_id=urlsafe_short_hash(),
+        auction_item_id="i1",
+        memo="memo",
+        amount=amount,
+        amount_sat=int(amount * 100),
+        max_amount=max_amount,
+        max_amount_sat=int(max_amount * 100) if max_amount else None,
+        currency="USD",
+        payment_hash=urlsafe_short_hash(),
+    )
+
+
+def test_resolve_proxy_bids():
+    # a higher bid is outbid right away by the proxy bid on top
+    top, bid = _bid(10, max_amount=50), _bid(20)
+    assert _resolve_proxy_bids(bid, top, 5) is top
+    assert top.amount == 21 and top.amount_sat == 2100
+
+    # the proxy bid stops at its maximum
+    bid = _bid(49)
+    assert _resolve_proxy_bids(bid, top, 5) is top
+    assert top.amount == 50
+
+    # a higher maximum wins, just over the maximum of the other proxy bid
+    top, bid = _bid(10, max_amount=30), _bid(11, max_amount=100)
+    assert _resolve_proxy_bids(bid, top, 5) is bid
+    assert bid.amount == 31.5 and bid.paid_sat == 10000
+    assert top.amount == 30
+
+    # the first bid wins ties
+    top, bid = _bid(10, max_amount=30), _bid(12, max_amount=30)
+    assert _resolve_proxy_bids(bid, top, 5) is top
+    assert top.amount == 30 and bid.amount == 30
+
+    assert _resolve_proxy_bids(bid, None, 5) is bid
+
+
+def _payment(payment_hash: str, amount_sat: int) -> Payment:
+    return Payment(
+        checking_id=payment_hash,
+        payment_hash=payment_hash,
+        wallet_id="w123",
+        amount=amount_sat * 1000,
+        fee=0,
+        bolt11="lnbc",
+        extra={"tag": "auction_house"},
+    )
+
+
+async def _create_core_payment(bid: Bid, status: PaymentState) -> None:
+    await create_payment(
+        checking_id=bid.payment_hash,
+        data=CreatePayment(
+            wallet_id="w123",
+            payment_hash=bid.payment_hash,
+            bolt11="lnbc",
+            amount_msat=bid.amount_sat * 1000,
+            memo="bid",
+            extra={"tag": "auction_house"},
+        ),
+        status=status,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_bids_by_payment_hashes():
+    item = await _create_item()
+    bids = [await _create_bid(item.id, 1000) for _ in range(3)]
+
+    found = await get_bids_by_payment_hashes(
+        [bids[0].payment_hash, bids[2].payment_hash, "unknown"]
+    )
+    assert {bid.id for bid in found} == {bids[0].id, bids[2].id}
+    assert await get_bids_by_payment_hashes([]) == []
+
+
+@pytest.mark.asyncio
+async def test_process_bid_payments_rejects_per_item():
+    item = await _create_item()
+    closed_item = await _create_item(active=False)
+    bid = await _create_bid(item.id, 1000)
+    closed_bid = await _create_bid(closed_item.id, 1000)
+
+    accepted = await process_bid_payments(
+        [
+            _payment(bid.payment_hash, 999),
+            _payment("unknown_hash", 1000),
+            _payment(closed_bid.payment_hash, 1000),
+        ]
+    )
+    assert accepted == 0
+    assert _item_locks == {}
+
+    audit = await get_audit_entry_paginated(item.id)
+    assert {e.event for e in audit.data} == {
+        AuditEvent.PAYMENT_RECEIVED,
+        AuditEvent.PAYMENT_AMOUNT_MISMATCH,
+    }
+    audit = await get_audit_entry_paginated(closed_item.id)
+    events = [e.event for e in audit.data]
+    assert AuditEvent.PAYMENT_FOR_CLOSED_ITEM in events
+    assert AuditEvent.REFUND_NO_WALLET in events
+
+
+@pytest.mark.asyncio
+async def test_process_bid_payments_drops_duplicates():
+    item = await _create_item()
+    bid = await _create_bid(item.id, 1000)
+    payment = _payment(bid.payment_hash, 999)
+
+    await process_bid_payments([payment, payment])
+    audit = await get_audit_entry_paginated(item.id)
+    assert audit.total == 2
+
+    # replayed after a restart: only the ledger table knows about it
+    processed_payments_cache._hashes.clear()
+    assert await create_processed_payments([bid.payment_hash, "new_hash"]) == {
+        "new_hash"
+    }
+    await process_bid_payments([payment])
+    audit = await get_audit_entry_paginated(item.id)
+    assert audit.total == 2
+
+
+@pytest.mark.asyncio
+async def test_create_processed_payments_claims_once():
+    hashes = [urlsafe_short_hash() for _ in range(5)]
+    claims = await asyncio.gather(
+        create_processed_payments(hashes), create_processed_payments(hashes[::-1])
+    )
+    assert claims[0] | claims[1] == set(hashes)
+    assert not claims[0] & claims[1]
+
+
+@pytest.mark.asyncio
+async def test_prune_processed_payments():
+    item = await _create_item()
+    settled_item = await _create_item()
+    bid = await _create_bid(item.id, 1000, paid=True)
+    settled_bid = await _create_bid(settled_item.id, 1000, paid=True)
+    orphan_hash = urlsafe_short_hash()
+    hashes = [bid.payment_hash, settled_bid.payment_hash, orphan_hash]
+    await create_processed_payments(hashes)
+    await set_auction_item_state(settled_item.id, AuctionItemState.SETTLED)
+
+    # the other tests record payments too
+    assert await prune_processed_payments(timedelta(days=-1)) >= 2
+    # only the payment of the active item is still recorded
+    assert await create_processed_payments(hashes) == {
+        settled_bid.payment_hash,
+        orphan_hash,
+    }
+
+
+@pytest.mark.asyncio
+async def test_recover_missed_payments():
+    item = await _create_item()
+    item.expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    await update_auction_item(item)
+    paid_bid = await _create_bid(item.id, 1000)
+    pending_bid = await _create_bid(item.id, 2000)
+    await _create_core_payment(paid_bid, PaymentState.SUCCESS)
+    await _create_core_payment(pending_bid, PaymentState.PENDING)
+
+    assert await recover_missed_payments(batch_size=1, workers=2) == 1
+    top_bid = await get_top_bid(item.id)
+    assert top_bid and top_bid.id == paid_bid.id
+
+    assert await recover_missed_payments() == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_bids():
+    item = await _create_item()
+    now = datetime.now(timezone.utc)
+    expired = [
+        await _create_bid(item.id, 1000, expires_at=now - timedelta(hours=1))
+        for _ in range(3)
+    ]
+    kept = [
+        await _create_bid(item.id, 1000, expires_at=now + timedelta(minutes=5)),
+        await _create_bid(item.id, 1000, expires_at=now - timedelta(minutes=1)),
+        await _create_bid(
+            item.id, 1000, paid=True, expires_at=now - timedelta(hours=1)
+        ),
+        await _create_bid(item.id, 1000, created_at=now - timedelta(hours=2)),
+    ]
+    legacy = await _create_bid(item.id, 1000, created_at=now - timedelta(days=2))
+
+    assert await purge_expired_bids(batch_size=2) == 4
+
+    bids = await get_bids_by_payment_hashes(
+        [bid.payment_hash for bid in [*expired, *kept, legacy]]
+    )
+    assert {bid.id for bid in bids} == {bid.id for bid in kept}
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_bids_keeps_paid_invoices():
+    item = await _create_item()
+    item.expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    await update_auction_item(item)
+    # paid, but the processing of the payment failed
+    bid = await _create_bid(
+        item.id, 1000, expires_at=datetime.now(timezone.utc) - timedelta(hours=1)
+    )
+    await _create_core_payment(bid, PaymentState.SUCCESS)
+
+    await purge_expired_bids()
+
+    top_bid = await get_top_bid(item.id)
+    assert top_bid and top_bid.id == bid.id
+
+
+@pytest.mark.asyncio
+async def test_release_expired_reservations():
+    item = await _create_item(quantity=3, stock=3)
+    now = datetime.now(timezone.utc)
+    assert await reserve_auction_item_unit(item.id)
+    expired = await _create_bid(
+        item.id, 1000, reserved=True, expires_at=now - timedelta(minutes=5)
+    )
+    assert await reserve_auction_item_unit(item.id)
+    pending = await _create_bid(
+        item.id, 1000, reserved=True, expires_at=now + timedelta(minutes=5)
+    )
+    assert await reserve_auction_item_unit(item.id)
+    assert not await reserve_auction_item_unit(item.id)
+
+    assert await release_expired_reservations() == 1
+    assert await release_expired_reservations() == 0
+
+    updated = await get_auction_item_by_id(item.id)
+    assert updated and updated.stock == 1
+    # paid after its invoice expired, the unit is already back in stock
+    assert not await claim_bid_reservation(expired)
+    assert await claim_bid_reservation(pending)
+
+
+@pytest.mark.asyncio
+async def test_refund_outbid_bids_keeps_failed_refunds():
+    item = await _create_item()
+    outbid = await _create_bid(item.id, 1000, paid=True, higher_bid_made=True)
+    await _create_bid(item.id, 1100, paid=True, higher_bid_made=True, refunded=True)
+    proxy = await _create_bid(
+        item.id, 1200, paid=True, max_amount=20, max_amount_sat=2000
+    )
+
+    # the bidder has no wallet, the refund fails and is kept for the next batch
+    assert not await refund_outbid_bids(item)
+    bids = await get_unrefunded_bids(item.id)
+    assert [bid.id for bid in bids] == [outbid.id, proxy.id]
+
+    page = await get_audit_entry_paginated(item.id)
+    refunding = [e.bid_id for e in page.data if e.event == AuditEvent.REFUNDING]
+    # proxy bids wait for the close
+    assert refunding == [outbid.id]
+
+
+@pytest.mark.asyncio
+async def test_pick_sealed_winner_second_price():
+    item = await _create_item(room_type="sealed_second_price")
+    auction_room = await get_auction_room_by_id(item.auction_room_id)
+    await _create_bid(item.id, 1500, paid=True)
+    high = await _create_bid(item.id, 3000, paid=True)
+    await _create_bid(item.id, 2000, paid=True)
+
+    winner = await _pick_sealed_winner(item, auction_room)
+    assert winner and winner.id == high.id
+    # pays the second highest bid, the rest is refunded at close
+    assert winner.amount == 20 and winner.amount_sat == 2000
+    assert winner.paid_sat == 3000
+
+    # a retried settlement keeps the winner and its price
+    winner = await _pick_sealed_winner(item, auction_room)
+    assert winner and winner.id == high.id and winner.amount == 20
+    top_bid = await get_top_bid(item.id)
+    assert top_bid and top_bid.id == high.id
+
+
+@pytest.mark.asyncio
+async def test_has_paid_bid():
+    item = await _create_item(room_type="sealed_first_price")
+    unpaid = await _create_bid(item.id, 1000)
+    assert not await has_paid_bid(unpaid.user_id, item.id)
+    paid = await _create_bid(item.id, 1000, paid=True)
+    assert await has_paid_bid(paid.user_id, item.id)
+
+
+@pytest.mark.asyncio
+async def test_set_bid_paid_only_for_active_items():
+    item = await _create_item()
+    bid = await _create_bid(item.id, 1000)
+    late_bid = await _create_bid(item.id, 1000)
+    assert await set_bid_paid(bid)
+    assert not await set_bid_paid(bid)
+
+    assert await claim_auction_item_close(item.id, [AuctionItemState.ACTIVE])
+    assert not await set_bid_paid(late_bid)
+
+
+@pytest.mark.asyncio
+async def test_outstanding_bid_response_from_db():
+    item = await _create_item()
+    bid = await _create_bid(item.id, 1000)
+    await create_payment(
+        checking_id=bid.payment_hash,
+        data=CreatePayment(
+            wallet_id="w123",
+            payment_hash=bid.payment_hash,
+            bolt11="lnbc_outstanding",
+            amount_msat=bid.amount_sat * 1000,
+            memo="bid",
+            extra={"tag": "auction_house"},
+        ),
+    )
+
+    data = BidRequest(memo="retry", amount=bid.amount)
+    bid_response = await get_outstanding_bid_response(bid.user_id, item.id, data)
+    assert bid_response
+    assert bid_response.id == bid.id
+    assert bid_response.payment_request == "lnbc_outstanding"
+
+    data = BidRequest(memo="retry", amount=bid.amount + 1)
+    assert not await get_outstanding_bid_response(bid.user_id, item.id, data)
+    assert not await get_outstanding_bid_response("other_user", item.id, data)
+
+
+@pytest.mark.asyncio
+async def test_place_bid_rejected_with_closing_time():
+    item = await _create_item()
+    closed_at = item.expires_at.isoformat(timespec="milliseconds")
+
+    with pytest.raises(ValueError, match=re.escape(f"Auction closed at {closed_at}")):
+        await place_bid("bidder", item.id, BidRequest(memo="late", amount=20))
+
+    details = await get_auction_item(item.id)
+    assert details
+    assert details.active is False
+    assert details.expires_at_ms <= details.server_time_ms
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+from auction_house.cache import (  # type: ignore[import]
+    BiddedItemsCache,
+    BidResponseCache,
+    CatalogCache,
+    ProcessedPaymentsCache,
+)
+from auction_house.models import BidResponse  # type: ignore[import]
+
+
+@pytest.mark.asyncio
+async def test_catalog_cache_hit():
+    cache = CatalogCache()
+    entry = cache.set("room1", "page1", b'{"data": [], "total": 0}')
+
+    cached = cache.get("room1", "page1")
+    assert cached is not None
+    assert cached.body == b'{"data": [], "total": 0}'
+    assert cached.etag == entry.etag
+    assert cache.get("room1", "page2") is None
+    assert cache.get("room2", "page1") is None
+
+
+@pytest.mark.asyncio
+async def test_catalog_cache_invalidate_room():
+    cache = CatalogCache()
+    first = cache.set("room1", "page1", b"{}")
+    cache.set("room2", "page1", b"{}")
+
+    cache.invalidate("room1")
+
+    assert cache.get("room1", "page1") is None
+    assert cache.get("room2", "page1") is not None
+
+    second = cache.set("room1", "page1", b"{}")
+    assert second.etag != first.etag
+
+
+@pytest.mark.asyncio
+async def test_catalog_cache_expired_entry():
+    cache = CatalogCache()
+    cache.set("room1", "page1", b"{}", valid_until=time.time() - 1)
+    assert cache.get("room1", "page1") is None
+
+
+@pytest.mark.asyncio
+async def test_catalog_cache_max_entries():
+    cache = CatalogCache(max_entries=2)
+    cache.set("room1", "page1", b"{}")
+    cache.set("room1", "page2", b"{}")
+    cache.get("room1", "page1")
+    cache.set("room1", "page3", b"{}")
+
+    assert cache.get("room1", "page1") is not None
+    assert cache.get("room1", "page2") is None
+    assert cache.get("room1", "page3") is not None
+
+
+@pytest.mark.asyncio
+async def test_processed_payments_cache():
+    cache = ProcessedPaymentsCache(max_entries=2)
+    cache.add("h1")
+    cache.add("h2")
+    assert "h1" in cache
+    cache.add("h3")
+
+    assert "h1" in cache
+    assert "h2" not in cache
+    assert "h3" in cache
+
+
+@pytest.mark.asyncio
+async def test_bid_response_cache():
+    cache = BidResponseCache(ttl_seconds=60)
+    bid_response = BidResponse(id="b1", payment_hash="h1", payment_request="lnbc1")
+    cache.set("u1:i1:amount:10", bid_response)
+    cache.set("u1:i1:key:k1", bid_response, ttl_seconds=3600)
+    assert cache.get("u1:i1:amount:10") == bid_response
+    assert cache.get("u1:i1:key:k1") == bid_response
+    assert cache.get("u2:i1:amount:10") is None
+
+    cache.discard_payment("h1")
+    assert cache.get("u1:i1:amount:10") is None
+    assert cache.get("u1:i1:key:k1") is None
+
+
+@pytest.mark.asyncio
+async def test_bidded_items_cache():
+    cache = BiddedItemsCache(max_entries=2)
+    cache.set("u1", "room1", {"i1"}, cache.version)
+    cache.add("u1", "room1", "i2")
+    cache.add("u2", "room1", "i3")
+    assert cache.get("u1", "room1") == {"i1", "i2"}
+    assert cache.get("u1", "room2") is None
+    assert cache.get("u2", "room1") is None
+
+    # a bid was accepted while the set was read from the database
+    version = cache.version
+    cache.add("u2", "room1", "i3")
+    cache.set("u2", "room1", set(), version)
+    assert cache.get("u2", "room1") is None
+
+
+@pytest.mark.asyncio
+async def test_bidded_items_cache_expiry():
+    cache = BiddedItemsCache(ttl_seconds=0)
+    cache.set("u1", "room1", {"i1"}, cache.version)
+    time.sleep(0.001)
+    assert cache.get("u1", "room1") is None
+
+    cache.set("u2", "room1", {"i3"}, cache.version)
+    cache.set("u3", "room1", set(), cache.version)
+    assert cache.get("u1", "room1") is None
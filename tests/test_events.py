@@ -0,0 +1,103 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from auction_house.crud import (  # type: ignore[import]
+    create_auction_item,
+    create_auction_room,
+)
+from auction_house.events import (  # type: ignore[import]
+    has_subscribers,
+    publish,
+    subscribe,
+    unsubscribe,
+)
+from auction_house.models import (  # type: ignore[import]
+    AuctionItem,
+    AuctionItemExtra,
+    AuctionRoom,
+    AuctionRoomConfig,
+    Bid,
+)
+from auction_house.services import (  # type: ignore[import]
+    ROOM_ITEM_FIELDS,
+    stream_new_bid,
+)
+from lnbits.helpers import urlsafe_short_hash
+
+
+@pytest.mark.asyncio
+async def test_publish_to_item_subscribers():
+    queue = subscribe("item1")
+    other_queue = subscribe("item2")
+    assert has_subscribers("item1")
+
+    assert publish("item1", "bid", '{"id": "b1"}') == 1
+
+    event = queue.get_nowait()
+    assert event.name == "bid"
+    assert event.to_sse() == 'event: bid\ndata: {"id": "b1"}\n\n'
+    assert other_queue.empty()
+
+    unsubscribe("item1", queue)
+    unsubscribe("item2", other_queue)
+    assert not has_subscribers("item1")
+    assert publish("item1", "bid", "{}") == 0
+
+
+@pytest.mark.asyncio
+async def test_publish_drops_slow_subscriber():
+    queue = subscribe("item3", max_size=2)
+    publish("item3", "bid", "{}")
+    publish("item3", "bid", "{}")
+    publish("item3", "bid", "{}")
+
+    assert not has_subscribers("item3")
+    assert queue.qsize() == 1
+    assert queue.get_nowait().name == "reset"
+
+
+@pytest.mark.asyncio
+async def test_stream_new_bid_patches_room_streams():
+    auction_room = await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id="user123",
+            name="Streamed Room",
+            fee_wallet_id="w123",
+            type="auction",
+            description="Room with live prices",
+            currency="sat",
+            extra=AuctionRoomConfig(),
+        )
+    )
+    item = AuctionItem(
+        id=urlsafe_short_hash(),
+        auction_room_id=auction_room.id,
+        user_id="user123",
+        name="Streamed Item",
+        ask_price=100.0,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+    )
+    await create_auction_item(item)
+    bid = Bid(
+        id=urlsafe_short_hash(),
+        auction_item_id=item.id,
+        user_id="user456",
+        memo="first bid",
+        amount=150,
+        amount_sat=150,
+        currency="sat",
+        payment_hash=urlsafe_short_hash(),
+    )
+
+    # only the room page listens, the item has no stream open
+    queue = subscribe(auction_room.id)
+    await stream_new_bid(bid, item, auction_room)
+    unsubscribe(auction_room.id, queue)
+
+    event = queue.get_nowait()
+    assert event.name == "item"
+    assert set(json.loads(event.data)) == ROOM_ITEM_FIELDS
+    assert queue.empty()
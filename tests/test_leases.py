@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from auction_house.crud import (  # type: ignore[import]
+    acquire_lease,
+    release_lease,
+)
+from auction_house.services import (  # type: ignore[import]
+    WORKER_ID,
+    _renew_lease,
+    is_leader,
+    item_lock,
+)
+from lnbits.helpers import urlsafe_short_hash
+
+
+@pytest.mark.asyncio
+async def test_acquire_and_release_lease():
+    name = urlsafe_short_hash()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+    assert await acquire_lease(name, "worker1", expires_at)
+    assert not await acquire_lease(name, "worker2", expires_at)
+    # the owner extends its own lease
+    assert await acquire_lease(name, "worker1", expires_at + timedelta(minutes=1))
+
+    await release_lease(name, "worker2")
+    assert not await acquire_lease(name, "worker2", expires_at)
+    await release_lease(name, "worker1")
+    assert await acquire_lease(name, "worker2", expires_at)
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_taken_over():
+    name = urlsafe_short_hash()
+    now = datetime.now(timezone.utc)
+
+    assert await acquire_lease(name, "worker1", now - timedelta(seconds=1))
+    assert await acquire_lease(name, "worker2", now + timedelta(minutes=1))
+    assert not await acquire_lease(name, "worker1", now + timedelta(minutes=1))
+
+
+@pytest.mark.asyncio
+async def test_leader_and_item_lock():
+    assert await is_leader()
+    assert await is_leader()
+
+    item_id = urlsafe_short_hash()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=1)
+    # another worker holds the item
+    assert await acquire_lease(f"item:{item_id}", "other", expires_at)
+    with pytest.raises(ValueError, match="busy"):
+        async with item_lock(item_id, timeout=0.1):
+            pass
+
+    await release_lease(f"item:{item_id}", "other")
+    async with item_lock(item_id, timeout=1):
+        assert not await acquire_lease(f"item:{item_id}", WORKER_ID, expires_at)
+    assert await acquire_lease(f"item:{item_id}", WORKER_ID, expires_at)
+
+
+@pytest.mark.asyncio
+async def test_held_lease_is_renewed():
+    name = urlsafe_short_hash()
+    now = datetime.now(timezone.utc)
+    assert await acquire_lease(name, "worker1", now + timedelta(seconds=1))
+
+    renewal = asyncio.create_task(_renew_lease(name, "worker1", 1))
+    await asyncio.sleep(1.5)
+    later = datetime.now(timezone.utc) + timedelta(minutes=1)
+    assert not await acquire_lease(name, "worker2", later)
+    renewal.cancel()
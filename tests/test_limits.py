@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from auction_house.limits import (  # type: ignore[import]
+    OutstandingInvoices,
+    RateLimiter,
+    TokenBucket,
+    allow_all,
+)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_refill():
+    bucket = TokenBucket(capacity=2, refill_per_second=1)
+    now = bucket.updated_at
+    assert bucket.take(now)
+    assert bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.take(now + 1)
+    assert not bucket.take(now + 1.5)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_per_key():
+    limiter = RateLimiter(capacity=1, refill_per_second=0.001, max_keys=2)
+    assert limiter.allow("user1")
+    assert not limiter.allow("user1")
+    assert limiter.allow("user2")
+
+    # user1 is the least recently used bucket and gets dropped
+    assert limiter.allow("user3")
+    assert limiter.allow("user1")
+
+
+@pytest.mark.asyncio
+async def test_outstanding_invoices():
+    invoices = OutstandingInvoices(max_per_user_item=2, ttl_seconds=60)
+    invoices.add("user1", "item1", "hash1")
+    assert not invoices.is_full("user1", "item1")
+    invoices.add("user1", "item1", "hash2")
+    assert invoices.is_full("user1", "item1")
+    assert not invoices.is_full("user1", "item2")
+
+    invoices.remove("user1", "item1", "hash1")
+    assert invoices.count("user1", "item1") == 1
+
+    invoices.ttl_seconds = 0
+    invoices.add("user2", "item1", "hash3")
+    time.sleep(0.001)
+    assert invoices.count("user2", "item1") == 0
+
+
+@pytest.mark.asyncio
+async def test_outstanding_invoices_own_expiry():
+    invoices = OutstandingInvoices(ttl_seconds=60)
+    invoices.add("user1", "item1", "hash1", ttl_seconds=1)
+    invoices.add("user1", "item1", "hash2")
+    now = time.monotonic()
+    assert invoices._invoices[("user1", "item1")]["hash1"] <= now + 1
+    assert invoices._invoices[("user1", "item1")]["hash2"] > now + 59
+
+
+@pytest.mark.asyncio
+async def test_allow_all_spends_no_token_when_rejected():
+    users = RateLimiter(capacity=1, refill_per_second=0.001)
+    items = RateLimiter(capacity=1, refill_per_second=0.001)
+    assert items.allow("item1")
+    assert not allow_all((users, "user1"), (items, "item1"))
+    assert allow_all((users, "user1"), (items, "item2"))
+
+
+@pytest.mark.asyncio
+async def test_outstanding_invoices_sweep():
+    invoices = OutstandingInvoices(ttl_seconds=0, max_keys=2)
+    invoices.add("user1", "item1", "hash1")
+    invoices.add("user2", "item1", "hash2")
+    time.sleep(0.001)
+    invoices.ttl_seconds = 60
+    invoices.add("user3", "item1", "hash3")
+    # the expired keys are dropped, never queried again
+    assert list(invoices._invoices) == [("user3", "item1")]
+
+    invoices.add("user4", "item1", "hash4")
+    invoices.add("user5", "item1", "hash5")
+    assert list(invoices._invoices) == [("user4", "item1"), ("user5", "item1")]
@@ -0,0 +1,50 @@
+import pytest
+from auction_house import rates  # type: ignore[import]
+from auction_house.rates import FiatRateCache  # type: ignore[import]
+
+
+@pytest.mark.asyncio
+async def test_fiat_rate_snapshot_refresh(monkeypatch):
+    calls = []
+
+    async def _get_fiat_rate_satoshis(currency: str) -> float:
+        calls.append(currency)
+        return 1000.0 * len(calls)
+
+    monkeypatch.setattr(rates, "get_fiat_rate_satoshis", _get_fiat_rate_satoshis)
+    cache = FiatRateCache()
+
+    assert await cache.to_sat(1.5, "usd") == 1500
+    assert await cache.to_sat(2, "USD") == 2000
+    assert calls == ["USD"]
+    assert await cache.to_sat(21, "sat") == 21
+
+    # an interval of zero always asks for a new rate
+    assert await cache.to_sat(1, "USD", refresh_seconds=0) == 2000
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_fiat_rate_provider_failure(monkeypatch):
+    async def _failing_rate(currency: str) -> float:
+        raise ConnectionError("no providers")
+
+    cache = FiatRateCache(retry_seconds=60)
+    with pytest.raises(ValueError):
+        monkeypatch.setattr(rates, "get_fiat_rate_satoshis", _failing_rate)
+        await cache.sats_per_unit("EUR")
+
+    async def _rate(currency: str) -> float:
+        return 1000.0
+
+    # providers are not asked again right after a failure
+    monkeypatch.setattr(rates, "get_fiat_rate_satoshis", _rate)
+    with pytest.raises(ValueError):
+        await cache.sats_per_unit("EUR")
+
+    cache.retry_seconds = 0
+    assert await cache.sats_per_unit("EUR") == 1000.0
+
+    # the previous rate is used while the providers are down
+    monkeypatch.setattr(rates, "get_fiat_rate_satoshis", _failing_rate)
+    assert await cache.sats_per_unit("EUR", refresh_seconds=0) == 1000.0
@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+
+import pytest
+from auction_house.crud import (  # type: ignore[import]
+    create_auction_item,
+    create_bid,
+    update_room_stats_for_bid,
+    update_room_stats_for_closed_item,
+)
+from auction_house.models import (  # type: ignore[import]
+    AuctionItem,
+    AuctionItemExtra,
+    Bid,
+)
+from auction_house.services import (  # type: ignore[import]
+    get_auction_room_stats,
+    rebuild_auction_room_stats,
+)
+from lnbits.helpers import urlsafe_short_hash
+
+
+def _bid(auction_item_id: str, user_id: str, amount: float, **kwargs) -> Bid:
+    return Bid(
+        id=urlsafe_short_hash(),
+        user_id=user_id,
+        auction_item_id=auction_item_id,
+        memo="memo",
+        amount=amount,
+        amount_sat=int(amount * 10),
+        currency="USD",
+        payment_hash=urlsafe_short_hash(),
+        **{"paid": True, **kwargs},
+    )
+
+
+@pytest.mark.asyncio
+async def test_room_stats_incremental():
+    room_id = urlsafe_short_hash()
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    await update_room_stats_for_bid(room_id, _bid("i1", "user1", 10))
+    await update_room_stats_for_bid(room_id, _bid("i1", "user2", 20))
+    await update_room_stats_for_bid(room_id, _bid("i1", "user1", 30))
+    await update_room_stats_for_closed_item(room_id, today, _bid("i1", "user1", 30))
+    await update_room_stats_for_closed_item(room_id, today)
+
+    stats = await get_auction_room_stats(room_id)
+    assert stats.bid_count == 3
+    assert stats.bid_volume_sat == 600
+    assert stats.unique_bidders == 2
+    assert stats.closed_items == 2
+    assert stats.sold_items == 1
+    assert stats.sales_volume_sat == 300
+    assert stats.average_final_price == 30
+    assert len(stats.daily) == 1
+    assert stats.daily[0].day == today
+    assert stats.daily[0].closed_items == 2
+
+
+@pytest.mark.asyncio
+async def test_room_stats_empty_room():
+    stats = await get_auction_room_stats(urlsafe_short_hash())
+    assert stats.bid_count == 0
+    assert stats.average_final_price == 0
+    assert stats.daily == []
+
+
+@pytest.mark.asyncio
+async def test_rebuild_room_stats():
+    room_id = urlsafe_short_hash()
+    for i, active in enumerate([False, False, True]):
+        item = AuctionItem(
+            id=f"{room_id}_{i}",
+            auction_room_id=room_id,
+            user_id="owner",
+            name=f"Item {i}",
+            active=active,
+            ask_price=10,
+            expires_at=datetime.now(timezone.utc),
+            extra=AuctionItemExtra(transfer_code="t1", wallet_id="w123"),
+        )
+        await create_auction_item(item)
+
+    await create_bid(_bid(f"{room_id}_0", "user1", 10, higher_bid_made=True))
+    await create_bid(_bid(f"{room_id}_0", "user2", 20))
+    await create_bid(_bid(f"{room_id}_2", "user3", 50))
+    await create_bid(_bid(f"{room_id}_2", "user3", 60, paid=False))
+
+    stats = await rebuild_auction_room_stats(room_id)
+    assert stats.bid_count == 3
+    assert stats.bid_volume_sat == 800
+    assert stats.unique_bidders == 3
+    assert stats.closed_items == 2
+    assert stats.sold_items == 1
+    assert stats.sales_volume == 20
+    assert sum(day.closed_items for day in stats.daily) == 2
+
+    # rebuilding again must not double count
+    stats = await rebuild_auction_room_stats(room_id)
+    assert stats.closed_items == 2
+    assert stats.unique_bidders == 3
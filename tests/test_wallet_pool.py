@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+import pytest
+from auction_house.crud import (  # type: ignore[import]
+    count_pooled_wallets,
+    create_auction_room,
+    get_audit_entry_paginated,
+    take_pooled_wallet,
+)
+from auction_house.models import (  # type: ignore[import]
+    AuctionItem,
+    AuctionItemExtra,
+    AuctionRoom,
+    AuctionRoomConfig,
+    AuditEvent,
+)
+from auction_house.services import (  # type: ignore[import]
+    WALLET_POOL_SIZE,
+    refill_wallet_pools,
+    release_item_wallet,
+    take_item_wallet,
+)
+from lnbits.core.crud import get_wallet
+from lnbits.helpers import urlsafe_short_hash
+
+
+async def _create_room(user_id: str) -> AuctionRoom:
+    return await create_auction_room(
+        AuctionRoom(
+            id=urlsafe_short_hash(),
+            user_id=user_id,
+            name="Room",
+            fee_wallet_id="w123",
+            type="auction",
+            description="d1",
+            currency="sat",
+            extra=AuctionRoomConfig(),
+        )
+    )
+
+
+def _item(user_id: str, wallet_id: str) -> AuctionItem:
+    return AuctionItem(
+        id=urlsafe_short_hash(),
+        auction_room_id="room",
+        user_id=user_id,
+        name="Item",
+        ask_price=10,
+        expires_at=datetime.now(timezone.utc),
+        extra=AuctionItemExtra(transfer_code="t1", wallet_id=wallet_id),
+    )
+
+
+@pytest.mark.asyncio
+async def test_take_item_wallet_from_pool():
+    user_id = urlsafe_short_hash()
+    await _create_room(user_id)
+
+    await refill_wallet_pools()
+    assert await count_pooled_wallets(user_id) == WALLET_POOL_SIZE
+
+    wallet_id = await take_item_wallet(user_id, "AH: Item")
+    assert await count_pooled_wallets(user_id) == WALLET_POOL_SIZE - 1
+    wallet = await get_wallet(wallet_id)
+    assert wallet and wallet.user == user_id and wallet.name == "AH: Item"
+
+    # the pool is empty: a new wallet is created
+    while await take_pooled_wallet(user_id):
+        pass
+    wallet_id = await take_item_wallet(user_id, "AH: Other")
+    wallet = await get_wallet(wallet_id)
+    assert wallet and wallet.user == user_id and wallet.name == "AH: Other"
+
+
+@pytest.mark.asyncio
+async def test_release_item_wallet():
+    user_id = urlsafe_short_hash()
+    await _create_room(user_id)
+
+    item = _item(user_id, await take_item_wallet(user_id, "AH: Item"))
+    await release_item_wallet(item)
+    assert await count_pooled_wallets(user_id) == 1
+    assert await take_pooled_wallet(user_id) == item.extra.wallet_id
+
+    await refill_wallet_pools()
+    await release_item_wallet(item)
+    wallet = await get_wallet(item.extra.wallet_id)
+    assert wallet and wallet.deleted
+    assert await count_pooled_wallets(user_id) == WALLET_POOL_SIZE
+
+    audit = await get_audit_entry_paginated(item.id)
+    assert {e.event for e in audit.data} == {
+        AuditEvent.WALLET_RECYCLED,
+        AuditEvent.WALLET_DELETED,
+    }
+
+
+@pytest.mark.asyncio
+async def test_refill_wallet_pools_drops_former_owners():
+    user_id = urlsafe_short_hash()
+    item = _item(user_id, await take_item_wallet(user_id, "AH: Item"))
+    await release_item_wallet(item)
+    assert await count_pooled_wallets(user_id) == 1
+
+    await refill_wallet_pools()
+    assert await count_pooled_wallets(user_id) == 0
+    wallet = await get_wallet(item.extra.wallet_id)
+    assert wallet and wallet.deleted
@@ -94,7 +94,8 @@ async def bids_list(
             "is_user_authenticated": user_id is not None,
             "is_user_room_owner": user_id == auction_room.user_id,
             "is_user_item_owner": user_id == auction_item.user_id,
-            "is_auction_type": auction_room.type == "auction",
+            "is_auction_type": not auction_room.is_fixed_price,
+            "is_sealed_type": auction_room.is_sealed,
             "auction_item": PublicAuctionItem(**auction_item.dict()).json(),
         },
     )
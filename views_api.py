@@ -1,8 +1,12 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
 from http import HTTPStatus
 from typing import Optional, Union
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 from lnbits.core.models import SimpleStatus, User
 from lnbits.db import Filters, Page
 from lnbits.decorators import (
@@ -12,24 +16,35 @@ from lnbits.decorators import (
 )
 from lnbits.helpers import generate_filter_params_openapi
 
+from .cache import catalog_cache
 from .crud import (
-    delete_auction_room,
     get_auction_item_by_id,
     get_auction_item_by_name,
+    get_auction_room,
     get_auction_room_by_id,
     get_audit_entry_paginated,
     get_bids_paginated,
     update_auction_room,
 )
+from .events import StreamEvent, subscribe, unsubscribe
 from .helpers import (
     check_user_id,
+    epoch_ms,
+)
+from .limits import (
+    allow_all,
+    item_bid_limiter,
+    outstanding_invoices,
+    user_bid_limiter,
 )
 from .models import (
     AuctionItem,
     AuctionItemFilters,
     AuctionRoom,
+    AuctionRoomDeletion,
     AuditEntry,
     AuditEntryFilters,
+    AuditEvent,
     BidFilters,
     BidRequest,
     BidResponse,
@@ -39,16 +54,23 @@ from .models import (
     PublicAuctionItem,
     PublicAuctionRoom,
     PublicBid,
+    RoomStats,
 )
 from .services import (
     add_auction_item,
+    are_bids_hidden,
+    auction_room_deletions,
     close_auction_item,
     create_user_auction_room,
     db_log,
     get_auction_item,
     get_auction_room_items_paginated,
+    get_auction_room_stats,
+    get_cached_bid_response,
     get_user_auction_rooms,
     queue_place_bid,
+    rebuild_auction_room_stats,
+    start_auction_room_deletion,
 )
 
 auction_house_api_router: APIRouter = APIRouter()
@@ -97,7 +119,9 @@ async def api_update_auction_room(
     data: EditAuctionRoomData, user: User = Depends(check_user_exists)
 ):
     data.validate_data()
-    return await update_auction_room(user_id=user.id, data=data)
+    auction_room = await update_auction_room(user_id=user.id, data=data)
+    catalog_cache.invalidate(data.id)
+    return auction_room
 
 
 @auction_house_api_router.delete(
@@ -106,10 +130,63 @@ async def api_update_auction_room(
 async def api_auction_room_delete(
     auction_room_id: str, user: User = Depends(check_user_exists)
 ):
-    deleted = await delete_auction_room(
+    auction_room = await get_auction_room(
         user_id=user.id, auction_room_id=auction_room_id
     )
-    return SimpleStatus(success=deleted, message=f"Deleted: {deleted}")
+    if not auction_room:
+        return SimpleStatus(success=False, message="Deleted: False")
+
+    deletion = await start_auction_room_deletion(auction_room)
+    catalog_cache.invalidate(auction_room_id)
+    return SimpleStatus(
+        success=True, message=f"Deleting {deletion.items_total} auction items."
+    )
+
+
+@auction_house_api_router.get(
+    "/api/v1/auction_room/{auction_room_id}/deletion",
+    name="Auction Room Deletion Progress",
+    summary="Progress of the background deletion of an auction room.",
+    response_model=AuctionRoomDeletion,
+)
+async def api_auction_room_deletion(
+    auction_room_id: str, user: User = Depends(check_user_exists)
+) -> AuctionRoomDeletion:
+    deletion = auction_room_deletions.get(auction_room_id)
+    if not deletion or (not user.admin and deletion.user_id != user.id):
+        raise HTTPException(HTTPStatus.NOT_FOUND, "No deletion for this room.")
+    return deletion
+
+
+@auction_house_api_router.get(
+    "/api/v1/auction_room/{auction_room_id}/stats",
+    name="Auction Room Stats",
+    summary="Bid and sales statistics for an auction room. "
+    "Only the owner of the room can see them.",
+    response_model=RoomStats,
+)
+async def api_get_auction_room_stats(
+    auction_room_id: str,
+    days: int = Query(30, ge=1, le=366),
+    user: User = Depends(check_user_exists),
+) -> RoomStats:
+    await _check_auction_room_owner(auction_room_id, user)
+    return await get_auction_room_stats(auction_room_id, days)
+
+
+@auction_house_api_router.put(
+    "/api/v1/auction_room/{auction_room_id}/stats",
+    name="Rebuild Auction Room Stats",
+    summary="Recompute the statistics of an auction room from its bids and items. "
+    "Used to backfill rooms created before the statistics were tracked.",
+    response_model=RoomStats,
+)
+async def api_rebuild_auction_room_stats(
+    auction_room_id: str,
+    user: User = Depends(check_user_exists),
+) -> RoomStats:
+    await _check_auction_room_owner(auction_room_id, user)
+    return await rebuild_auction_room_stats(auction_room_id)
 
 
 ############################# AUCTION ITEMS #############################
@@ -150,13 +227,22 @@ async def api_create_auction_item(
     response_model=Page[PublicAuctionItem],
 )
 async def api_get_auction_items_paginated(
+    request: Request,
+    response: Response,
     auction_room_id: str,
     include_inactive: Optional[bool] = None,
     user_is_owner: Optional[bool] = None,
     user_is_participant: Optional[bool] = None,
+    text_search: Optional[str] = Query(default=None, max_length=200),
     user_id: Optional[str] = Depends(optional_user_id),
     filters: Filters = Depends(auction_items_filters),
-) -> Page[PublicAuctionItem]:
+) -> Union[Page[PublicAuctionItem], Response]:
+    cache_key = str(sorted(request.query_params.multi_items()))
+    if not user_id:
+        entry = catalog_cache.get(auction_room_id, cache_key)
+        if entry:
+            return _catalog_response(request, entry.body, entry.etag)
+
     auction_room = await get_auction_room_by_id(auction_room_id)
     if not auction_room:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Auction Room not found.")
@@ -166,10 +252,26 @@ async def api_get_auction_items_paginated(
         include_inactive=include_inactive,
         user_is_owner=user_is_owner,
         user_is_participant=user_is_participant,
+        text_search=text_search,
         user_id=user_id,
         filters=filters,
     )
-    return Page(data=[item.to_public(user_id) for item in page.data], total=page.total)
+    public_page = Page(
+        data=[item.to_public(user_id) for item in page.data], total=page.total
+    )
+    if user_id:
+        response.headers["X-Server-Time-Ms"] = str(epoch_ms())
+        return public_page
+
+    # the page must be rebuilt as soon as one of its items expires
+    expires_at = [item.expires_at.timestamp() for item in page.data if item.active]
+    entry = catalog_cache.set(
+        auction_room_id,
+        cache_key,
+        public_page.json().encode(),
+        valid_until=min(expires_at) if expires_at else None,
+    )
+    return _catalog_response(request, entry.body, entry.etag)
 
 
 @auction_house_api_router.get(
@@ -225,10 +327,7 @@ async def api_close_auction_item(
 
     bids = await get_bids_paginated(auction_item_id=auction_item_id)
     if force_close:
-        await db_log(
-            auction_item.id,
-            f"Force close auction item {auction_item.name} ({auction_item.id}).",
-        )
+        await db_log(auction_item.id, AuditEvent.ITEM_FORCE_CLOSE)
     elif (
         auction_item.active
         and bids.total > 0
@@ -238,7 +337,11 @@ async def api_close_auction_item(
             HTTPStatus.CONFLICT, "Cannot close active auction with bids."
         )
 
-    await close_auction_item(auction_item)
+    # an item whose settlement failed can be closed again to retry it
+    if not await close_auction_item(auction_item, retry_failed=True):
+        raise HTTPException(
+            HTTPStatus.CONFLICT, "Auction is already closed or being closed."
+        )
     return SimpleStatus(success=True, message="Auction Closed")
 
 
@@ -254,9 +357,29 @@ async def api_place_bid(
     user_id: str = Depends(check_user_id),
 ) -> BidResponse:
     data.validate_data()
-    return await queue_place_bid(
+    bid_response = get_cached_bid_response(user_id, auction_item_id, data)
+    if bid_response:
+        return bid_response
+    if outstanding_invoices.is_full(user_id, auction_item_id):
+        raise HTTPException(
+            HTTPStatus.TOO_MANY_REQUESTS,
+            "Too many unpaid bids for this item. Pay or wait for them to expire.",
+        )
+    if not allow_all((user_bid_limiter, user_id), (item_bid_limiter, auction_item_id)):
+        raise HTTPException(
+            HTTPStatus.TOO_MANY_REQUESTS, "Too many bids. Try again later."
+        )
+
+    bid_response = await queue_place_bid(
         user_id=user_id, auction_item_id=auction_item_id, data=data
     )
+    outstanding_invoices.add(
+        user_id,
+        auction_item_id,
+        bid_response.payment_hash,
+        bid_response.expires_in_seconds,
+    )
+    return bid_response
 
 
 @auction_house_api_router.get(
@@ -283,6 +406,11 @@ async def api_get_user_bids_paginated(
         raise HTTPException(HTTPStatus.NOT_FOUND, "Auction Room not found.")
 
     for_user_id = user_id if only_mine else None
+    # sealed bids are only shown to their bidder until the item is settled
+    if are_bids_hidden(auction_item, auction_room):
+        if not user_id:
+            return Page(data=[], total=0)
+        for_user_id = user_id
     include_unpaid = include_unpaid and (user_id == auction_room.user_id)
     page = await get_bids_paginated(
         auction_item_id=auction_item_id,
@@ -293,6 +421,51 @@ async def api_get_user_bids_paginated(
     return Page(data=[bid.to_public(user_id) for bid in page.data], total=page.total)
 
 
+@auction_house_api_router.get(
+    "/api/v1/bids/{auction_item_id}/stream",
+    name="Bids Stream",
+    summary="Server-Sent Events stream for an auction item. "
+    "Emits `bid` (public bid), `item` (updated public item), "
+    "`closed` and `reset` events.",
+    response_class=StreamingResponse,
+)
+async def api_stream_bids(
+    request: Request,
+    auction_item_id: str,
+) -> StreamingResponse:
+    auction_item = await get_auction_item_by_id(auction_item_id)
+    if not auction_item:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Auction Item not found.")
+
+    return StreamingResponse(
+        _bid_events(request, auction_item),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@auction_house_api_router.get(
+    "/api/v1/items/{auction_room_id}/stream",
+    name="Auction Items Stream",
+    summary="Server-Sent Events stream for the items of an auction room. "
+    "Emits `item` (new prices of an item), `closed` and `reset` events.",
+    response_class=StreamingResponse,
+)
+async def api_stream_auction_items(
+    request: Request,
+    auction_room_id: str,
+) -> StreamingResponse:
+    auction_room = await get_auction_room_by_id(auction_room_id)
+    if not auction_room:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Auction Room not found.")
+
+    return StreamingResponse(
+        _stream_events(request, auction_room.id, ["reset"]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 ############################# AUDIT #############################
 
 
@@ -319,4 +492,63 @@ async def api_get_audit_paginated(
 
     if not user.admin and (room.user_id != user.id):
         raise HTTPException(HTTPStatus.FORBIDDEN, "You are not allowed to view this.")
-    return await get_audit_entry_paginated(entry_id=auction_item_id, filters=filters)
+    page = await get_audit_entry_paginated(entry_id=auction_item_id, filters=filters)
+    for entry in page.data:
+        entry.data = entry.render()
+    return page
+
+
+def _catalog_response(request: Request, body: bytes, etag: str) -> Response:
+    # cached items keep the server time of when the page was built
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Server-Time-Ms": str(epoch_ms()),
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _bid_events(
+    request: Request, auction_item: AuctionItem
+) -> AsyncGenerator[str, None]:
+    if not auction_item.active:
+        data = json.dumps(
+            {"auction_item_id": auction_item.id, "server_time_ms": epoch_ms()}
+        )
+        yield StreamEvent(name="closed", data=data).to_sse()
+        return
+
+    async for event in _stream_events(request, auction_item.id, ["closed", "reset"]):
+        yield event
+
+
+async def _stream_events(
+    request: Request,
+    channel_id: str,
+    last_events: list[str],
+    keep_alive_seconds: int = 15,
+) -> AsyncGenerator[str, None]:
+    queue = subscribe(channel_id)
+    try:
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), keep_alive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield event.to_sse()
+            if event.name in last_events:
+                break
+    finally:
+        unsubscribe(channel_id, queue)
+
+
+async def _check_auction_room_owner(auction_room_id: str, user: User) -> AuctionRoom:
+    auction_room = await get_auction_room_by_id(auction_room_id)
+    if not auction_room:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Auction Room not found.")
+    if not user.admin and auction_room.user_id != user.id:
+        raise HTTPException(HTTPStatus.FORBIDDEN, "You are not allowed to view this.")
+    return auction_room